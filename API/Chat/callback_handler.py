@@ -1,28 +1,82 @@
+import time
 import streamlit as st
 from langchain.callbacks.base import BaseCallbackHandler
-from typing import Any
-import json
+from typing import Any, List, Optional
 
 class StreamlitCallbackHandler(BaseCallbackHandler):
-    def __init__(self, container: st.delta_generator.DeltaGenerator):
+    def __init__(
+        self,
+        container: st.delta_generator.DeltaGenerator,
+        flush_interval: float = 0.05,
+        flush_chars: int = 256,
+    ):
+        """
+        Streams tokens into a Streamlit placeholder, re-rendering at most once per
+        `flush_interval` seconds or every `flush_chars` buffered characters instead
+        of on every token.
+        """
         # Placeholder for streaming tokens
         self.container = container
         self.placeholder = self.container.empty()
-        self.token_buffer = ""
-        self.is_json_detected = False  # Flag to prevent JSON streaming
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+
+        self.rendered_text = ""  # Text already flushed to the placeholder
+        self.pending_tokens: List[str] = []  # Tokens received since the last flush
+        self.pending_chars = 0
+        self.last_flush = time.monotonic()
+        self.is_json_detected: Optional[bool] = None  # Decided once, on the first non-whitespace token
+        self.passthrough_text = ""  # Lesson text handed over by tools, shown above the model's reply
+        self.quiz_data: Optional[dict] = None  # Quiz handed over by StartQuiz
 
     def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
         # Accumulate tokens
-        self.token_buffer += token
+        self.pending_tokens.append(token)
+        self.pending_chars += len(token)
+
+        # Detect JSON start once, so JSON-like content (e.g. quiz payloads) is never rendered
+        if self.is_json_detected is None and token.strip():
+            self.is_json_detected = token.lstrip().startswith("{")
+
+        if (
+            self.pending_chars >= self.flush_chars
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        self.flush()
+        if self.passthrough_text and not self.is_json_detected:
+            self.placeholder.markdown(self.passthrough_text + self.rendered_text)
+
+    def on_tool_payload(self, payload: dict) -> None:
+        """
+        Receive a structured payload a tool handed to the caller instead of the model:
+        lesson text is rendered as it streams, quiz data is kept for the quiz UI.
+        """
+        if payload["kind"] == "quiz":
+            self.quiz_data = payload["data"]
+        elif payload["kind"] == "lesson":
+            # Lessons arrive section by section, in streamed fragments; render them as tokens are
+            self.passthrough_text += payload["data"]["content"]
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self.placeholder.markdown(self.passthrough_text + self.rendered_text)
+                self.last_flush = time.monotonic()
 
-        # Detect JSON start
-        if self.token_buffer.strip().startswith("{"):
-            self.is_json_detected = True
+    def flush(self) -> None:
+        if self.pending_tokens:
+            self.rendered_text += "".join(self.pending_tokens)
+            self.pending_tokens = []
+            self.pending_chars = 0
+            # Suppress rendering JSON-like content
+            if not self.is_json_detected:
+                self.placeholder.markdown(self.passthrough_text + self.rendered_text)
+        self.last_flush = time.monotonic()
 
-        # Suppress rendering JSON-like content
-        if not self.is_json_detected:
-            self.placeholder.markdown(self.token_buffer)
+    @property
+    def token_buffer(self) -> str:
+        return self.rendered_text + "".join(self.pending_tokens)
 
     def get_final_text(self) -> str:
-        # Return the fully accumulated response
-        return self.token_buffer
+        # Return the fully accumulated response, including any lesson handed over by tools
+        return self.passthrough_text + self.token_buffer
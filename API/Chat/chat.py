@@ -1,96 +1,68 @@
-import time
-import tiktoken
-import threading
 import os
+import asyncio
 import streamlit as st
 
 from langchain.schema import HumanMessage, AIMessage
 from langchain.memory import ConversationBufferMemory
 
 from DB.index import database_manager
+from DB.SessionStore import get_session_store
 from Azure.Search import search_client, client
-from API.chapter import chapter_handler
 from API.feedback import FeedbackHandler
 from API.Chat.constant import CHAT_PROMPT
 
 import numpy as np
 from agent import create_agent_executor
 
-from utils.feedback_utils import fetch_and_summarize_feedback
-from utils.agent_utils import build_agent_tools
-from utils.memory_utils import get_user_memory
-from utils.context_utils import build_initial_context
+from utils.feedback_utils import feedback_summary_listeners, get_feedback_summary
+from utils.agent_utils import AgentCache, build_agent_tools, tool_selector
+from utils.memory_utils import SessionCache, get_user_memory, get_user_token_ledger
+from utils.token_utils import get_encoding_for_model
+from utils.context_utils import build_initial_context, apreload_session_context
+from utils.coalesce_utils import TurnCoalescer, TurnRecorder
+from utils.passthrough_utils import LESSON_PAYLOAD, QUIZ_PAYLOAD, ToolPayloadChannel, tool_payload_channel
 
 from langchain.callbacks.base import BaseCallbackHandler
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 class ChatHandler:
     def __init__(self):
         print("ChatHandler initialized!")
-        self.user_memories = {}  # {email: {"memory": ConversationBufferMemory, "last_active": timestamp}}
+        # {email: {"memory": RollingSummaryMemory, "last_active": timestamp}}, lazily loaded from the session store
+        self.user_memories = SessionCache(get_session_store())
+        # Identical submissions (reruns, double-clicks) attach to the turn already running
+        self.inflight_turns = TurnCoalescer()
+        # Agent tools and executors per user, independent of the session entry
+        self.agent_cache = AgentCache()
         self.search_client = search_client  # For direct vector search if needed
         self.feedback_handler = FeedbackHandler()
-
-        self.cleanup_interval = 300  # Clean inactive users every 5 minutes
-        threading.Thread(target=self.__auto_clean_inactive_users, daemon=True).start()
-
-    def clean_inactive_users(self, timeout: int = 3600):
-        """
-        Removes memory for users inactive for more than `timeout` seconds.
-        """
-        current_time = time.time()
-        to_remove = [
-            email for email, data in self.user_memories.items()
-            if current_time - data["last_active"] > timeout
-        ]
-        for email in to_remove:
-            del self.user_memories[email]
-            print(f"[INFO] Removed inactive user: {email}")
+        feedback_summary_listeners.append(self.__on_feedback_summary_updated)
 
     def handle_feedback(self, email: str, conversation_id: str, feedback_text: str):
         """
-        Save user feedback and refresh summarized feedback in memory.
+        Save user feedback. The summary is updated by the background feedback worker,
+        which refreshes the cached copy through `__on_feedback_summary_updated`.
         """
         self.feedback_handler.save_feedback(email, conversation_id, feedback_text)
 
-        summarized_feedback = fetch_and_summarize_feedback(email)
-        if email in self.user_memories:
+    def __on_feedback_summary_updated(self, email: str, summarized_feedback: str):
+        """
+        Refresh the cached summarized feedback for an active session.
+        """
+        if self.user_memories.is_cached(email):
             self.user_memories[email]["summarized_feedback"] = summarized_feedback
+            self.user_memories.persist(email)
             print(f"[INFO] Updated summarized feedback for {email}: {summarized_feedback}")
-        else:
-            print(f"[WARN] No active session for {email}, summarized feedback not stored in memory.")
 
-    def __auto_clean_inactive_users(self):
-        while True:
-            self.clean_inactive_users()
-            time.sleep(self.cleanup_interval)
-
-    def __trim_chat_history_to_fit_token_limit(self, messages, max_tokens=3000, model_encoding="o200k_base"):
+    def __trim_chat_history_to_fit_token_limit(self, email: str, messages, max_tokens=3000):
         """
-        Trims chat history from the oldest messages to fit within `max_tokens`.
+        Trims chat history in place from the oldest messages to fit within `max_tokens`.
+        Uses the user's token ledger so only newly appended messages are encoded.
         """
-        encoding = tiktoken.get_encoding(model_encoding)
-        trimmed_messages = []
-        total_tokens = 0
-
-        # Iterate backward (most recent -> oldest)
-        for msg in reversed(messages):
-            if isinstance(msg, dict):
-                role = msg.get("role", "")
-                content = msg.get("content", "")
-                msg_text = f"{role}: {content}"
-            else:
-                msg_text = str(msg)
-
-            tokens_count = len(encoding.encode(msg_text))
-            if total_tokens + tokens_count > max_tokens:
-                break
-
-            trimmed_messages.append(msg)
-            total_tokens += tokens_count
-
-        trimmed_messages.reverse()
-        return trimmed_messages
+        removed = get_user_token_ledger(self.user_memories, email).trim(messages, max_tokens)
+        if removed:
+            print(f"[INFO] Trimmed {removed} old messages from chat history for {email}")
+        return messages
     
     def _vector_search_and_refine(
         self, 
@@ -129,6 +101,129 @@ class ChatHandler:
 
         return final_text
 
+    def _get_agent_executor(self, email: str, memory, user_input: str):
+        """
+        Return an agent executor for this turn's tool subset, bound to `memory`.
+        Tools are built once per user and executors once per tool subset (kept in
+        `agent_cache`, which survives the session being reloaded); callbacks are
+        passed per invocation and the memory is bound on a shallow copy, so the
+        cached executor serves every turn, including concurrent ones.
+        """
+        def build_tools():
+            def on_continue_course(subject: str, chapter_id: str, generated_content):
+                # Looked up per call: the session's memory may have been reloaded since
+                get_user_memory(self.user_memories, email).save_context(
+                    {"input": f"Get next chapter for {subject}, chapter_id: {chapter_id}."},
+                    {"output": generated_content},
+                )
+
+            return build_agent_tools(email, on_continue_course)
+
+        tools = self.agent_cache.get_tools(email, build_tools)
+
+        messages = memory.chat_memory.messages
+        last_ai_message = next(
+            (message.content for message in reversed(messages) if isinstance(message, AIMessage)),
+            "",
+        )
+        # Stored human messages are the full agent input; keep only the query itself
+        last_user_message = next(
+            (message.content for message in reversed(messages) if isinstance(message, HumanMessage)),
+            "",
+        ).rsplit("**User Query**", 1)[-1]
+        selected = tool_selector.select(tools, user_input, last_ai_message, last_user_message)
+        agent_executor = self.agent_cache.get_executor(
+            email,
+            frozenset(tool.name for tool in selected),
+            lambda: create_agent_executor(prompt=CHAT_PROMPT, tools=selected, streaming=True),
+        )
+        return agent_executor.model_copy(update={"memory": memory})
+
+    def _prepare_turn(
+        self,
+        email: str,
+        user_input: str,
+        session_context: Optional[dict] = None,
+    ):
+        """
+        Shared setup for sync and async turns: loads memory and summarized feedback,
+        trims history, fetches the session's agent executor and builds the agent input.
+        Returns (session_data, memory, agent_executor, agent_input, user_input).
+        """
+        memory = get_user_memory(self.user_memories, email)
+        # Check Streamlit session state to see if feedback was updated
+        feedback_updated = False
+        try:
+            feedback_updated = st.session_state.pop("feedback_updated", False)
+        except Exception:
+            pass  # In non-streamlit context, skip safely
+        
+        session_data = self.user_memories.get(email, {})
+        # Only read the stored summary if feedback was updated or absent
+        if feedback_updated or "summarized_feedback" not in session_data:
+            summarized_feedback = get_feedback_summary(email)
+            session_data["summarized_feedback"] = summarized_feedback
+            self.user_memories[email] = session_data
+            print(f"[INFO] Summarized feedback loaded for {email}: {summarized_feedback}")
+        else:
+            summarized_feedback = session_data["summarized_feedback"]
+            print(f"[INFO] Using cached summarized feedback for {email}")
+
+        # Trim chat history before forming the prompt
+        self.__trim_chat_history_to_fit_token_limit(
+            email, memory.chat_memory.messages, max_tokens=128000  # GPT-4o's max tokens
+        )
+
+        agent_executor = self._get_agent_executor(email, memory, user_input)
+
+        # If it's the first message...
+        if not memory.chat_memory.messages:
+            agent_input = build_initial_context(email, summarized_feedback, user_input, session_context)
+        else:
+            print("summarized_feedback: ", summarized_feedback)
+            # Trim user query if necessary
+            encoding = get_encoding_for_model("gpt-4o")
+            user_query_tokens = encoding.encode(user_input)
+
+            if len(user_query_tokens) > 128000:
+                print(f"[WARN] User query exceeds token limit. Trimming...")
+                user_input = encoding.decode(user_query_tokens[:128000])
+
+            # For subsequent messages, just append summarized feedback
+            agent_input = f"""
+            **Summarized Feedback:**
+            {summarized_feedback}
+
+            **User Query**
+            {user_input}
+            """
+        return session_data, memory, agent_executor, agent_input, user_input
+
+    @staticmethod
+    def _extract_response(response, callback_handler: Optional[BaseCallbackHandler] = None) -> str:
+        # Extract full_response from agent
+        if isinstance(response, dict) and "output" in response:
+            return response["output"]
+        if isinstance(response, str):
+            return response
+        if hasattr(callback_handler, "get_final_text"):
+            return callback_handler.get_final_text()
+        return str(response)
+
+    @staticmethod
+    def _response_to_store(full_response: str, payloads: List[dict]) -> str:
+        # Lessons bypass the model's answer, so keep them in the saved conversation
+        lesson = "".join(payload["data"]["content"] for payload in payloads if payload["kind"] == LESSON_PAYLOAD)
+        return lesson + full_response
+
+    def _finish_turn(self, email: str, session_data: dict, memory):
+        # Persist the entry this turn was prepared from, not whatever is cached now:
+        # the cached copy may have been replaced by a reload while the turn ran, and
+        # the turn's messages only live in `memory`. The same goes for the rolling
+        # summary, which folds turns outside the verbatim window off the hot path.
+        memory.schedule_summary(on_done=lambda: self.user_memories.persist_session(email, session_data))
+        self.user_memories.persist_session(email, session_data)
+
     def conversational_rag_stream(
         self, 
         email: str, 
@@ -138,90 +233,185 @@ class ChatHandler:
         """
         A streaming method that uses 'callback_handler' to stream tokens in real time.
         Returns (final_text, conversation_id).
+
+        Structured payloads from designated tools (quiz data, lesson text) bypass the
+        model and are handed to `callback_handler.on_tool_payload`, if it has one;
+        `final_text` is then only the model's short framing message.
+
+        If the same input is already being answered for this user, the call follows
+        that turn (replaying its tokens into `callback_handler`) instead of running
+        the agent again.
         """
-        try:
-            memory = get_user_memory(self.user_memories, email)
-            # Check Streamlit session state to see if feedback was updated
-            feedback_updated = False
+        turn, is_owner = self.inflight_turns.begin(email, user_input)
+        if not is_owner:
             try:
-                feedback_updated = st.session_state.pop("feedback_updated", False)
-            except ImportError:
-                pass  # In non-streamlit context, skip safely
-            
-            session_data = self.user_memories.get(email, {})
-            # Only fetch summarized_feedback if feedback was updated or absent
-            if feedback_updated or "summarized_feedback" not in session_data:
-                summarized_feedback = fetch_and_summarize_feedback(email)
-                session_data["summarized_feedback"] = summarized_feedback
-                self.user_memories[email] = session_data
-                print(f"[INFO] Summarized feedback refreshed for {email}: {summarized_feedback}")
-            else:
-                summarized_feedback = session_data["summarized_feedback"]
-                print(f"[INFO] Using cached summarized feedback for {email}")
+                return turn.follow(callback_handler)
+            except TimeoutError as e:
+                return f"Error: {e}", None, None
 
-            def on_continue_course(subject: str, chapter_id: str, generated_content):
-                memory.save_context(
-                    {"input": f"Get next chapter for {subject}, chapter_id: {chapter_id}."},
-                    {"output": generated_content},
+        result = None
+        try:
+            session_data, memory, agent_executor, agent_input, user_input = self._prepare_turn(email, user_input)
+            listeners = [turn.add_payload]
+            if hasattr(callback_handler, "on_tool_payload"):
+                listeners.append(callback_handler.on_tool_payload)
+            channel = ToolPayloadChannel(listeners)
+            with tool_payload_channel(channel):
+                response = agent_executor.invoke(
+                    {"input": agent_input},
+                    config={"callbacks": [callback_handler, TurnRecorder(turn)]},
                 )
-            
-            # Trim chat history before forming the prompt
-            memory.chat_memory.messages = self.__trim_chat_history_to_fit_token_limit(
-                memory.chat_memory.messages, max_tokens=128000  # GPT-4o's max tokens
-            )
+            full_response = self._extract_response(response, callback_handler)
 
-            # Prepare the Tools and Agent Executor
-            tools = build_agent_tools(email, on_continue_course)
-            agent_executor = create_agent_executor(
-                prompt=CHAT_PROMPT,
-                memory=memory,
-                tools=tools,
-                callbacks=[callback_handler],
-                streaming=True
+            # Save conversation in DB
+            conversation_id = database_manager.save_message(
+                email, user_input, self._response_to_store(full_response, channel.payloads)
             )
 
-            # If it's the first message...
-            if not memory.chat_memory.messages:
-                context = build_initial_context(email, summarized_feedback, user_input)
-                response = agent_executor.invoke({"input": context})
-            else:
-                print("summarized_feedback: ", summarized_feedback)
-                # Trim user query if necessary
-                encoding = tiktoken.encoding_for_model("gpt-4o")
-                user_query_tokens = len(encoding.encode(user_input))
-
-                if user_query_tokens > 128000:
-                    print(f"[WARN] User query exceeds token limit. Trimming...")
-                    user_input = encoding.decode(encoding.encode(user_input)[:128000])
-
-                # For subsequent messages, just append summarized feedback
-                combined_input = f"""
-                **Summarized Feedback:**
-                {summarized_feedback}
-
-                **User Query**
-                {user_input}
-                """
-                response = agent_executor.invoke({"input": combined_input})
-
-            # Extract full_response from agent
-            if isinstance(response, dict) and "output" in response:
-                full_response = response["output"]
-            elif isinstance(response, str):
-                full_response = response
-            elif hasattr(callback_handler, "get_final_text"):
-                full_response = callback_handler.get_final_text()
+            self._finish_turn(email, session_data, memory)
+            result = full_response, conversation_id
+            return result
+
+        except Exception as e:
+            error_message = f"Error during streaming RAG processing: {e}"
+            print(error_message)
+            result = f"Error: {error_message}", None, None
+            return result
+        finally:
+            if result is None:
+                result = "Error: The original chat turn was interrupted.", None, None
+            self.inflight_turns.finish(turn, result, cache=len(result) == 2)
+
+    @staticmethod
+    async def _amerge_agent_events(agent_executor, agent_input: str, channel: ToolPayloadChannel):
+        """
+        Run the agent with `channel` open and yield ("event", astream_events event) and
+        ("payload", tool payload) in arrival order. Payloads are forwarded while the
+        tool is still running (a lesson section streams as it is generated), not only
+        once the agent emits its next event.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        channel.listeners.append(lambda payload: loop.call_soon_threadsafe(queue.put_nowait, ("payload", payload)))
+        done = object()
+
+        async def pump():
+            try:
+                with tool_payload_channel(channel):
+                    async for event in agent_executor.astream_events({"input": agent_input}, version="v2"):
+                        queue.put_nowait(("event", event))
+            except Exception as e:
+                queue.put_nowait(("error", e))
+            finally:
+                # Queued behind any payload callbacks still pending on the loop
+                loop.call_soon(queue.put_nowait, (done, None))
+
+        task = asyncio.create_task(pump())
+        try:
+            while True:
+                source, item = await queue.get()
+                if source is done:
+                    return
+                if source == "error":
+                    raise item
+                yield source, item
+        finally:
+            task.cancel()
+
+    async def astream_chat(self, email: str, user_input: str) -> AsyncIterator[dict]:
+        """
+        Async chat turn built on `astream_events`. Yields
+        {"type": "token", "content": str} while the model streams, then a final
+        {"type": "end", "output": str, "conversation_id": int} (or {"type": "error", ...}).
+        Payloads from designated tools are yielded as they arrive, as
+        {"type": "quiz" | "lesson", "data": dict}, instead of being re-typed by the model.
+
+        Tools with async implementations (retrieval, past messages, scheduled chapters,
+        enrollment) run on the event loop, and tool calls issued in the same model step
+        are executed concurrently by the AgentExecutor. Duplicate submissions follow
+        the turn already in flight.
+        """
+        turn, is_owner = self.inflight_turns.begin(email, user_input)
+        if not is_owner:
+            try:
+                async for content in turn.afollow():
+                    yield {"type": "token", "content": content}
+            except TimeoutError as e:
+                yield {"type": "error", "message": str(e)}
+                return
+            for payload in turn.payloads:
+                yield {"type": payload["kind"], "data": payload["data"]}
+            output, conversation_id = turn.result[:2]
+            if len(turn.result) == 2:
+                yield {"type": "end", "output": output, "conversation_id": conversation_id}
             else:
-                full_response = str(response)
+                yield {"type": "error", "message": output}
+            return
 
-            # Save conversation in DB
-            conversation_id = database_manager.save_message(email, user_input, full_response)
-            return full_response, conversation_id
+        result = None
+        try:
+            memory = await asyncio.to_thread(get_user_memory, self.user_memories, email)
+            session_context = None
+            if not memory.chat_memory.messages:
+                session_context = await apreload_session_context(email, user_input)
+
+            session_data, memory, agent_executor, agent_input, user_input = await asyncio.to_thread(
+                self._prepare_turn, email, user_input, session_context
+            )
+
+            full_response = ""
+            channel = ToolPayloadChannel([turn.add_payload])
+            async for source, item in self._amerge_agent_events(agent_executor, agent_input, channel):
+                if source == "payload":
+                    yield {"type": item["kind"], "data": item["data"]}
+                    continue
+                kind = item["event"]
+                if kind == "on_chat_model_stream":
+                    content = item["data"]["chunk"].content
+                    if content:
+                        turn.add_token(content)
+                        yield {"type": "token", "content": content}
+                elif kind == "on_chain_end" and not item.get("parent_ids"):
+                    full_response = self._extract_response(item["data"].get("output"))
+
+            conversation_id = await database_manager.asave_message(
+                email, user_input, self._response_to_store(full_response, channel.payloads)
+            )
+            await asyncio.to_thread(self._finish_turn, email, session_data, memory)
+            result = full_response, conversation_id
+            yield {"type": "end", "output": full_response, "conversation_id": conversation_id}
 
         except Exception as e:
-            error_message = f"Error during streaming RAG processing: {e}"
+            error_message = f"Error during async RAG processing: {e}"
             print(error_message)
-            return f"Error: {error_message}", None, None
+            result = f"Error: {error_message}", None, None
+            yield {"type": "error", "message": error_message}
+        finally:
+            if result is None:
+                result = "Error: The original chat turn was interrupted.", None, None
+            self.inflight_turns.finish(turn, result, cache=len(result) == 2)
+
+    async def aconversational_rag(
+        self,
+        email: str,
+        user_input: str,
+        callback_handler: Optional[BaseCallbackHandler] = None,
+    ):
+        """
+        Async counterpart of `conversational_rag_stream`. Tokens and tool payloads are
+        forwarded to `callback_handler` if given. Returns (final_text, conversation_id).
+        """
+        async for event in self.astream_chat(email, user_input):
+            if event["type"] == "token" and callback_handler is not None:
+                callback_handler.on_llm_new_token(event["content"])
+            elif event["type"] in (QUIZ_PAYLOAD, LESSON_PAYLOAD):
+                if hasattr(callback_handler, "on_tool_payload"):
+                    callback_handler.on_tool_payload({"kind": event["type"], "data": event["data"]})
+            elif event["type"] == "end":
+                return event["output"], event["conversation_id"]
+            elif event["type"] == "error":
+                return f"Error: {event['message']}", None
+        return "", None
 
 
 # Instantiate the handler
@@ -1,4 +1,11 @@
+import os
+import hmac
+import time
+import base64
 import bcrypt
+import hashlib
+
+from typing import Optional
 from DB.index import database_manager
 
 
@@ -32,4 +39,38 @@ class AuthHandler:
         stored_hash = result[0]
         return bcrypt.checkpw(password.encode("utf-8"), stored_hash.encode("utf-8"))
 
+    @staticmethod
+    def _sign(payload: str) -> str:
+        secret = os.getenv("API_SECRET_KEY")
+        if not secret:
+            raise RuntimeError("API_SECRET_KEY is not set")
+        return hmac.new(secret.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def issue_token(self, user_email: str) -> str:
+        """
+        Issue a signed bearer token for the chat API. Tokens carry the email and an
+        expiry, so any API worker can verify them without shared session state.
+        """
+        expires_at = int(time.time()) + int(os.getenv("API_TOKEN_TTL_SECONDS", 86400))
+        payload = f"{user_email}|{expires_at}"
+        token = f"{payload}|{self._sign(payload)}"
+        return base64.urlsafe_b64encode(token.encode("utf-8")).decode("utf-8")
+
+    def verify_token(self, token: str) -> Optional[str]:
+        """
+        Return the email a token was issued for, or None if it is invalid or expired.
+        """
+        try:
+            user_email, expires_at, signature = (
+                base64.urlsafe_b64decode(token.encode("utf-8")).decode("utf-8").rsplit("|", 2)
+            )
+            if not hmac.compare_digest(signature, self._sign(f"{user_email}|{expires_at}")):
+                return None
+            if int(expires_at) < time.time():
+                return None
+            return user_email
+        except Exception as e:
+            print(f"[WARN] Rejected API token: {e}")
+            return None
+
 auth_handler = AuthHandler()
\ No newline at end of file
@@ -1,43 +1,209 @@
-from utils.date_utils import get_today_date
+import os
+import time
+import asyncio
+import threading
+from typing import Optional
+
+from utils.date_utils import get_today_date, seconds_until_tomorrow
 from DB.index import database_manager
 
+# Every process that imports this module would start the nightly thread; enable it
+# in one designated process (e.g. a single API worker)
+NIGHTLY_RESCHEDULE = os.getenv("NIGHTLY_RESCHEDULE", "false").lower() == "true"
+
+# Advisory lock class for the daily agenda. Writers that change which chapters are
+# due today hold (class, hash(email)) while they invalidate, and the shared (class, 0);
+# the nightly materialization holds (class, 0) exclusively. A nightly run holds
+# (class, 1) so that only one process runs it at a time.
+AGENDA_LOCK_CLASS = 4501
+NIGHTLY_LOCK_KEY = 1
+
+# Materializes today's incomplete chapters per user (or for one user) into `daily_agenda`
+MATERIALIZE_AGENDA_QUERY = """
+    INSERT INTO daily_agenda (email, agenda_date, chapters)
+    SELECT u.email, %(today)s::date, COALESCE(due.chapters, '[]'::jsonb)
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT jsonb_agg(
+                   jsonb_build_object(
+                       'chapter_id', cc.chapter_id,
+                       'title', cc.title,
+                       'scheduled_date', cc.scheduled_date,
+                       'subject', c.subject
+                   )
+                   ORDER BY cc.scheduled_date, cc.chapter_id
+               ) AS chapters
+        FROM curriculum_chapters cc
+        JOIN curriculums c ON cc.curriculum_id = c.curriculum_id
+        WHERE c.email = u.email
+          AND cc.scheduled_date = %(today)s
+          AND cc.is_completed = FALSE
+    ) AS due ON TRUE
+    WHERE %(email)s IS NULL OR u.email = %(email)s
+    ON CONFLICT (email, agenda_date) DO UPDATE
+    SET chapters = EXCLUDED.chapters, computed_at = NOW()
+    RETURNING chapters
+"""
+
+# Re-plans every curriculum with an incomplete chapter scheduled before today: its
+# incomplete chapters, in their current order, are spread from today at the
+# curriculum's commitment interval (the same cadence as `calculate_scheduled_dates`).
+RESCHEDULE_MISSED_CHAPTERS_QUERY = """
+    WITH overdue AS (
+        SELECT DISTINCT cc.curriculum_id
+        FROM curriculum_chapters cc
+        JOIN curriculums c ON cc.curriculum_id = c.curriculum_id
+        WHERE cc.is_completed = FALSE
+          AND cc.scheduled_date < %(today)s
+          AND (%(email)s IS NULL OR c.email = %(email)s)
+    ),
+    replanned AS (
+        SELECT cc.chapter_id,
+               %(today)s::date + FLOOR(
+                   CASE c.commitment_level
+                       WHEN 'Daily' THEN 1
+                       WHEN 'Twice a Week' THEN 3.5
+                       WHEN 'Monthly' THEN 30
+                       ELSE 7
+                   END
+                   * (ROW_NUMBER() OVER (
+                       PARTITION BY cc.curriculum_id
+                       ORDER BY cc.scheduled_date, cc.chapter_id
+                   ) - 1)
+               )::int AS scheduled_date
+        FROM curriculum_chapters cc
+        JOIN overdue o ON cc.curriculum_id = o.curriculum_id
+        JOIN curriculums c ON cc.curriculum_id = c.curriculum_id
+        WHERE cc.is_completed = FALSE
+    )
+    UPDATE curriculum_chapters cc
+    SET scheduled_date = replanned.scheduled_date
+    FROM replanned
+    WHERE cc.chapter_id = replanned.chapter_id
+      AND cc.scheduled_date IS DISTINCT FROM replanned.scheduled_date
+"""
+
 
 class ChapterHanlder:
-    def __init__(self):
+    def __init__(self, nightly_reschedule: bool = NIGHTLY_RESCHEDULE):
         print("ChapterHanlder initialized!")
+        if nightly_reschedule:
+            threading.Thread(target=self._nightly_loop, name="nightly-reschedule", daemon=True).start()
+
+    @staticmethod
+    def _format_scheduled_chapters(today_date: str, chapters: list) -> dict:
+        print("Filtered Incomplete Chapters for Today:", chapters)
+
+        return {
+            "today_date": today_date,
+            "scheduled_chapters": chapters,
+        }
 
     def get_scheduled_chapters(self, email: str):
         """
         Fetch scheduled and incomplete chapters for the user along with today's date and subject of the curriculum.
+        Reads the user's materialized agenda row, computing it on a miss.
         """
         today_date = get_today_date()
-        database_manager.cursor.execute(
-            """
-            SELECT cc.chapter_id, cc.title, cc.scheduled_date, c.subject
-            FROM curriculum_chapters cc
-            JOIN curriculums c ON cc.curriculum_id = c.curriculum_id
-            WHERE c.email = %s
-            AND cc.scheduled_date = %s
-            AND cc.is_completed = FALSE
-            ORDER BY cc.scheduled_date ASC
-        """,
+        row = database_manager.run_query(
+            "SELECT chapters FROM daily_agenda WHERE email = %s AND agenda_date = %s",
             (email, today_date),
+            fetch="one",
         )
-        chapters = database_manager.cursor.fetchall()
+        chapters = row[0] if row else self.refresh_agenda(email, today_date)
+        return self._format_scheduled_chapters(today_date, chapters)
 
-        print("Filtered Incomplete Chapters for Today:", chapters)
+    async def aget_scheduled_chapters(self, email: str):
+        """
+        Async variant of `get_scheduled_chapters`.
+        """
+        return await asyncio.to_thread(self.get_scheduled_chapters, email)
 
-        return {
-            "today_date": today_date,
-            "scheduled_chapters": [
-                {
-                    "chapter_id": row[0],
-                    "title": row[1],
-                    "scheduled_date": row[2].strftime("%Y-%m-%d"),
-                    "subject": row[3],
-                }
-                for row in chapters
-            ],
-        }
+    def refresh_agenda(self, email: str, today_date: Optional[str] = None) -> list:
+        """
+        Recompute and store one user's agenda for today, returning its chapters.
+        """
+        with database_manager.pooled_transaction() as cursor:
+            # Waits for a writer that is changing this user's chapters to commit
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (AGENDA_LOCK_CLASS, email))
+            cursor.execute(MATERIALIZE_AGENDA_QUERY, {"today": today_date or get_today_date(), "email": email})
+            row = cursor.fetchone()
+        return row[0] if row else []
+
+    def invalidate_agenda(self, email: str, cursor=None):
+        """
+        Drop the user's materialized agenda. Call it inside the transaction that changes
+        their chapters' completion or dates, so a concurrent refresh cannot store the
+        pre-change agenda.
+        """
+        if cursor is None:
+            with database_manager.pooled_transaction() as cursor:
+                return self.invalidate_agenda(email, cursor)
+        cursor.execute("SELECT pg_advisory_xact_lock_shared(%s, 0)", (AGENDA_LOCK_CLASS,))
+        cursor.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (AGENDA_LOCK_CLASS, email))
+        cursor.execute("DELETE FROM daily_agenda WHERE email = %s", (email,))
+
+    def invalidate_agenda_for_curriculum(self, curriculum_id: int, cursor):
+        cursor.execute("SELECT email FROM curriculums WHERE curriculum_id = %s", (curriculum_id,))
+        row = cursor.fetchone()
+        if row:
+            self.invalidate_agenda(row[0], cursor)
+
+    def materialize_agenda(self, today_date: Optional[str] = None, cursor=None) -> int:
+        """
+        Compute every user's agenda for today in one statement and drop earlier days.
+        Returns the number of users materialized.
+        """
+        today_date = today_date or get_today_date()
+        if cursor is None:
+            with database_manager.pooled_transaction() as cursor:
+                return self.materialize_agenda(today_date, cursor)
+        cursor.execute("SELECT pg_advisory_xact_lock(%s, 0)", (AGENDA_LOCK_CLASS,))
+        cursor.execute("DELETE FROM daily_agenda WHERE agenda_date < %s", (today_date,))
+        cursor.execute(MATERIALIZE_AGENDA_QUERY, {"today": today_date, "email": None})
+        return cursor.rowcount
+
+    def reschedule_missed_chapters(self, email: Optional[str] = None, today: Optional[str] = None, cursor=None) -> int:
+        """
+        Shift the incomplete chapters of every curriculum that has fallen behind (or
+        only the given user's) so the earliest lands on today, in one set-based
+        statement. Returns the number of chapters moved. A single user's agenda is
+        invalidated here; after a run for everyone, call `materialize_agenda`.
+        """
+        params = {"today": today or get_today_date(), "email": email}
+        if cursor is None:
+            with database_manager.pooled_transaction() as cursor:
+                return self.reschedule_missed_chapters(email, today, cursor)
+        if email is not None:
+            self.invalidate_agenda(email, cursor)
+        cursor.execute(RESCHEDULE_MISSED_CHAPTERS_QUERY, params)
+        return cursor.rowcount
+
+    def run_nightly(self) -> bool:
+        """
+        Reschedule everyone's missed chapters and materialize today's agendas in one
+        transaction. Skipped (returns False) while another process holds the nightly
+        lock, so concurrent runs never overlap their global updates.
+        """
+        with database_manager.pooled_transaction() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s, %s)", (AGENDA_LOCK_CLASS, NIGHTLY_LOCK_KEY))
+            if not cursor.fetchone()[0]:
+                print("[INFO] Nightly reschedule is running in another process; skipped")
+                return False
+            moved = self.reschedule_missed_chapters(cursor=cursor)
+            print(f"[INFO] Nightly reschedule moved {moved} missed chapters")
+            users = self.materialize_agenda(cursor=cursor)
+            print(f"[INFO] Materialized today's agenda for {users} users")
+        return True
+
+    def _nightly_loop(self):
+        # Also runs at startup, catching up on a midnight the process was down for.
+        # Running more than once a day is a no-op.
+        while True:
+            try:
+                self.run_nightly()
+            except Exception as e:
+                print(f"[ERROR] Nightly reschedule failed: {e}")
+            time.sleep(seconds_until_tomorrow() + 1)
 
-chapter_handler = ChapterHanlder()
\ No newline at end of file
+chapter_handler = ChapterHanlder()
@@ -85,8 +85,7 @@ class ContextHandler:
                 INSERT INTO document_summaries (email, filename, topic, summary)
                 VALUES (%s, %s, %s, %s)
             """
-            database_manager.cursor.execute(query, (user_email, filename, topic, summary))
-            database_manager.cursor.connection.commit()
+            database_manager.run_query(query, (user_email, filename, topic, summary), fetch="none")
         except Exception as e:
             print(f"[ERROR] Storing document summary: {e}")
 
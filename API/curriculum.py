@@ -1,52 +1,66 @@
+import os
 import re
 import json
 import time
-from typing import Callable, Optional
-from datetime import datetime, timedelta
-from fuzzywuzzy import process
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Literal, Optional, Tuple
+from datetime import date, datetime, timedelta
+from pydantic import BaseModel, Field
+from psycopg2.extras import execute_values
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
 
 from langchain.schema import HumanMessage
 
 from utils.llm_utils import get_llm, get_llm_fast
+from utils.token_utils import take_within_budget
+from utils.executor_utils import background_executor
 from DB.index import database_manager
-from agent import create_agent_executor
-
-# Thread pool for background tasks
-background_executor = ThreadPoolExecutor(max_workers=10)
+from API.chapter import chapter_handler
+from API.lesson import lesson_handler
+from agent import get_default_agent_executor
+
+SUBJECT_MATCH_CUTOFF = 80
+SUBJECT_INDEX_MAX_USERS = int(os.getenv("SUBJECT_INDEX_MAX_USERS", 10000))
+IMPROVEMENT_PROMPT_MAX_TOKENS = int(os.getenv("IMPROVEMENT_PROMPT_MAX_TOKENS", 2000))
+
+# Recomputes a curriculum's materialized progress (counters and next chapter) from its chapters
+REFRESH_PROGRESS_QUERY = """
+    UPDATE curriculums cu
+    SET total_chapters = progress.total,
+        completed_chapters = progress.completed,
+        next_chapter_id = progress.next_chapter_id
+    FROM (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE is_completed) AS completed,
+               MIN(chapter_id) FILTER (WHERE is_completed IS NOT TRUE) AS next_chapter_id
+        FROM curriculum_chapters
+        WHERE curriculum_id = %s
+    ) AS progress
+    WHERE cu.curriculum_id = %s
+"""
+
+ENROLLMENT_QUERY = """
+    SELECT curriculum_id, subject, start_date, commitment_level, duration_per_session,
+           goal_description, learning_goal, created_at, completed_chapters, total_chapters
+    FROM curriculums
+    WHERE email = %s
+    ORDER BY created_at DESC
+"""
 
 class CurriculumHandler:
     def __init__(self):
         print("CurriculumHandler initialized!")
 
-    def generate_chapter_lesson(self, subject: str, chapter_title: str, chapter_description: str) -> str:
-        """
-        Creates a step-by-step lesson plan from the LLM for the chapter.
-        Returns the lesson plan text.
-        """
-
-        llm = get_llm()
-        prompt = f"""
-        You are a highly experienced and engaging teacher with expertise in making complex topics accessible.
-        The user is studying the course: {subject}
-        Chapter Title: "{chapter_title}"
-        Chapter Description: "{chapter_description}"
-
-        Create a comprehensive, step-by-step lesson plan for this chapter. Include:
-        1) Key Learning Objectives
-        2) Core Content (explanations, real-world examples, questions)
-        3) Interactive Exercises
-        4) Conclusion and Recap
-
-        Ask the user if they have any questions at the end.
-        """
-
-        response = llm([HumanMessage(content=prompt)])
-        return response.content.strip()
-    
     def get_next_chapter_to_learn(
     self, email: str, subject: str, on_continue_course: Optional[Callable[[str, int, str], None]] = None
 ) -> str:
+        """
+        Start the user's next chapter: show the first lesson section (later sections
+        are generated on demand through ContinueLesson, the next one prefetched) and
+        queue the chapter's quiz if it has none yet.
+        """
         # Fetch next chapter data
         chapter_data, error_message = self.get_next_chapter_data(email, subject)
         if error_message:
@@ -55,60 +69,45 @@ class CurriculumHandler:
         chapter_id, chapter_title, chapter_description, matched_subject = chapter_data
 
         # Check if quiz already exists
-        database_manager.cursor.execute(
-            "SELECT EXISTS (SELECT 1 FROM quiz_questions WHERE chapter_id = %s)", 
-            (chapter_id,)
-        )
-        quiz_exists = database_manager.cursor.fetchone()[0]
-
-        # Generate lesson content and quiz concurrently
-        lesson_future = background_executor.submit(
-            self.generate_chapter_lesson, matched_subject, chapter_title, chapter_description
-        )
+        quiz_exists = database_manager.run_query(
+            "SELECT EXISTS (SELECT 1 FROM quiz_questions WHERE chapter_id = %s)",
+            (chapter_id,),
+            fetch="one",
+        )[0]
         if not quiz_exists:
-            background_executor.submit(generate_quiz_for_chapter, chapter_id, chapter_title, chapter_description)
-
-        # Wait for the lesson content to complete
-        lesson_content = lesson_future.result()
-        quiz_status = "Quiz ready" if quiz_exists else "Quiz will be available after the lesson."
-
-        # Optionally call the callback after lesson content is ready
-        if on_continue_course:
-            on_continue_course(
-                subject=matched_subject,
-                chapter_id=chapter_id,
-                generated_content=lesson_content,
+            # Skipped under overload; the quiz is generated again on the next visit
+            background_executor.try_submit(
+                "prefetch", generate_quiz_for_chapter, chapter_id, chapter_title, chapter_description
             )
 
-        return json.dumps({
+        chapter = {
             "chapter_id": chapter_id,
-            "user_message": (f"{lesson_content}\n\n{quiz_status}",
-                             "Are you ready to take the MCQ quiz to test your understanding?"
-            )
-            
-        })
+            "subject": matched_subject,
+            "title": chapter_title,
+            "description": chapter_description,
+        }
+        return lesson_handler.deliver_section(chapter, 0, on_continue_course)
 
     def get_next_chapter_data(self, email: str, subject: str):
-        normalized_subject = get_closest_subject(email, subject)
-        if not normalized_subject:
+        match = subject_index.resolve(email, subject)
+        if not match:
             return None, f"No enrolled course found for subject: {subject}. Please check the course name."
+        normalized_subject, curriculum_ids = match
 
-        # SINGLE QUERY: retrieve the newest curriculum + next incomplete chapter
-        database_manager.cursor.execute(
+        # Primary-key lookups: the newest matching curriculum with a materialized next chapter
+        row = database_manager.run_query(
             """
             SELECT c.chapter_id, c.title, c.description, cu.subject
             FROM curriculums cu
             JOIN curriculum_chapters c 
-                ON cu.curriculum_id = c.curriculum_id
-            WHERE cu.email = %s
-            AND LOWER(cu.subject) = LOWER(%s)
-            AND (c.is_completed = FALSE OR c.is_completed IS NULL)
-            ORDER BY cu.created_at DESC, c.chapter_id ASC
+                ON c.chapter_id = cu.next_chapter_id
+            WHERE cu.curriculum_id = ANY(%s)
+            ORDER BY cu.created_at DESC
             LIMIT 1
             """,
-            (email, normalized_subject),
+            (curriculum_ids,),
+            fetch="one",
         )
-        row = database_manager.cursor.fetchone()
         
         if not row:
             # Could be no incomplete chapters OR no curriculum at all
@@ -117,6 +116,21 @@ class CurriculumHandler:
         chapter_id, chapter_title, chapter_description, matched_subject = row
         return (chapter_id, chapter_title, chapter_description, matched_subject), None
 
+    def refresh_progress(self, curriculum_id: int, cursor=None):
+        """
+        Recompute `total_chapters`, `completed_chapters` and `next_chapter_id` for a
+        curriculum. Pass the cursor of an open transaction to update them atomically
+        with the chapter change; without one the refresh runs in its own pooled
+        transaction. The curriculum row is locked so concurrent updates serialize
+        instead of writing stale counts.
+        """
+        if cursor is None:
+            with database_manager.pooled_transaction() as cursor:
+                self.refresh_progress(curriculum_id, cursor)
+            return
+        cursor.execute("SELECT 1 FROM curriculums WHERE curriculum_id = %s FOR UPDATE", (curriculum_id,))
+        cursor.execute(REFRESH_PROGRESS_QUERY, (curriculum_id, curriculum_id))
+
     def calculate_scheduled_dates(self, commitment_level: str, start_date: str, total_chapters: int) -> list:
         """Calculate the scheduled dates for chapters based on commitment level."""
         start = datetime.strptime(start_date, "%Y-%m-%d")
@@ -142,10 +156,14 @@ class CurriculumHandler:
         duration_per_session,
         start_date,
         learning_goal,
+        on_progress: Optional[Callable[[str], None]] = None,
+        generate_quizzes: bool = False,
     ):
         """
         Uses LLM to generate chapters for a given subject, then
         saves curriculum & chapters to the database.
+        `on_progress` is called with "outline" once the chapters are generated.
+        With `generate_quizzes`, quizzes for all chapters are queued right away.
         """
         print(f"[DEBUG] Generating chapters for subject: {subject}")
 
@@ -177,53 +195,55 @@ class CurriculumHandler:
             print("Chapters JSON is not in the expected list-of-dicts format.")
             return None
 
+        if on_progress:
+            on_progress("outline")
+
         # Calculate scheduled dates
         total_chapters = len(chapters)
         scheduled_dates = self.calculate_scheduled_dates(commitment_level, start_date, total_chapters)
 
-        # Insert the curriculum
+        # Insert the curriculum and its chapters in one transaction
         try:
-            database_manager.cursor.execute(
-                """
-                INSERT INTO curriculums (email, subject, goal_description, commitment_level, duration_per_session, 
-                                         start_date, learning_goal, created_at)
-                VALUES (
-                    %s, 
-                    INITCAP(SUBSTRING(%s FROM 1 FOR 1)) || LOWER(SUBSTRING(%s FROM 2)),
-                    %s, %s, %s, %s, %s, %s
-                ) RETURNING curriculum_id
-                """,
-                (
-                    email,
-                    subject,
-                    subject,
-                    goal_description,
-                    commitment_level,
-                    duration_per_session.split()[0],
-                    start_date,
-                    learning_goal,
-                    datetime.now(),
-                ),
-            )
-            curriculum_id = database_manager.cursor.fetchone()[0]
-
-            # Prepare data for batch insertion
-            chapters_data = [
-                (curriculum_id, chapter.get("title", "").strip()[:255], chapter.get("description", "").strip(), scheduled_dates[i])
-                for i, chapter in enumerate(chapters)
-            ]
-
-            # Perform batch insert
-            future = background_executor.submit(
-                database_manager.cursor.executemany,
-                """
-                INSERT INTO curriculum_chapters (curriculum_id, title, description, scheduled_date)
-                VALUES (%s, %s, %s, %s)
-                """,
-                chapters_data,
-            )
-            future.result()  # blocks until done
-            database_manager.cursor.connection.commit()
+            with database_manager.pooled_transaction() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO curriculums (email, subject, goal_description, commitment_level, duration_per_session, 
+                                             start_date, learning_goal, created_at)
+                    VALUES (
+                        %s, 
+                        INITCAP(SUBSTRING(%s FROM 1 FOR 1)) || LOWER(SUBSTRING(%s FROM 2)),
+                        %s, %s, %s, %s, %s, %s
+                    ) RETURNING curriculum_id
+                    """,
+                    (
+                        email,
+                        subject,
+                        subject,
+                        goal_description,
+                        commitment_level,
+                        duration_per_session.split()[0],
+                        start_date,
+                        learning_goal,
+                        datetime.now(),
+                    ),
+                )
+                curriculum_id = cursor.fetchone()[0]
+
+                database_manager.bulk_insert(
+                    "curriculum_chapters",
+                    ("curriculum_id", "title", "description", "scheduled_date"),
+                    [
+                        (curriculum_id, chapter.get("title", "").strip()[:255], chapter.get("description", "").strip(), scheduled_dates[i])
+                        for i, chapter in enumerate(chapters)
+                    ],
+                    cursor=cursor,
+                )
+                self.refresh_progress(curriculum_id, cursor)
+                chapter_handler.invalidate_agenda(email, cursor)
+            subject_index.invalidate(email)
+
+            if generate_quizzes:
+                schedule_quiz_generation(curriculum_id)
             return curriculum_id
 
         except Exception as e:
@@ -231,18 +251,18 @@ class CurriculumHandler:
             return None
 
     def get_current_enrollment(self, email: str) -> str:
-        database_manager.cursor.execute(
-            """
-            SELECT curriculum_id, subject, start_date, commitment_level, duration_per_session, 
-                   goal_description, learning_goal, created_at
-            FROM curriculums
-            WHERE email = %s
-            ORDER BY created_at DESC
-            """,
-            (email,),
-        )
+        rows = database_manager.run_query(ENROLLMENT_QUERY, (email,))
+        return self._format_enrollment(rows)
+
+    async def aget_current_enrollment(self, email: str) -> str:
+        """
+        Async variant of `get_current_enrollment` using a pooled connection.
+        """
+        rows = await database_manager.arun_query(ENROLLMENT_QUERY, (email,))
+        return self._format_enrollment(rows)
 
-        rows = database_manager.cursor.fetchall()
+    @staticmethod
+    def _format_enrollment(rows: list) -> str:
         if not rows:
             return "You are not currently enrolled in any course."
 
@@ -256,6 +276,8 @@ class CurriculumHandler:
             goal_description,
             learning_goal,
             created_at,
+            completed_chapters,
+            total_chapters,
         ) in rows:
             result += f"""
             **Course ID:** {curriculum_id}
@@ -265,6 +287,7 @@ class CurriculumHandler:
             **Duration per Session:** {duration_per_session} minutes
             **Goal Description:** {goal_description if goal_description else 'N/A'}
             **Learning Goal:** {learning_goal if learning_goal else 'N/A'}
+            **Progress:** {completed_chapters}/{total_chapters} chapters completed
             Enrolled on: {created_at.strftime('%Y-%m-%d %H:%M:%S')}
     """
         return result.strip()
@@ -275,7 +298,7 @@ class CurriculumHandler:
         Returns a list of tuples:
         (question_text, option_a, option_b, option_c, option_d, correct_option)
         """
-        database_manager.cursor.execute(
+        return database_manager.run_query(
             """
             SELECT question_text, option_a, option_b, option_c, option_d, correct_option
             FROM quiz_questions
@@ -284,52 +307,48 @@ class CurriculumHandler:
             """,
             (chapter_id,),
         )
-        return database_manager.cursor.fetchall()
 
     def fetch_analyze_and_improve_curriculum(self, curriculum_id: int) -> dict:
         """
         (Optional) Fetches progress log reflections, analyzes them using an LLM,
-        and suggests curriculum improvements with potential DB modifications.
+        and applies the suggested improvements as a validated list of chapter
+        operations in one transaction.
         """
         # Fetch reflections
-
-        database_manager.cursor.execute(
+        reflections = database_manager.run_query(
             """
             SELECT qr.reflection_after_quiz, qr.taken_at, cc.title
             FROM quiz_results qr
             JOIN curriculum_chapters cc ON qr.chapter_id = cc.chapter_id
-            WHERE cc.curriculum_id = (
-                SELECT curriculum_id FROM curriculum_chapters WHERE chapter_id = %s
-            ) 
+            WHERE cc.curriculum_id = %s
             AND qr.reflection_after_quiz IS NOT NULL
             ORDER BY qr.taken_at DESC;
             """,
             (curriculum_id,),
         )
 
-        reflections = database_manager.cursor.fetchall()
-
         if not reflections:
             return {
                 "analysis": "No reflections available for this curriculum.",
                 "improvements": "No improvements suggested due to lack of data.",
             }
 
-        reflection_details = "\n".join(
-            f"Chapter: {title} | Phase: {phase} | Reflection: {reflection}"
-            for reflection, phase, _, title in reflections
-        )
+        reflection_details = "\n".join(take_within_budget(
+            [f"Chapter: {title} | Taken: {taken_at:%Y-%m-%d} | Reflection: {reflection}"
+             for reflection, taken_at, title in reflections],
+            IMPROVEMENT_PROMPT_MAX_TOKENS,
+        ))
 
         # Fetch curriculum for context
-        database_manager.cursor.execute(
+        curriculum = database_manager.run_query(
             """
             SELECT subject, goal_description, learning_goal 
             FROM curriculums 
             WHERE curriculum_id = %s
             """,
             (curriculum_id,),
+            fetch="one",
         )
-        curriculum = database_manager.cursor.fetchone()
         if not curriculum:
             return {
                 "analysis": "Curriculum not found.",
@@ -361,68 +380,61 @@ class CurriculumHandler:
 
         try:
             # Use the agent
-            agent_executor = create_agent_executor()
+            agent_executor = get_default_agent_executor()
             response = agent_executor.invoke({"input": prompt})
             structured_response = response.get("output", "").strip()
 
-            # Now fetch all chapters
-            database_manager.cursor.execute(
+            # Only incomplete chapters may change; the list is cut to the token budget
+            chapters = database_manager.run_query(
                 """
-                SELECT chapter_id, title, description, scheduled_date, is_completed
+                SELECT chapter_id, title, description, scheduled_date
                 FROM curriculum_chapters
-                WHERE curriculum_id = %s AND is_completed = 'false'
+                WHERE curriculum_id = %s AND is_completed = FALSE
+                ORDER BY scheduled_date, chapter_id
                 """,
                 (curriculum_id,),
             )
-            chapters = database_manager.cursor.fetchall()
-
-            # Prepare chapter details
-            chapter_details = "\n".join(
-                f"Chapter ID: {chapter_id}, Title: {title}, Description: {description}, "
-                f"Scheduled Date: {scheduled_date}, Completed: {is_completed}"
-                for chapter_id, title, description, scheduled_date, is_completed in chapters
+            chapter_lines = take_within_budget(
+                [
+                    f"- chapter_id {chapter_id} | {scheduled_date} | {title}: {(description or '')[:300]}"
+                    for chapter_id, title, description, scheduled_date in chapters
+                ],
+                IMPROVEMENT_PROMPT_MAX_TOKENS,
+            )
+            editable_ids = {chapter_id for chapter_id, *_ in chapters[:len(chapter_lines)]}
+            omitted = len(chapters) - len(chapter_lines)
+            chapter_details = "\n".join(chapter_lines) + (
+                f"\n({omitted} later chapters not shown; leave them unchanged)" if omitted else ""
             )
 
             modification_prompt = f"""
-            You are an expert database administrator and curriculum analyst. 
-
-            The database has the following table structure for `curriculum_chapters`:
-            - `chapter_id` (Primary Key, INT)
-            - `curriculum_id` (Foreign Key, INT)
-            - `title` (VARCHAR(255), NOT NULL)
-            - `description` (TEXT)
-            - `scheduled_date` (DATE)
-            - `is_completed` (BOOLEAN, DEFAULT FALSE)
-            - `created_at` (TIMESTAMP, DEFAULT CURRENT_TIMESTAMP)
-
-            You have analyzed the curriculum reflections and provided the following improvements:
+            You are an expert curriculum analyst. You have analyzed the curriculum reflections
+            and provided the following improvements:
             {structured_response}
 
-            Here are the existing chapters for the curriculum:
+            Here are the upcoming chapters of the curriculum (chapter_id | scheduled date | title: description):
             {chapter_details}
 
-            Based on the reflections and current chapters, suggest changes to the curriculum by generating SQL queries that:
-            1. Update existing chapters (e.g., change title, description, or scheduled date).
-            2. Delete redundant chapters.
-            3. Add new chapters (with appropriate `curriculum_id`, title, description, and scheduled date).
-
-            Format your response as valid SQL statements specific to the `curriculum_chapters` table. 
-            Ensure each query respects the database schema.
+            Turn the improvements into changes to these chapters. Reply with a JSON array of
+            operations only, each one of:
+            {{"op": "update", "chapter_id": <id>, "title": "...", "description": "...", "scheduled_date": "YYYY-MM-DD"}}
+              (include only the fields that change)
+            {{"op": "insert", "title": "...", "description": "...", "scheduled_date": "YYYY-MM-DD"}}
+            {{"op": "delete", "chapter_id": <id>}}
+            Titles are at most 255 characters. Reply with [] if nothing should change.
             """
 
-            modification_response = agent_executor.invoke({"input": modification_prompt})
-            modifications = modification_response.get("output", "").strip()
-
-            # Split and execute each SQL statement
-            sql_statements = modifications.split(";")
-            for statement in sql_statements:
-                if statement.strip():
-                    database_manager.cursor.execute(statement)
-            database_manager.cursor.connection.commit()
+            content = get_llm()([HumanMessage(content=modification_prompt)]).content.strip()
+            match = re.search(r"(\[.*\])", content, re.DOTALL)
+            if not match:
+                raise ValueError("No JSON array of chapter operations in the LLM response.")
+            operations = self.validate_chapter_operations(json.loads(match.group(1)), editable_ids)
+            self.apply_chapter_operations(curriculum_id, operations, structured_response)
 
             return {
                 "analysis": "Reflections analyzed successfully.",
                 "improvements": structured_response,
+                "operations": [operation.dict() for operation in operations],
             }
 
         except Exception as e:
@@ -431,43 +443,256 @@ class CurriculumHandler:
                 "improvements": f"Unable to provide improvements due to an LLM error: {str(e)}",
             }
 
+    @staticmethod
+    def validate_chapter_operations(items: list, editable_ids: set) -> List["ChapterOperation"]:
+        """
+        Parse and check model-proposed chapter operations. Updates and deletes may only
+        target the incomplete chapters that were shown to the model.
+        """
+        if not isinstance(items, list):
+            raise ValueError("Chapter operations must be a JSON array.")
+        operations = []
+        for item in items:
+            operation = ChapterOperation(**item)
+            if operation.op in ("update", "delete") and operation.chapter_id not in editable_ids:
+                raise ValueError(f"Operation targets a chapter that cannot be changed: {item}")
+            if operation.op == "update" and not any(
+                (operation.title, operation.description, operation.scheduled_date)
+            ):
+                raise ValueError(f"Update changes nothing: {item}")
+            if operation.op == "insert" and not (operation.title and operation.scheduled_date):
+                raise ValueError(f"Insert needs a title and a scheduled_date: {item}")
+            operations.append(operation)
+        return operations
+
+    def apply_chapter_operations(
+        self, curriculum_id: int, operations: List["ChapterOperation"], improvements: str = ""
+    ) -> Optional[int]:
+        """
+        Apply validated chapter operations in one transaction, one batched statement per
+        operation type, and record them in `curriculum_revisions` so a run can be
+        inspected or replayed. Returns the revision id, or None if there was nothing to do.
+        """
+        if not operations:
+            return None
+        deletes = [op.chapter_id for op in operations if op.op == "delete"]
+        updates = [
+            (op.chapter_id, op.title, op.description, op.scheduled_date)
+            for op in operations if op.op == "update"
+        ]
+        inserts = [
+            (curriculum_id, op.title, op.description or "", op.scheduled_date)
+            for op in operations if op.op == "insert"
+        ]
+
+        with database_manager.pooled_transaction() as cursor:
+            # Serializes concurrent improvement runs on the same curriculum
+            cursor.execute("SELECT email FROM curriculums WHERE curriculum_id = %s FOR UPDATE", (curriculum_id,))
+            chapter_handler.invalidate_agenda(cursor.fetchone()[0], cursor)
+            if deletes:
+                cursor.execute(
+                    """
+                    SELECT chapter_id FROM quiz_results WHERE chapter_id = ANY(%s) LIMIT 1
+                    """,
+                    (deletes,),
+                )
+                attempted = cursor.fetchone()
+                if attempted:
+                    raise ValueError(f"Chapter {attempted[0]} has quiz attempts and cannot be deleted.")
+                cursor.execute("DELETE FROM quiz_questions WHERE chapter_id = ANY(%s)", (deletes,))
+                cursor.execute(
+                    "DELETE FROM curriculum_chapters WHERE curriculum_id = %s AND chapter_id = ANY(%s)",
+                    (curriculum_id, deletes),
+                )
+            if updates:
+                # Lessons were generated from the old title and description
+                rewritten = [update[0] for update in updates if update[1] is not None or update[2] is not None]
+                if rewritten:
+                    cursor.execute("DELETE FROM lesson_sections WHERE chapter_id = ANY(%s)", (rewritten,))
+                execute_values(
+                    cursor,
+                    """
+                    UPDATE curriculum_chapters cc
+                    SET title = COALESCE(v.title, cc.title),
+                        description = COALESCE(v.description, cc.description),
+                        scheduled_date = COALESCE(v.scheduled_date, cc.scheduled_date)
+                    FROM (VALUES %s) AS v (chapter_id, title, description, scheduled_date)
+                    WHERE cc.chapter_id = v.chapter_id AND cc.is_completed = FALSE
+                    """,
+                    updates,
+                    template="(%s::int, %s::varchar, %s::text, %s::date)",
+                )
+            if inserts:
+                database_manager.bulk_insert(
+                    "curriculum_chapters",
+                    ("curriculum_id", "title", "description", "scheduled_date"),
+                    inserts,
+                    cursor=cursor,
+                )
+            self.refresh_progress(curriculum_id, cursor)
+            cursor.execute(
+                """
+                INSERT INTO curriculum_revisions (curriculum_id, improvements, operations)
+                VALUES (%s, %s, %s) RETURNING revision_id
+                """,
+                (curriculum_id, improvements, json.dumps([op.dict() for op in operations], default=str)),
+            )
+            revision_id = cursor.fetchone()[0]
+
+        print(
+            f"[INFO] Curriculum {curriculum_id} revision {revision_id}: "
+            f"{len(updates)} updated, {len(inserts)} inserted, {len(deletes)} deleted"
+        )
+        return revision_id
+
+
+class ChapterOperation(BaseModel):
+    """
+    One model-proposed change to a curriculum's chapters.
+    """
+    op: Literal["update", "insert", "delete"]
+    chapter_id: Optional[int] = None
+    title: Optional[str] = Field(None, max_length=255)
+    description: Optional[str] = None
+    scheduled_date: Optional[date] = None
+
+
+class SubjectIndex:
+    """
+    Per-user cache of enrolled subjects: lowercase subject -> (canonical subject,
+    curriculum ids, newest first). Loaded with one query and invalidated whenever
+    the user creates a curriculum, so resolving a subject is an in-memory lookup.
+    """
+
+    def __init__(self, max_users: int = SUBJECT_INDEX_MAX_USERS):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[str, Dict[str, Tuple[str, List[int]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, email: str) -> Dict[str, Tuple[str, List[int]]]:
+        rows = database_manager.run_query(
+            """
+            SELECT curriculum_id, subject
+            FROM curriculums
+            WHERE email = %s
+            ORDER BY created_at DESC
+            """,
+            (email,),
+        )
+        index: Dict[str, Tuple[str, List[int]]] = {}
+        for curriculum_id, subject in rows:
+            # The newest curriculum's casing wins
+            index.setdefault(subject.lower(), (subject, []))[1].append(curriculum_id)
+        return index
+
+    def get(self, email: str, refresh: bool = False) -> Dict[str, Tuple[str, List[int]]]:
+        with self._lock:
+            index = None if refresh else self._indexes.get(email)
+            if index is not None:
+                self._indexes.move_to_end(email)
+                return index
+        index = self._load(email)
+        with self._lock:
+            self._indexes[email] = index
+            self._indexes.move_to_end(email)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    def invalidate(self, email: str):
+        with self._lock:
+            self._indexes.pop(email, None)
+
+    def _match(self, index: Dict[str, Tuple[str, List[int]]], subject: str) -> Optional[Tuple[str, List[int]]]:
+        subject_lower = subject.lower().strip()
+        if subject_lower in index:
+            return index[subject_lower]
+        match = process.extractOne(
+            subject_lower, list(index), scorer=fuzz.WRatio,
+            processor=default_process, score_cutoff=SUBJECT_MATCH_CUTOFF,
+        )
+        return index[match[0]] if match else None
+
+    def resolve(self, email: str, subject: str) -> Optional[Tuple[str, List[int]]]:
+        """
+        Fuzzy-match `subject` against the user's subjects. Returns
+        (canonical subject, curriculum ids) or None.
+        """
+        match = self._match(self.get(email), subject)
+        if match is None:
+            # The curriculum may have been created by another process; reload once
+            match = self._match(self.get(email, refresh=True), subject)
+        return match
+
+
+subject_index = SubjectIndex()
+
+
 def get_closest_subject(email: str, subject: str) -> Optional[str]:
     """
     Finds the closest matching subject for a user using fuzzy matching with case-insensitivity.
     Returns the subject with the original case as stored in the DB if a match is found.
     """
+    match = subject_index.resolve(email, subject)
+    return match[0] if match else None
 
-    database_manager.cursor.execute(
-        """
-        SELECT DISTINCT LOWER(subject) AS normalized_subject 
-        FROM curriculums 
-        WHERE email = %s
-        """,
-        (email,),
-    )
-    subjects = [row[0] for row in database_manager.cursor.fetchall()]
 
-    if not subjects:
-        return None  # No subjects available for this user
+QUIZ_QUESTIONS_PER_CHAPTER = 6
+QUIZ_BATCH_SIZE = int(os.getenv("QUIZ_BATCH_SIZE", 4))
+EAGER_QUIZ_GENERATION = os.getenv("EAGER_QUIZ_GENERATION", "true").lower() == "true"
 
-    subject_lower = subject.lower()
-    best_match, score = process.extractOne(subject_lower, subjects)
-    if score >= 80:
-        # Return the original-cased subject from the DB
-        database_manager.cursor.execute(
-            """
-            SELECT subject 
-            FROM curriculums 
-            WHERE email = %s AND LOWER(subject) = %s
-            LIMIT 1
-            """,
-            (email, best_match),
+QUIZ_FORMAT_INSTRUCTIONS = """
+        Each question must have:
+        - Four options: A, B, C, and D.
+        - Indicate the correct option (A, B, C, or D).
+
+        A question looks like this:
+        {
+            "question": "What is the capital of France?",
+            "options": ["Paris", "Madrid", "Berlin", "Rome"],
+            "correct_option": "A"
+        }
+"""
+
+
+def _validate_quiz_questions(quiz_questions) -> List[dict]:
+    if not isinstance(quiz_questions, list) or not quiz_questions:
+        raise ValueError("Expected a non-empty JSON array of questions.")
+    for question in quiz_questions:
+        if (
+            not isinstance(question, dict)
+            or "question" not in question
+            or "options" not in question
+            or len(question["options"]) != 4
+            or "correct_option" not in question
+            or question["correct_option"] not in ["A", "B", "C", "D"]
+        ):
+            raise ValueError(f"Invalid question format: {question}")
+    return quiz_questions
+
+
+def save_quiz_questions(chapter_id: int, quiz_questions: List[dict]) -> bool:
+    """
+    Insert a chapter's questions in one transaction. Returns False (and inserts
+    nothing) if the chapter already has a quiz, so concurrent generators for the
+    same chapter never produce a double quiz.
+    """
+    with database_manager.pooled_transaction() as cursor:
+        # Serializes writers per chapter until the transaction ends
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (chapter_id,))
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM quiz_questions WHERE chapter_id = %s)", (chapter_id,))
+        if cursor.fetchone()[0]:
+            return False
+        database_manager.bulk_insert(
+            "quiz_questions",
+            ("chapter_id", "question_text", "option_a", "option_b", "option_c", "option_d", "correct_option"),
+            [
+                (chapter_id, question["question"], *question["options"], question["correct_option"])
+                for question in quiz_questions
+            ],
+            cursor=cursor,
         )
-        original_subject = database_manager.cursor.fetchone()
-        
-        return original_subject[0] if original_subject else None
-    
-    return None
+    return True
 
 
 def generate_quiz_for_chapter(chapter_id: int, chapter_title: str, chapter_description: str) -> str:
@@ -481,19 +706,9 @@ def generate_quiz_for_chapter(chapter_id: int, chapter_title: str, chapter_descr
         You are an expert quiz creator. Based on the chapter titled "{chapter_title}" with the following description:
         "{chapter_description}"
 
-        Create 6 multiple-choice questions (MCQs) in strict JSON format. Each question must have:
-        - Four options: A, B, C, and D.
-        - Indicate the correct option (A, B, C, or D).
-
-        The output must be a JSON array of dictionaries like this:
-        [
-            {{
-                "question": "What is the capital of France?",
-                "options": ["Paris", "Madrid", "Berlin", "Rome"],
-                "correct_option": "A"
-            }},
-            ...
-        ]
+        Create {QUIZ_QUESTIONS_PER_CHAPTER} multiple-choice questions (MCQs) in strict JSON format.
+        {QUIZ_FORMAT_INSTRUCTIONS}
+        The output must be a JSON array of such question objects.
         """
 
         response = llm([HumanMessage(content=prompt)])
@@ -503,43 +718,111 @@ def generate_quiz_for_chapter(chapter_id: int, chapter_title: str, chapter_descr
         match = re.search(r"(\[.*\])", content, re.DOTALL)
         if not match:
             raise ValueError("No valid JSON array found in LLM response.")
-        quiz_questions = json.loads(match.group(1))
-
-        # Basic validation
-        for question in quiz_questions:
-            if (
-                "question" not in question
-                or "options" not in question
-                or len(question["options"]) != 4
-                or "correct_option" not in question
-                or question["correct_option"] not in ["A", "B", "C", "D"]
-            ):
-                raise ValueError(f"Invalid question format: {question}")
-
-        # Insert into DB
-        for question in quiz_questions:
-            database_manager.cursor.execute(
-                """
-                INSERT INTO quiz_questions (chapter_id, question_text, option_a, option_b, option_c, option_d, correct_option)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    chapter_id,
-                    question["question"],
-                    question["options"][0],
-                    question["options"][1],
-                    question["options"][2],
-                    question["options"][3],
-                    question["correct_option"],
-                ),
-            )
-        database_manager.cursor.connection.commit()
+        quiz_questions = _validate_quiz_questions(json.loads(match.group(1)))
 
+        if not save_quiz_questions(chapter_id, quiz_questions):
+            return f"Quiz already exists for chapter {chapter_title} (chapter_id={chapter_id})."
         return f"Quiz created and saved successfully for chapter {chapter_title} (chapter_id={chapter_id})."
 
     except Exception as e:
+        print(f"[ERROR] Failed to generate or save quiz for chapter {chapter_id}: {e}")
         return f"Failed to generate or save quiz for chapter {chapter_id}: {str(e)}"
 
 
+def generate_quizzes_for_chapters(chapters: List[Tuple[int, str, str]]) -> List[int]:
+    """
+    Generates quizzes for several chapters with a single LLM call and saves them.
+    `chapters` holds (chapter_id, title, description) tuples. Chapters missing from
+    the response, or with malformed questions, fall back to one call each.
+    Returns the ids of chapters still without a quiz.
+    """
+    chapter_list = "\n".join(
+        f'- chapter_id {chapter_id}: "{title}" - {description}' for chapter_id, title, description in chapters
+    )
+    prompt = f"""
+        You are an expert quiz creator. For each of the following chapters, create
+        {QUIZ_QUESTIONS_PER_CHAPTER} multiple-choice questions (MCQs) based on its title and description:
+        {chapter_list}
+        {QUIZ_FORMAT_INSTRUCTIONS}
+        The output must be a strict JSON object mapping each chapter_id (as a string)
+        to the JSON array of its question objects, e.g. {{"12": [...], "13": [...]}}.
+        """
+
+    quizzes = {}
+    try:
+        response = get_llm()([HumanMessage(content=prompt)])
+        match = re.search(r"(\{.*\})", response.content.strip(), re.DOTALL)
+        if not match:
+            raise ValueError("No valid JSON object found in LLM response.")
+        quizzes = json.loads(match.group(1))
+    except Exception as e:
+        print(f"[ERROR] Batched quiz generation failed for chapters {[c[0] for c in chapters]}: {e}")
+
+    missing = []
+    for chapter_id, title, description in chapters:
+        try:
+            save_quiz_questions(chapter_id, _validate_quiz_questions(quizzes.get(str(chapter_id))))
+            continue
+        except Exception as e:
+            print(f"[WARN] Batched quiz for chapter {chapter_id} unusable ({e}); generating it on its own")
+        if generate_quiz_for_chapter(chapter_id, title, description).startswith("Failed"):
+            missing.append(chapter_id)
+    return missing
+
+
+def chapters_without_quiz(curriculum_id: int) -> List[Tuple[int, str, str]]:
+    return database_manager.run_query(
+        """
+        SELECT cc.chapter_id, cc.title, cc.description
+        FROM curriculum_chapters cc
+        WHERE cc.curriculum_id = %s
+          AND NOT EXISTS (SELECT 1 FROM quiz_questions q WHERE q.chapter_id = cc.chapter_id)
+        ORDER BY cc.chapter_id
+        """,
+        (curriculum_id,),
+    )
+
+
+def schedule_quiz_generation(curriculum_id: int) -> list:
+    """
+    Queue quiz generation for every chapter of the curriculum that has no quiz yet,
+    QUIZ_BATCH_SIZE chapters per LLM call, on the prefetch lane (whose worker cap
+    bounds how many run at once). Returns the futures of the accepted batches;
+    batches rejected under overload are left to the on-demand paths.
+    """
+    chapters = chapters_without_quiz(curriculum_id)
+    futures = []
+    for i in range(0, len(chapters), QUIZ_BATCH_SIZE):
+        future = background_executor.try_submit(
+            "prefetch", generate_quizzes_for_chapters, chapters[i:i + QUIZ_BATCH_SIZE]
+        )
+        if future is not None:
+            futures.append(future)
+    print(f"[INFO] Scheduled {len(futures)} quiz batches for {len(chapters)} chapters of curriculum {curriculum_id}")
+    return futures
+
+
+def ensure_quiz_for_chapter(chapter_id: int) -> bool:
+    """
+    Generate the chapter's quiz in the caller's thread if it has none yet.
+    Returns True once the chapter has a quiz.
+    """
+    row = database_manager.run_query(
+        """
+        SELECT title, description,
+               EXISTS (SELECT 1 FROM quiz_questions WHERE chapter_id = %s)
+        FROM curriculum_chapters WHERE chapter_id = %s
+        """,
+        (chapter_id, chapter_id),
+        fetch="one",
+    )
+    if row is None:
+        return False
+    title, description, quiz_exists = row
+    if quiz_exists:
+        return True
+    return not generate_quiz_for_chapter(chapter_id, title, description).startswith("Failed")
+
+
 # Instantiate the handler for external import
 curriculum_handler = CurriculumHandler()
@@ -0,0 +1,336 @@
+import os
+import json
+import time
+import socket
+import hashlib
+import threading
+from concurrent.futures import wait
+from typing import List, Optional
+
+from DB.index import database_manager
+from API.curriculum import (
+    curriculum_handler,
+    chapters_without_quiz,
+    schedule_quiz_generation,
+    generate_quizzes_for_chapters,
+    QUIZ_BATCH_SIZE,
+)
+
+# Job status: queued -> running -> succeeded | failed (retried with backoff until max attempts)
+# Job progress (last completed stage): queued -> outline -> chapters_inserted -> quizzes_generated
+PROGRESS_LABELS = {
+    "queued": "Waiting to start",
+    "outline": "Course outline generated",
+    "chapters_inserted": "Chapters scheduled",
+    "quizzes_generated": "Quizzes generated",
+}
+
+CURRICULUM_JOB_WORKERS = int(os.getenv("CURRICULUM_JOB_WORKERS", 2))
+CURRICULUM_JOB_POLL_SECONDS = float(os.getenv("CURRICULUM_JOB_POLL_SECONDS", 5))
+CURRICULUM_JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv("CURRICULUM_JOB_LOCK_TIMEOUT_SECONDS", 900))
+CURRICULUM_JOB_RETRY_BASE_SECONDS = int(os.getenv("CURRICULUM_JOB_RETRY_BASE_SECONDS", 30))
+CURRICULUM_JOB_RETRY_MAX_SECONDS = int(os.getenv("CURRICULUM_JOB_RETRY_MAX_SECONDS", 3600))
+# Refresh a running job's lock well within the timeout so long stages are not reclaimed
+CURRICULUM_JOB_HEARTBEAT_SECONDS = CURRICULUM_JOB_LOCK_TIMEOUT_SECONDS / 3
+
+JOB_COLUMNS = "job_id, email, payload, status, progress, attempts, max_attempts, curriculum_id, last_error"
+
+
+class CurriculumJobHandler:
+    """
+    Durable curriculum generation queue backed by the `curriculum_jobs` table.
+
+    Any number of worker threads, in any number of processes, claim jobs with
+    `SELECT ... FOR UPDATE SKIP LOCKED`. Jobs record their last completed stage,
+    so a retry (after a failure or a crashed worker) resumes instead of redoing it.
+    """
+
+    def __init__(self, workers: int = CURRICULUM_JOB_WORKERS):
+        print("CurriculumJobHandler initialized!")
+        self._wake = threading.Event()
+        self._workers: List[threading.Thread] = []
+        self._workers_lock = threading.Lock()
+        self.start_workers(workers)
+
+    @staticmethod
+    def idempotency_key(email: str, payload: dict) -> str:
+        """
+        Requests for the same course (same user, subject, start date and goals) share a key.
+        """
+        identity = [
+            email,
+            payload["topic"].strip().lower(),
+            payload["start_date"],
+            payload["commitment_level"],
+            payload["goal_description"],
+        ]
+        return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _to_dict(row) -> Optional[dict]:
+        if row is None:
+            return None
+        return dict(zip([c.strip() for c in JOB_COLUMNS.split(",")], row))
+
+    def enqueue(
+        self,
+        email: str,
+        topic: str,
+        commitment_level: str,
+        duration_session: str,
+        start_date: str,
+        learning_goal: str,
+        goal_description: str,
+    ) -> dict:
+        """
+        Queue a curriculum generation job and return it. Submitting the same course
+        again returns the existing job; a previously failed one is re-queued.
+        """
+        payload = {
+            "topic": topic,
+            "commitment_level": commitment_level,
+            "duration_session": duration_session,
+            "start_date": start_date,
+            "learning_goal": learning_goal,
+            "goal_description": goal_description,
+        }
+        key = self.idempotency_key(email, payload)
+        database_manager.run_query(
+            """
+            INSERT INTO curriculum_jobs (idempotency_key, email, payload)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (idempotency_key) DO UPDATE
+            SET status = 'queued', attempts = 0, run_after = NOW(), last_error = NULL, updated_at = NOW()
+            WHERE curriculum_jobs.status = 'failed'
+            """,
+            (key, email, json.dumps(payload)),
+            fetch="none",
+        )
+        job = self._to_dict(database_manager.run_query(
+            f"SELECT {JOB_COLUMNS} FROM curriculum_jobs WHERE idempotency_key = %s",
+            (key,),
+            fetch="one",
+        ))
+        self._wake.set()
+        return job
+
+    def get_job(self, job_id: int, email: Optional[str] = None) -> Optional[dict]:
+        query = f"SELECT {JOB_COLUMNS} FROM curriculum_jobs WHERE job_id = %s"
+        params = (job_id,)
+        if email is not None:
+            query += " AND email = %s"
+            params = (job_id, email)
+        return self._to_dict(database_manager.run_query(query, params, fetch="one"))
+
+    def get_recent_jobs(self, email: str, limit: int = 5) -> List[dict]:
+        rows = database_manager.run_query(
+            f"SELECT {JOB_COLUMNS} FROM curriculum_jobs WHERE email = %s ORDER BY created_at DESC LIMIT %s",
+            (email, limit),
+        )
+        return [self._to_dict(row) for row in rows]
+
+    def pop_finished_jobs(self, email: str) -> List[dict]:
+        """
+        Return finished jobs the user has not been told about yet, marking them as notified.
+        """
+        rows = database_manager.run_query(
+            f"""
+            UPDATE curriculum_jobs SET notified_at = NOW()
+            WHERE email = %s AND status IN ('succeeded', 'failed') AND notified_at IS NULL
+            RETURNING {JOB_COLUMNS}
+            """,
+            (email,),
+        )
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def describe(job: dict) -> str:
+        subject = job["payload"]["topic"]
+        if job["status"] == "succeeded":
+            return f"Your {subject} course is ready (Course ID: {job['curriculum_id']})."
+        if job["status"] == "failed":
+            # The error detail is in the worker logs; students get a generic message
+            return f"Generating your {subject} course failed. Please try again later."
+        progress = PROGRESS_LABELS.get(job["progress"], job["progress"])
+        retry = f", retrying (attempt {job['attempts'] + 1})" if job["last_error"] else ""
+        return f"Your {subject} course is being generated (job #{job['job_id']}): {progress}{retry}."
+
+    # ---------- Worker side ----------
+
+    def _set_progress(self, job_id: int, progress: str, curriculum_id: Optional[int] = None):
+        database_manager.run_query(
+            """
+            UPDATE curriculum_jobs
+            SET progress = %s, curriculum_id = COALESCE(%s, curriculum_id), locked_at = NOW(), updated_at = NOW()
+            WHERE job_id = %s
+            """,
+            (progress, curriculum_id, job_id),
+            fetch="none",
+        )
+        print(f"[INFO] Curriculum job {job_id}: {progress}")
+
+    def _heartbeat(self, job_id: int):
+        database_manager.run_query(
+            "UPDATE curriculum_jobs SET locked_at = NOW() WHERE job_id = %s AND status = 'running'",
+            (job_id,),
+            fetch="none",
+        )
+
+    def claim_job(self, worker_id: str) -> Optional[dict]:
+        """
+        Atomically claim the next due job, or a running job whose worker stopped
+        heartbeating for longer than the lock timeout.
+        """
+        row = database_manager.run_query(
+            f"""
+            UPDATE curriculum_jobs
+            SET status = 'running', attempts = attempts + 1, locked_by = %s, locked_at = NOW(), updated_at = NOW()
+            WHERE job_id = (
+                SELECT job_id FROM curriculum_jobs
+                WHERE (status = 'queued' AND run_after <= NOW())
+                   OR (status = 'running' AND locked_at < NOW() - make_interval(secs => %s))
+                ORDER BY run_after
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {JOB_COLUMNS}
+            """,
+            (worker_id, CURRICULUM_JOB_LOCK_TIMEOUT_SECONDS),
+            fetch="one",
+        )
+        return self._to_dict(row)
+
+    def _find_existing_curriculum(self, email: str, payload: dict) -> Optional[int]:
+        # The subject is stored capitalized (see save_curriculum_with_chapters), so
+        # compare case-insensitively with the topic as submitted
+        row = database_manager.run_query(
+            """
+            SELECT curriculum_id FROM curriculums
+            WHERE email = %s
+              AND LOWER(subject) = LOWER(%s)
+              AND start_date = %s
+              AND goal_description = %s
+            ORDER BY created_at DESC
+            LIMIT 1
+            """,
+            (email, payload["topic"], payload["start_date"], payload["goal_description"]),
+            fetch="one",
+        )
+        return row[0] if row else None
+
+    def _generate_missing_quizzes(self, job_id: int, curriculum_id: int):
+        # Quiz generation can outlast the lock timeout; heartbeat while waiting
+        pending = set(schedule_quiz_generation(curriculum_id))
+        while pending:
+            done, pending = wait(pending, timeout=CURRICULUM_JOB_HEARTBEAT_SECONDS)
+            for future in done:
+                future.result()
+            self._heartbeat(job_id)
+
+        # Batches the prefetch lane rejected under overload run in this worker's thread
+        remaining = chapters_without_quiz(curriculum_id)
+        for i in range(0, len(remaining), QUIZ_BATCH_SIZE):
+            generate_quizzes_for_chapters(remaining[i:i + QUIZ_BATCH_SIZE])
+            self._heartbeat(job_id)
+
+        missing = chapters_without_quiz(curriculum_id)
+        if missing:
+            raise RuntimeError(f"{len(missing)} chapters still have no quiz (first: chapter_id={missing[0][0]})")
+
+    def process_job(self, job: dict):
+        job_id, email, payload = job["job_id"], job["email"], job["payload"]
+        curriculum_id = job["curriculum_id"]
+
+        if curriculum_id is None:
+            curriculum_id = self._find_existing_curriculum(email, payload)
+            if curriculum_id is None:
+                curriculum_id = curriculum_handler.save_curriculum_with_chapters(
+                    email=email,
+                    subject=payload["topic"],
+                    goal_description=payload["goal_description"],
+                    commitment_level=payload["commitment_level"],
+                    duration_per_session=payload["duration_session"],
+                    start_date=payload["start_date"],
+                    learning_goal=payload["learning_goal"],
+                    on_progress=lambda stage: self._set_progress(job_id, stage),
+                )
+                if not curriculum_id:
+                    raise RuntimeError("Failed to generate and store the curriculum.")
+            else:
+                print(f"[DEBUG] Curriculum already exists for job {job_id}. Skipping creation.")
+            self._set_progress(job_id, "chapters_inserted", curriculum_id)
+
+        self._generate_missing_quizzes(job_id, curriculum_id)
+        self._set_progress(job_id, "quizzes_generated", curriculum_id)
+
+        database_manager.run_query(
+            """
+            UPDATE curriculum_jobs
+            SET status = 'succeeded', locked_by = NULL, last_error = NULL, updated_at = NOW()
+            WHERE job_id = %s
+            """,
+            (job_id,),
+            fetch="none",
+        )
+        print(f"[INFO] Curriculum job {job_id} succeeded (curriculum_id={curriculum_id})")
+
+    def _fail(self, job: dict, error: Exception):
+        """
+        Re-queue the job with exponential backoff, or mark it failed after max attempts.
+        """
+        delay = min(
+            CURRICULUM_JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1),
+            CURRICULUM_JOB_RETRY_MAX_SECONDS,
+        )
+        status = "failed" if job["attempts"] >= job["max_attempts"] else "queued"
+        database_manager.run_query(
+            """
+            UPDATE curriculum_jobs
+            SET status = %s, run_after = NOW() + make_interval(secs => %s),
+                locked_by = NULL, last_error = %s, updated_at = NOW()
+            WHERE job_id = %s
+            """,
+            (status, delay, str(error)[:1000], job["job_id"]),
+            fetch="none",
+        )
+        print(
+            f"[ERROR] Curriculum job {job['job_id']} attempt {job['attempts']} failed: {error}"
+            + ("" if status == "failed" else f" (retrying in {delay}s)")
+        )
+
+    def _worker_loop(self, worker_id: str):
+        while True:
+            try:
+                job = self.claim_job(worker_id)
+            except Exception as e:
+                print(f"[ERROR] Failed to claim curriculum job: {e}")
+                job = None
+
+            if job is None:
+                self._wake.wait(CURRICULUM_JOB_POLL_SECONDS)
+                self._wake.clear()
+                continue
+
+            try:
+                self.process_job(job)
+            except Exception as e:
+                try:
+                    self._fail(job, e)
+                except Exception as db_error:
+                    # The lock times out and another worker picks the job up
+                    print(f"[ERROR] Failed to record failure for curriculum job {job['job_id']}: {db_error}")
+                    time.sleep(CURRICULUM_JOB_POLL_SECONDS)
+
+    def start_workers(self, count: int):
+        with self._workers_lock:
+            for _ in range(count - len(self._workers)):
+                index = len(self._workers)
+                worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+                worker = threading.Thread(
+                    target=self._worker_loop, args=(worker_id,), name=f"curriculum-job-{index}", daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+
+curriculum_job_handler = CurriculumJobHandler()
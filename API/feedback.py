@@ -1,5 +1,5 @@
 from DB.index import database_manager
-from utils.feedback_utils import fetch_and_summarize_feedback
+from utils.feedback_utils import schedule_feedback_summary
 
 class FeedbackHandler:
     def __init__(self):
@@ -7,32 +7,31 @@ class FeedbackHandler:
 
     def save_feedback(self, email: str, conversation_id: str, feedback_text: str):
         try:
-            database_manager.cursor.execute(
+            feedback_id = database_manager.run_query(
                 """
                 INSERT INTO feedback (email, conversation_id, feedback_text)
                 VALUES (%s, %s, %s)
+                RETURNING feedback_id
                 """,
                 (email, conversation_id, feedback_text),
-            )
-            database_manager.cursor.connection.commit()
+                fetch="one",
+            )[0]
             print(f"[DEBUG] Feedback saved for {email}")
 
-            # Fetch summarized feedback and RETURN it
-            summarized_feedback = fetch_and_summarize_feedback(email)
-            print(f"[DEBUG] New summarized feedback: {summarized_feedback}")
-            return summarized_feedback
+            # Fold the new entry into the stored summary in the background
+            schedule_feedback_summary(email)
+            return feedback_id
 
         except Exception as e:
             print(f"Error saving feedback: {e}")
             return None
 
     def fetch_feedback(self, email: str):
-        database_manager.cursor.execute(
+        feedback_entries = database_manager.run_query(
             """
             SELECT feedback_text FROM feedback WHERE email = %s ORDER BY created_at DESC LIMIT 10
             """,
             (email,),
         )
-        feedback_entries = database_manager.cursor.fetchall()
         feedback_texts = [entry[0] for entry in feedback_entries]
         return feedback_texts if feedback_texts else []
\ No newline at end of file
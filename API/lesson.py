@@ -0,0 +1,290 @@
+import os
+import json
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain.schema import HumanMessage
+
+from DB.index import database_manager
+from utils.llm_utils import get_llm
+from utils.token_utils import take_within_budget
+from utils.executor_utils import background_executor
+from utils.passthrough_utils import LESSON_PAYLOAD, payload_channel_open, publish_payload
+
+# A lesson is generated one section at a time, in this order
+LESSON_SECTIONS: List[Tuple[str, str]] = [
+    (
+        "Key Learning Objectives",
+        "List 3 to 5 concise learning objectives for this chapter and briefly say why they matter.",
+    ),
+    (
+        "Core Content",
+        "Explain the core concepts step by step, with real-world examples and a few questions "
+        "the student can use to check their understanding.",
+    ),
+    (
+        "Interactive Exercises",
+        "Give 2 or 3 hands-on exercises that practise the core content. Do not include the solutions.",
+    ),
+    (
+        "Conclusion and Recap",
+        "Recap the key points of the lesson in a few bullet points and ask the student if they have any questions.",
+    ),
+]
+
+# Generate the section after the one being read in the background
+LESSON_PREFETCH = os.getenv("LESSON_PREFETCH", "true").lower() == "true"
+# Earlier sections included in a section prompt, newest first
+LESSON_CONTEXT_MAX_TOKENS = int(os.getenv("LESSON_CONTEXT_MAX_TOKENS", 1500))
+
+CHAPTER_QUERY = """
+    SELECT cc.chapter_id, cu.subject, cc.title, cc.description
+    FROM curriculum_chapters cc
+    JOIN curriculums cu ON cc.curriculum_id = cu.curriculum_id
+    WHERE cc.chapter_id = %s AND cu.email = %s
+"""
+
+
+class LessonHandler:
+    """
+    Generates chapter lessons section by section. Each section is generated when it
+    is first needed (or prefetched while the student reads the previous one),
+    streamed to the chat through the tool payload channel and persisted in
+    `lesson_sections`, so every later visit is a primary-key read and sections the
+    student never reaches are never generated.
+    """
+
+    def __init__(self):
+        print("LessonHandler initialized!")
+        # Sections being generated in this process, so an on-demand request waits
+        # for a running prefetch instead of generating the section again
+        self._inflight: Dict[Tuple[int, int], Future] = {}
+        self._lock = threading.Lock()
+
+    def get_chapter(self, email: str, chapter_id: int) -> Optional[dict]:
+        row = database_manager.run_query(CHAPTER_QUERY, (chapter_id, email), fetch="one")
+        if not row:
+            return None
+        chapter_id, subject, title, description = row
+        return {"chapter_id": chapter_id, "subject": subject, "title": title, "description": description}
+
+    def fetch_sections(self, chapter_id: int) -> Dict[int, str]:
+        rows = database_manager.run_query(
+            "SELECT section_index, content FROM lesson_sections WHERE chapter_id = %s",
+            (chapter_id,),
+        )
+        return {section_index: content for section_index, content in rows}
+
+    def save_section(self, chapter_id: int, section_index: int, content: str):
+        database_manager.run_query(
+            """
+            INSERT INTO lesson_sections (chapter_id, section_index, content)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (chapter_id, section_index) DO NOTHING
+            """,
+            (chapter_id, section_index, content),
+            fetch="none",
+        )
+
+    @staticmethod
+    def _section_prompt(chapter: dict, section_index: int, previous: Dict[int, str]) -> str:
+        title, instructions = LESSON_SECTIONS[section_index]
+        outline = "\n".join(f"{i + 1}) {name}" for i, (name, _) in enumerate(LESSON_SECTIONS))
+        # Keep the most recent earlier sections that fit the budget, in lesson order
+        earlier = [
+            f"## {LESSON_SECTIONS[i][0]}\n{previous[i]}"
+            for i in sorted(previous, reverse=True) if i < section_index
+        ]
+        earlier = take_within_budget(earlier, LESSON_CONTEXT_MAX_TOKENS)[::-1]
+        earlier_context = "\n\n".join(earlier) or "None yet; this is the first section."
+
+        return f"""
+        You are a highly experienced and engaging teacher with expertise in making complex topics accessible.
+        The user is studying the course: {chapter["subject"]}
+        Chapter Title: "{chapter["title"]}"
+        Chapter Description: "{chapter["description"]}"
+
+        The lesson for this chapter has these sections:
+        {outline}
+
+        Sections the student has already read:
+        {earlier_context}
+
+        Write only section {section_index + 1}, "{title}". {instructions}
+        Continue naturally from the earlier sections without repeating them.
+        Do not write the section heading and do not write any other section.
+        """
+
+    def _generate_section(self, chapter: dict, section_index: int, on_delta: Optional[Callable[[str], None]]) -> str:
+        previous = self.fetch_sections(chapter["chapter_id"])
+        messages = [HumanMessage(content=self._section_prompt(chapter, section_index, previous))]
+        # Not the agent's own output: keep the turn's callbacks (token streaming,
+        # coalescing) from inheriting this call when it runs inside a tool
+        config = {"callbacks": []}
+        if on_delta is None:
+            content = get_llm().invoke(messages, config=config).content
+        else:
+            parts = []
+            for chunk in get_llm(streaming=True).stream(messages, config=config):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    on_delta(chunk.content)
+            content = "".join(parts)
+        content = content.strip()
+        self.save_section(chapter["chapter_id"], section_index, content)
+        return content
+
+    def get_section(self, chapter: dict, section_index: int, on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Return one section of a chapter's lesson, generating and persisting it if needed.
+        `on_delta` receives the text as it becomes available: streamed while this call
+        generates it, or in one piece when it was stored or generated elsewhere.
+        """
+        key = (chapter["chapter_id"], section_index)
+        row = database_manager.run_query(
+            "SELECT content FROM lesson_sections WHERE chapter_id = %s AND section_index = %s",
+            key,
+            fetch="one",
+        )
+        streamed = False
+        if row:
+            content = row[0]
+        else:
+            with self._lock:
+                future = self._inflight.get(key)
+                is_owner = future is None
+                if is_owner:
+                    future = self._inflight[key] = Future()
+
+            if not is_owner:
+                content = future.result()
+            else:
+                try:
+                    print(f"[INFO] Generating lesson section {section_index + 1} for chapter {key[0]}")
+                    content = self._generate_section(chapter, section_index, on_delta)
+                    streamed = on_delta is not None
+                    future.set_result(content)
+                except BaseException as e:
+                    future.set_exception(e)
+                    raise
+                finally:
+                    with self._lock:
+                        self._inflight.pop(key, None)
+
+        if on_delta is not None and not streamed:
+            on_delta(content)
+        return content
+
+    def quiz_status(self, chapter_id: int) -> str:
+        quiz_exists = database_manager.run_query(
+            "SELECT EXISTS (SELECT 1 FROM quiz_questions WHERE chapter_id = %s)",
+            (chapter_id,),
+            fetch="one",
+        )[0]
+        return "Quiz ready" if quiz_exists else "Quiz will be available after the lesson."
+
+    def continue_lesson(
+        self,
+        email: str,
+        chapter_id: int,
+        section_number: int,
+        on_continue_course: Optional[Callable[[str, int, str], None]] = None,
+    ) -> str:
+        """
+        Show section `section_number` (1-based) of one of the user's chapters.
+        """
+        chapter = self.get_chapter(email, chapter_id)
+        if chapter is None:
+            return f"Chapter ID {chapter_id} is not part of your enrolled courses."
+        return self.deliver_section(chapter, section_number - 1, on_continue_course)
+
+    def _prefetch_section(self, chapter: dict, section_index: int):
+        try:
+            self.get_section(chapter, section_index)
+        except Exception as e:
+            print(f"[WARN] Could not prefetch lesson section {section_index + 1} for chapter {chapter['chapter_id']}: {e}")
+
+    def prefetch_section(self, chapter: dict, section_index: int):
+        """
+        Generate a section in the background while the student reads the previous one.
+        Skipped when prefetching is off, past the last section, or under overload.
+        """
+        if LESSON_PREFETCH and section_index < len(LESSON_SECTIONS):
+            background_executor.try_submit("prefetch", self._prefetch_section, chapter, section_index)
+
+    def deliver_section(
+        self,
+        chapter: dict,
+        section_index: int,
+        on_continue_course: Optional[Callable[[str, int, str], None]] = None,
+    ) -> str:
+        """
+        Show one lesson section to the student and return the tool output for the model.
+        Within a chat turn the section is streamed to the caller as `lesson` payloads
+        and the model only gets a short note; otherwise the text is returned to the model.
+        """
+        if not 0 <= section_index < len(LESSON_SECTIONS):
+            return f"This lesson has {len(LESSON_SECTIONS)} sections; section {section_index + 1} does not exist."
+
+        chapter_id = chapter["chapter_id"]
+        section_title = LESSON_SECTIONS[section_index][0]
+        is_last = section_index == len(LESSON_SECTIONS) - 1
+        heading = f"**{section_title}** ({section_index + 1}/{len(LESSON_SECTIONS)})\n\n"
+        footer = f"\n\n{self.quiz_status(chapter_id)}\n\n" if is_last else "\n\n"
+
+        passthrough = payload_channel_open()
+
+        def publish(text: str):
+            publish_payload(LESSON_PAYLOAD, {
+                "chapter_id": chapter_id,
+                "subject": chapter["subject"],
+                "title": chapter["title"],
+                "section": section_index + 1,
+                "content": text,
+            })
+
+        if passthrough:
+            publish(heading)
+        content = self.get_section(chapter, section_index, publish if passthrough else None)
+        if passthrough:
+            publish(footer)
+        self.prefetch_section(chapter, section_index + 1)
+
+        if on_continue_course:
+            on_continue_course(
+                subject=chapter["subject"],
+                chapter_id=chapter_id,
+                generated_content=f"{heading}{content}",
+            )
+
+        if is_last:
+            next_step = "Ask whether they have questions or are ready to take the MCQ quiz."
+        else:
+            next_section = LESSON_SECTIONS[section_index + 1][0]
+            next_step = (
+                f'Ask whether they have questions, want the next section ("{next_section}", '
+                f"ContinueLesson with section {section_index + 2}) or are ready to take the MCQ quiz."
+            )
+
+        if passthrough:
+            return json.dumps({
+                "chapter_id": chapter_id,
+                "section": section_index + 1,
+                "total_sections": len(LESSON_SECTIONS),
+                "lesson_delivered": True,
+                "note": (
+                    f'Section "{section_title}" of the lesson for "{chapter["title"]}" has already been shown '
+                    f"to the user. Do not repeat it; reply with one or two sentences. {next_step}"
+                ),
+            })
+
+        return json.dumps({
+            "chapter_id": chapter_id,
+            "section": section_index + 1,
+            "total_sections": len(LESSON_SECTIONS),
+            "user_message": (f"{heading}{content}{footer}".strip(), next_step),
+        })
+
+
+lesson_handler = LessonHandler()
@@ -9,7 +9,13 @@ from fastapi import UploadFile
 
 from utils.llm_utils import get_llm
 from DB.index import database_manager
-from API.curriculum import curriculum_handler
+from API.chapter import chapter_handler
+from API.curriculum import (
+    curriculum_handler,
+    subject_index,
+    schedule_quiz_generation,
+    EAGER_QUIZ_GENERATION,
+)
 
 
 class PdfHandler:
@@ -74,7 +80,7 @@ class PdfHandler:
         if not chapters:
             return "Failed to generate valid chapters from the LLM response."
 
-        return self._save_curriculum_to_db(email, subject, chapters)
+        return self._save_curriculum_to_db(email, subject, chapters, generate_quizzes=EAGER_QUIZ_GENERATION)
 
     def _generate_subject(self, text: str, llm) -> str:
         """
@@ -101,9 +107,10 @@ class PdfHandler:
             match = re.search(r'(\[.*\])', response.content, re.DOTALL)
             return json.loads(match.group(1)) if match else None
 
-    def _save_curriculum_to_db(self, email: str, subject: str, chapters: List[Dict]) -> str:
+    def _save_curriculum_to_db(self, email: str, subject: str, chapters: List[Dict], generate_quizzes: bool = False) -> str:
         """
         Save curriculum and chapters to the database.
+        With `generate_quizzes`, quizzes for all chapters are queued right away.
         """
         start_date = datetime.now().strftime("%Y-%m-%d")
         commitment_level = "Weekly"
@@ -111,28 +118,38 @@ class PdfHandler:
         scheduled_dates = curriculum_handler.calculate_scheduled_dates(commitment_level, start_date, total_chapters)
 
         try:
-            # Save curriculum
-            database_manager.cursor.execute("""
-                INSERT INTO curriculums (email, subject, goal_description, commitment_level, duration_per_session, start_date, learning_goal, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING curriculum_id
-            """, (
-                email,
-                subject,
-                f"Curriculum generated from {subject}"[:100],
-                commitment_level,
-                60,
-                start_date,
-                f"Learn topics from {subject}"[:100],
-                datetime.now()
-            ))
-            curriculum_id = database_manager.cursor.fetchone()[0]
-
-            # Save chapters
-            for i, chapter in enumerate(chapters):
-                database_manager.cursor.execute("""
-                    INSERT INTO curriculum_chapters (curriculum_id, title, description, scheduled_date)
-                    VALUES (%s, %s, %s, %s)
-                """, (curriculum_id, chapter['title'], chapter['description'], scheduled_dates[i]))
+            with database_manager.pooled_transaction() as cursor:
+                # Save curriculum
+                cursor.execute("""
+                    INSERT INTO curriculums (email, subject, goal_description, commitment_level, duration_per_session, start_date, learning_goal, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING curriculum_id
+                """, (
+                    email,
+                    subject,
+                    f"Curriculum generated from {subject}"[:100],
+                    commitment_level,
+                    60,
+                    start_date,
+                    f"Learn topics from {subject}"[:100],
+                    datetime.now()
+                ))
+                curriculum_id = cursor.fetchone()[0]
+
+                # Save chapters
+                database_manager.bulk_insert(
+                    "curriculum_chapters",
+                    ("curriculum_id", "title", "description", "scheduled_date"),
+                    [
+                        (curriculum_id, chapter['title'], chapter['description'], scheduled_dates[i])
+                        for i, chapter in enumerate(chapters)
+                    ],
+                    cursor=cursor,
+                )
+                curriculum_handler.refresh_progress(curriculum_id, cursor)
+                chapter_handler.invalidate_agenda(email, cursor)
+            subject_index.invalidate(email)
+            if generate_quizzes:
+                schedule_quiz_generation(curriculum_id)
 
             return f"Curriculum '{subject}' generated successfully with ID {curriculum_id}."
 
@@ -0,0 +1,119 @@
+from typing import Dict, List, Optional
+
+from DB.index import database_manager
+from API.chapter import chapter_handler
+from API.curriculum import curriculum_handler, ensure_quiz_for_chapter
+
+
+class QuizNotAvailableError(Exception):
+    """
+    Raised when a quiz is submitted for a chapter that has no questions yet.
+    """
+
+
+class QuizHandler:
+    def __init__(self):
+        print("QuizHandler initialized!")
+
+    @staticmethod
+    def format_questions(questions: List[tuple]) -> List[dict]:
+        """
+        Shape rows from `fetch_quiz_questions_data` the way the quiz UI expects them.
+        """
+        return [
+            {"question": q[0], "options": [q[1], q[2], q[3], q[4]], "correct_option": q[5]}
+            for q in questions
+        ]
+
+    def chapter_belongs_to(self, email: str, chapter_id: int) -> bool:
+        row = database_manager.run_query(
+            """
+            SELECT 1
+            FROM curriculum_chapters cc
+            JOIN curriculums c ON cc.curriculum_id = c.curriculum_id
+            WHERE cc.chapter_id = %s AND c.email = %s
+            """,
+            (chapter_id, email),
+            fetch="one",
+        )
+        return row is not None
+
+    def get_quiz(self, email: str, chapter_id: int) -> Optional[dict]:
+        """
+        Return the quiz for one of the user's chapters, or None if the chapter is not theirs.
+        A chapter without a quiz yet gets one generated on the spot.
+        """
+        if not self.chapter_belongs_to(email, chapter_id):
+            return None
+        rows = curriculum_handler.fetch_quiz_questions_data(chapter_id)
+        if not rows and ensure_quiz_for_chapter(chapter_id):
+            rows = curriculum_handler.fetch_quiz_questions_data(chapter_id)
+        questions = self.format_questions(rows)
+        return {"status": "success", "email": email, "chapter_id": chapter_id, "questions": questions}
+
+    @staticmethod
+    def score_answers(questions: List[dict], answers: Dict[str, str]) -> int:
+        """
+        Count correct answers. `answers` maps "q1", "q2", ... to the chosen option text.
+        """
+        correct_count = 0
+        for i, question in enumerate(questions, start=1):
+            correct_option = question["options"][ord(question["correct_option"]) - ord("A")]
+            if answers.get(f"q{i}") == correct_option:
+                correct_count += 1
+        return correct_count
+
+    def save_result(self, chapter_id: int, email: str, score: int, reflection_after_quiz: str):
+        database_manager.run_query(
+            """
+            INSERT INTO quiz_results (chapter_id, email, score, reflection_after_quiz)
+            VALUES (%s, %s, %s, %s)
+            """,
+            (chapter_id, email, score, reflection_after_quiz),
+            fetch="none",
+        )
+
+    def mark_chapter_completed(self, chapter_id: int, is_completed: bool = True):
+        """
+        Update a chapter's completion, its curriculum's progress counters and
+        next-chapter pointer, and the user's daily agenda in one transaction.
+        """
+        with database_manager.pooled_transaction() as cursor:
+            cursor.execute(
+                """
+                UPDATE curriculum_chapters
+                SET is_completed = %s
+                WHERE chapter_id = %s
+                RETURNING curriculum_id
+                """,
+                (is_completed, chapter_id),
+            )
+            row = cursor.fetchone()
+            if row:
+                curriculum_handler.refresh_progress(row[0], cursor)
+                chapter_handler.invalidate_agenda_for_curriculum(row[0], cursor)
+
+    def submit_quiz(self, email: str, chapter_id: int, answers: Dict[str, str], reflection_after_quiz: str) -> Optional[dict]:
+        """
+        Grade and record a quiz attempt. A perfect score completes the chapter
+        (the same fallback the Streamlit quiz review applies).
+
+        Grades against the stored questions only (never generates a quiz mid-submit);
+        raises QuizNotAvailableError, without recording anything, if there are none.
+        """
+        if not self.chapter_belongs_to(email, chapter_id):
+            return None
+        questions = self.format_questions(curriculum_handler.fetch_quiz_questions_data(chapter_id))
+        if not questions:
+            raise QuizNotAvailableError(f"Chapter ID {chapter_id} has no quiz to submit.")
+        total = len(questions)
+        score = self.score_answers(questions, answers)
+        self.save_result(chapter_id, email, score, reflection_after_quiz)
+
+        completed = score == total
+        if completed:
+            self.mark_chapter_completed(chapter_id)
+        return {"chapter_id": chapter_id, "score": score, "total": total, "completed": completed}
+
+
+quiz_handler = QuizHandler()
@@ -3,6 +3,7 @@ import openai
 
 from dotenv import load_dotenv
 from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
 from azure.core.credentials import AzureKeyCredential
 
 load_dotenv()
@@ -25,6 +26,25 @@ client = openai.AzureOpenAI(
     azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
 )
 
+# Async clients for the async chat pipeline
+async_search_client = AsyncSearchClient(
+    endpoint=os.getenv("search_service_endpoint"),
+    index_name=os.getenv("INDEX_NAME", "questions-llm-responses"),
+    credential=AzureKeyCredential(os.getenv("search_service_key")),
+)
+
+async_pdf_client = AsyncSearchClient(
+    endpoint=os.getenv("pdf_search_service_endpoint"),
+    index_name=os.getenv("pdf_index_name", "pdf"),
+    credential=AzureKeyCredential(os.getenv("pdf_search_service_key")),
+)
+
+async_client = openai.AsyncAzureOpenAI(
+    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+    api_version=os.getenv("OPENAI_API_VERSION"),
+    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+)
+
 # For embedding deployment name and endpoint
 AZURE_OPENAI_ENDPOINT = os.environ['AZURE_OPENAI_ENDPOINT']
 AZURE_OPENAI_API_KEY = os.environ['AZURE_OPENAI_API_KEY']
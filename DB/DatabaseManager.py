@@ -1,28 +1,155 @@
 import os
+import asyncio
+import threading
 import psycopg2
 import streamlit as st
 
 from datetime import datetime
+from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import execute_values
 
-from Azure.Search import search_client
+from Azure.Search import search_client, async_search_client
 
 
 class DatabaseManager:
     def __init__(self):
+        self._pool = None
+        self._pool_lock = threading.Lock()
         try:
-            conn = psycopg2.connect(
-                host=os.getenv("DB_HOST"),
-                dbname=os.getenv("DB_NAME"),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD"),
-                port=os.getenv("DB_PORT"),
-            )
-            conn.autocommit = True
+            conn = self.connect()
             self.cursor = conn.cursor()
         except Exception as e:
             st.error(f"Database connection failed: {e}")
             st.stop()
-        
+
+    @staticmethod
+    def _connection_params() -> dict:
+        return {
+            "host": os.getenv("DB_HOST"),
+            "dbname": os.getenv("DB_NAME"),
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASSWORD"),
+            "port": os.getenv("DB_PORT"),
+        }
+
+    @staticmethod
+    def connect():
+        """
+        Open a new autocommit connection using the DB_* environment variables.
+        """
+        conn = psycopg2.connect(**DatabaseManager._connection_params())
+        conn.autocommit = True
+        return conn
+
+    def get_pool(self) -> ThreadedConnectionPool:
+        """
+        Lazily create the connection pool used by concurrent (async) callers,
+        sized by DB_POOL_MAX.
+        """
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadedConnectionPool(
+                        1, int(os.getenv("DB_POOL_MAX", 20)), **self._connection_params()
+                    )
+        return self._pool
+
+    @contextmanager
+    def pooled_cursor(self):
+        """
+        Borrow an autocommit connection from the pool for the duration of the block.
+        Unlike `self.cursor`, this is safe to use from many turns at once.
+        """
+        pool = self.get_pool()
+        conn = pool.getconn()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                yield cursor
+        finally:
+            pool.putconn(conn)
+
+    @contextmanager
+    def pooled_transaction(self):
+        """
+        Borrow a pooled connection and run the block in a single transaction,
+        committed on success and rolled back on error.
+        """
+        pool = self.get_pool()
+        conn = pool.getconn()
+        try:
+            conn.autocommit = False
+            with conn.cursor() as cursor:
+                yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+            pool.putconn(conn)
+
+    def run_query(self, query: str, params=None, fetch: str = "all"):
+        """
+        Execute a statement on a pooled connection. `fetch` is "all", "one" or "none".
+        """
+        with self.pooled_cursor() as cursor:
+            cursor.execute(query, params)
+            if fetch == "one":
+                return cursor.fetchone()
+            if fetch == "all":
+                return cursor.fetchall()
+            return None
+
+    def bulk_insert(self, table: str, columns, rows, returning: str = None, cursor=None, page_size: int = 1000):
+        """
+        Insert `rows` with multi-row INSERT statements (`execute_values`), one round
+        trip per `page_size` rows instead of one per row. With `returning` (e.g.
+        "chapter_id"), returns the RETURNING rows in input order.
+        Runs on `cursor` when given (to join its transaction), otherwise on a pooled connection.
+        """
+        rows = list(rows)
+        if not rows:
+            return []
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
+        if returning:
+            query += f" RETURNING {returning}"
+        if cursor is None:
+            with self.pooled_cursor() as cursor:
+                return self.bulk_insert(table, columns, rows, returning, cursor, page_size)
+        result = execute_values(cursor, query, rows, page_size=page_size, fetch=bool(returning))
+        return result if returning else []
+
+    async def arun_query(self, query: str, params=None, fetch: str = "all"):
+        """
+        Async wrapper around `run_query`; psycopg2 is blocking, so the statement runs
+        on the default executor instead of the event loop.
+        """
+        return await asyncio.to_thread(self.run_query, query, params, fetch)
+
+    @staticmethod
+    def _conversation_document(conversation_id, email, user_question, assistant_response) -> dict:
+        # Format the timestamp to remove microseconds
+        formatted_timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+        return {
+            "id": str(conversation_id),  # Convert conversation ID to string
+            "email": email,
+            "question": user_question,
+            "response": assistant_response,
+            "timestamp": formatted_timestamp,
+        }
+
+    @staticmethod
+    def _track_conversation_id(conversation_id):
+        # Add conversation ID to session state when running inside Streamlit
+        try:
+            if "chat_history_ids" not in st.session_state:
+                st.session_state["chat_history_ids"] = []
+            st.session_state["chat_history_ids"].append(conversation_id)
+        except Exception as e:
+            print(f"[DEBUG] Skipping session state update outside Streamlit: {e}")
+
     def save_message(self, email, user_question, assistant_response):
         try:
             # Save to the database and retrieve the conversation ID
@@ -39,26 +166,36 @@ class DatabaseManager:
             # Commit the changes if using manual commit mode
             self.cursor.connection.commit()
 
-            # Format the timestamp to remove microseconds
-            formatted_timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-
-            # Save to Azure AI Search
-            document = {
-                "id": str(conversation_id),  # Convert conversation ID to string
-                "email": email,
-                "question": user_question,
-                "response": assistant_response,
-                "timestamp": formatted_timestamp,
-            }
-
             # Upload document to Azure AI Search
+            document = self._conversation_document(conversation_id, email, user_question, assistant_response)
             result = search_client.upload_documents(documents=[document])
 
-            # Add conversation ID to session state
-            if "chat_history_ids" not in st.session_state:
-                st.session_state["chat_history_ids"] = []
-            st.session_state["chat_history_ids"].append(conversation_id)
+            self._track_conversation_id(conversation_id)
 
             return conversation_id  # Return the conversation ID
         except Exception as e:
-            print(f"Error in save_message: {e}")
\ No newline at end of file
+            print(f"Error in save_message: {e}")
+
+    async def asave_message(self, email, user_question, assistant_response):
+        """
+        Async variant of `save_message` using a pooled connection and the async search client.
+        """
+        try:
+            row = await self.arun_query(
+                """
+                INSERT INTO conversation_history (email, question, response)
+                VALUES (%s, %s, %s)
+                RETURNING id
+                """,
+                (email, user_question, assistant_response),
+                fetch="one",
+            )
+            conversation_id = row[0]
+
+            document = self._conversation_document(conversation_id, email, user_question, assistant_response)
+            await async_search_client.upload_documents(documents=[document])
+
+            self._track_conversation_id(conversation_id)
+            return conversation_id
+        except Exception as e:
+            print(f"Error in asave_message: {e}")
@@ -0,0 +1,130 @@
+import os
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from DB.index import database_manager
+
+
+class SessionStore(ABC):
+    """
+    Backend interface for durable per-user session memory.
+
+    State is a compact JSON-serializable dict produced by
+    `utils.memory_utils.dump_session`. Saves are last-write-wins: if two processes
+    advance the same session concurrently, the later save replaces the other's
+    turns. The API avoids this by discarding its cached copy before each turn,
+    and a user's turns normally arrive one at a time.
+    """
+
+    @abstractmethod
+    def load(self, email: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def save(self, email: str, state: dict) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, email: str) -> None:
+        ...
+
+
+class PostgresSessionStore(SessionStore):
+    """
+    Stores session state in the `session_memories` table, on pooled connections so
+    session reads and writes never interleave with the shared handler cursor and a
+    dropped connection is replaced instead of breaking persistence.
+    """
+
+    def __init__(self):
+        print("PostgresSessionStore initialized!")
+
+    def load(self, email: str) -> Optional[dict]:
+        row = database_manager.run_query(
+            "SELECT state FROM session_memories WHERE email = %s",
+            (email,),
+            fetch="one",
+        )
+        if not row:
+            return None
+        # psycopg2 decodes JSONB to a dict already
+        return row[0] if isinstance(row[0], dict) else json.loads(row[0])
+
+    def save(self, email: str, state: dict) -> None:
+        database_manager.run_query(
+            """
+            INSERT INTO session_memories (email, state, updated_at)
+            VALUES (%s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (email) DO UPDATE
+            SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at
+            """,
+            (email, json.dumps(state, separators=(",", ":"))),
+            fetch="none",
+        )
+
+    def delete(self, email: str) -> None:
+        database_manager.run_query("DELETE FROM session_memories WHERE email = %s", (email,), fetch="none")
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Stores session state in a local SQLite file. Suitable for a single host or
+    local development where Postgres is not available.
+    """
+
+    def __init__(self, path: str = "session_memories.db"):
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS session_memories (
+                email TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        self._lock = threading.Lock()
+        print(f"SQLiteSessionStore initialized at {path}!")
+
+    def load(self, email: str) -> Optional[dict]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT state FROM session_memories WHERE email = ?", (email,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, email: str, state: dict) -> None:
+        with self._lock:
+            self.connection.execute(
+                """
+                INSERT INTO session_memories (email, state, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (email) DO UPDATE
+                SET state = excluded.state, updated_at = excluded.updated_at
+                """,
+                (email, json.dumps(state, separators=(",", ":"))),
+            )
+
+    def delete(self, email: str) -> None:
+        with self._lock:
+            self.connection.execute("DELETE FROM session_memories WHERE email = ?", (email,))
+
+
+def get_session_store() -> Optional[SessionStore]:
+    """
+    Build the session store selected by SESSION_STORE_BACKEND
+    ("postgres", "sqlite" or "none").
+    """
+    backend = os.getenv("SESSION_STORE_BACKEND", "postgres").lower()
+    try:
+        if backend == "postgres":
+            return PostgresSessionStore()
+        if backend == "sqlite":
+            return SQLiteSessionStore(os.getenv("SESSION_STORE_PATH", "session_memories.db"))
+    except Exception as e:
+        print(f"[ERROR] Failed to initialize {backend} session store, falling back to in-process memory: {e}")
+    return None
@@ -1,6 +1,7 @@
 import streamlit as st
 import re
 from API.auth import auth_handler
+from UI import api_client
 
 def is_valid_email(email):
     """Check if the email is valid."""
@@ -19,6 +20,11 @@ def LogInUI():
         elif auth_handler.validate_user(login_email, login_password):
             st.session_state["logged_in"] = True
             st.session_state["email"] = login_email
+            if api_client.is_enabled():
+                try:
+                    st.session_state["api_token"] = api_client.login(login_email, login_password)
+                except Exception as e:
+                    print(f"[WARN] Chat API login failed, chatting in-process: {e}")
             st.success("Logged in successfully!")
             st.rerun()
         else:
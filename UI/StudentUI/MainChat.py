@@ -1,4 +1,6 @@
+import os
 import json
+import itertools
 import streamlit as st
 import time
 
@@ -6,15 +8,39 @@ import time
 from API.Chat.chat import chat_handler
 from API.Chat.callback_handler import StreamlitCallbackHandler
 from API.context import context_handler
+from API.curriculum_jobs import curriculum_job_handler
 from API.streak import streak_handler
+from UI import api_client
 from UI.common import add_feedback_for_message, add_message_to_chat_history
 from UI.StudentUI.ContextPdf import pdf_context_upload_ui
 
 # Import the transcribe and synthesize functions.
 from utils.speech_service import transcribe_audio, synthesize_text
-from utils.llm_utils import get_llm_fast
+from utils.llm_utils import get_llm_fast, count_llm_call, get_llm_call_counts
+from utils.executor_utils import background_executor
+
+# Show this process's rerun and LLM call counts in the sidebar
+SHOW_LLM_CALL_STATS = os.getenv("SHOW_LLM_CALL_STATS", "false").lower() == "true"
+# Reruns of the chat page in this process; quick replies used to cost one LLM call each
+_reruns = itertools.count(1)
+
+
+def report_llm_calls():
+    """
+    Log (and optionally show) LLM calls against page reruns for this Streamlit
+    process, the one that makes the quick-reply calls.
+    """
+    reruns = next(_reruns)
+    calls = get_llm_call_counts()
+    quick_replies = calls.get("quick_replies", 0)
+    print(f"[DEBUG] Chat page rerun {reruns}: LLM calls {calls} ({quick_replies / reruns:.2f} quick-reply calls per rerun)")
+    if SHOW_LLM_CALL_STATS:
+        with st.sidebar.expander("LLM calls"):
+            st.write(f"Reruns: {reruns}")
+            st.json(calls)
 
 def generate_quick_replies(user_text):
+    count_llm_call("quick_replies")
     llm = get_llm_fast()
     prompt = f"Generate three short and natural-sounding responses to: '{user_text}'. Keep them under 10 words."
     
@@ -34,7 +60,52 @@ def generate_quick_replies(user_text):
     return lines[:3]
 
 
+def schedule_quick_replies():
+    """
+    Start generating quick replies for the latest assistant message in the background.
+    The future is stored on the message so the suggestions are generated only once.
+    """
+    message = st.session_state.chat_history[-1]
+    if message["role"] == "assistant" and "quick_replies" not in message:
+        future = background_executor.try_submit("prefetch", generate_quick_replies, message["content"])
+        if future is None:
+            # Under overload, fall back to generic suggestions instead of another LLM call
+            message["quick_replies"] = ["Yes", "No", "Tell me more"]
+        else:
+            message["quick_replies_future"] = future
+
+
+def get_quick_replies(message):
+    """
+    Return the quick replies stored with an assistant message, generating them
+    at most once per message.
+    """
+    if "quick_replies" not in message:
+        future = message.pop("quick_replies_future", None)
+        try:
+            message["quick_replies"] = future.result() if future else generate_quick_replies(message["content"])
+        except Exception as e:
+            print(f"[ERROR] Failed to generate quick replies: {e}")
+            message["quick_replies"] = ["Yes", "No", "Tell me more"]
+    return message["quick_replies"]
+
+
+def run_chat_turn(user_text, streamlit_handler):
+    """
+    Run a chat turn through the chat API when CHAT_API_URL is configured,
+    otherwise in-process. Returns (response, conversation_id).
+    """
+    if api_client.is_enabled() and st.session_state.get("api_token"):
+        return api_client.stream_chat(st.session_state["api_token"], user_text, streamlit_handler)
+    return chat_handler.conversational_rag_stream(
+        email=st.session_state["email"],
+        user_input=user_text,
+        callback_handler=streamlit_handler,
+    )
+
+
 def MainChatUI():
+    report_llm_calls()
     email = st.session_state.get("email")
     if email:
         streak_handler.update_user_streak(email)
@@ -43,6 +114,13 @@ def MainChatUI():
         st.sidebar.write(f"🔥 **Current Streak: {current_streak} days**")
         st.sidebar.write(f"🏆 **Longest Streak: {longest_streak} days**")
 
+        # Let the student know about courses that finished generating in the background
+        try:
+            for job in curriculum_job_handler.pop_finished_jobs(email):
+                add_message_to_chat_history("assistant", curriculum_job_handler.describe(job))
+        except Exception as e:
+            print(f"[ERROR] Failed to check curriculum jobs: {e}")
+
     # ---------- 1) Quiz UI Check ----------
     if st.session_state.get("current_ui") == "quiz_ui" and "quiz_data" in st.session_state:
         render_quiz_ui(st.session_state["quiz_data"])
@@ -70,8 +148,13 @@ def MainChatUI():
                                 st.error(f"Error: {e}")
 
     # ---------- 3) Process Quick Replies if Available ----------
-    if "last_assistant_response" in st.session_state and st.session_state.last_assistant_response:
-        quick_replies = generate_quick_replies(st.session_state.last_assistant_response)
+    last_message = st.session_state.chat_history[-1] if st.session_state.chat_history else None
+    if (
+        st.session_state.get("last_assistant_response")
+        and last_message
+        and last_message["role"] == "assistant"
+    ):
+        quick_replies = get_quick_replies(last_message)
         left, middle, right = st.columns(3)
         if left.button(quick_replies[0], use_container_width=True):
             st.session_state["user_text"] = quick_replies[0]
@@ -111,17 +194,13 @@ def MainChatUI():
         streamlit_handler = StreamlitCallbackHandler(assistant_placeholder)
         try:
             with st.spinner("Wait for it..."):
-                response_data = chat_handler.conversational_rag_stream(
-                    email=st.session_state["email"],
-                    user_input=voice_text,
-                    callback_handler=streamlit_handler,
-                )
-                
+                response_data = run_chat_turn(voice_text, streamlit_handler)
+
             # Ensure response_data is unpacked correctly
             if isinstance(response_data, tuple) and len(response_data) == 2:
                 response, conversation_id = response_data
             else:
-                raise ValueError("Unexpected return format from chat_handler.conversational_rag_stream()")
+                raise ValueError("Unexpected return format from run_chat_turn()")
 
             assistant_response = streamlit_handler.get_final_text()
             print("DEBUG assistant_response:", assistant_response)
@@ -140,6 +219,12 @@ def MainChatUI():
                 st.session_state["show_context_upload_tab"] = True
                 st.rerun()
 
+            if streamlit_handler.quiz_data:
+                # The quiz was handed over by StartQuiz; the model only framed it
+                st.session_state["quiz_data"] = streamlit_handler.quiz_data
+                st.session_state["current_ui"] = "quiz_ui"
+                assistant_response = "Quiz Initiated"
+
             try:
                 response_json = json.loads(assistant_response)
                 if response_json.get("status") == "success" and "questions" in response_json:
@@ -156,6 +241,7 @@ def MainChatUI():
             else:
                 add_message_to_chat_history("assistant", assistant_response)
                 st.warning("Failed to save conversation. Feedback will not be available.")
+            schedule_quick_replies()
 
         except Exception as e:
             st.error(f"Error while processing voice input: {e}")
@@ -179,16 +265,12 @@ def MainChatUI():
         streamlit_handler = StreamlitCallbackHandler(assistant_placeholder)
         try:
             with st.spinner("Wait for it..."):
-                response_data = chat_handler.conversational_rag_stream(
-                    email=st.session_state["email"],
-                    user_input=user_text,
-                    callback_handler=streamlit_handler,
-                )
+                response_data = run_chat_turn(user_text, streamlit_handler)
 
             if isinstance(response_data, tuple) and len(response_data) == 2:
                 response, conversation_id = response_data
             else:
-                raise ValueError("Unexpected return format from chat_handler.conversational_rag_stream()")
+                raise ValueError("Unexpected return format from run_chat_turn()")
 
             assistant_response = streamlit_handler.get_final_text()
             print("DEBUG assistant_response:", assistant_response)
@@ -207,6 +289,12 @@ def MainChatUI():
                 st.session_state["show_context_upload_tab"] = True
                 st.rerun()
 
+            if streamlit_handler.quiz_data:
+                # The quiz was handed over by StartQuiz; the model only framed it
+                st.session_state["quiz_data"] = streamlit_handler.quiz_data
+                st.session_state["current_ui"] = "quiz_ui"
+                assistant_response = "Quiz Initiated"
+
             try:
                 response_json = json.loads(assistant_response)
                 if response_json.get("status") == "success" and "questions" in response_json:
@@ -223,6 +311,7 @@ def MainChatUI():
             else:
                 add_message_to_chat_history("assistant", assistant_response)
                 st.warning("Failed to save conversation. Feedback will not be available.")
+            schedule_quick_replies()
             st.rerun()
         except Exception as e:
             st.error(f"Error while processing text input: {e}")
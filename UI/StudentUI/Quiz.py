@@ -2,8 +2,9 @@ import streamlit as st
 import re
 
 from DB.index import database_manager
-from agent import create_agent_executor
+from agent import get_default_agent_executor
 from API.curriculum import curriculum_handler
+from API.quiz import quiz_handler
 from API.Chat.chat import chat_handler
 from UI.common import add_message_to_chat_history
 from utils.memory_utils import get_user_memory
@@ -44,7 +45,7 @@ def determine_completion_status(chapter_id, user_email, score, total_questions,
     Otherwise, respond with 'incomplete'.
     """
     try:
-        agent_executor = create_agent_executor()
+        agent_executor = get_default_agent_executor()
         response = agent_executor.invoke({"input": prompt})
         return response.get("output", "").strip()
     except Exception as e:
@@ -56,15 +57,7 @@ def update_chapter_status(chapter_id, status):
         is_completed = status.lower() == "passed"
         print(f"[DEBUG] Updating chapter_id {chapter_id} to {'Completed' if is_completed else 'Not Completed'}")
 
-        database_manager.cursor.execute(
-            """
-            UPDATE curriculum_chapters
-            SET is_completed = %s
-            WHERE chapter_id = %s
-            """,
-            (is_completed, chapter_id),
-        )
-        database_manager.cursor.connection.commit()
+        quiz_handler.mark_chapter_completed(chapter_id, is_completed)
         print(f"[DEBUG] Chapter {chapter_id} update committed successfully.")
         return True
     except Exception as e:
@@ -96,7 +89,7 @@ def mark_chapter_completed_if_ready(chapter_id, user_email, score, total_questio
     4. You must end off with a question to the user like "Would you like to continue learning?".
     """
     try:
-        agent_executor = create_agent_executor()
+        agent_executor = get_default_agent_executor()
         response = agent_executor.invoke({"input": reasoning_prompt})
         llm_feedback = response.get("output", "").strip()
 
@@ -115,6 +108,7 @@ def mark_chapter_completed_if_ready(chapter_id, user_email, score, total_questio
             {"input": "Quiz feedback message (assistant)"},
             {"output": llm_feedback},
         )
+        chat_handler.user_memories.persist(user_email)
     except Exception as e:
         st.error(f"Error generating feedback and next steps: {e}")
         return
@@ -205,22 +199,11 @@ def QuizUI():
                 return
 
             # Calculate score
-            correct_count = 0
-            for i, question in enumerate(quiz_data["questions"], start=1):
-                correct_option = question["options"][ord(question["correct_option"]) - ord("A")]
-                if st.session_state.user_answers.get(f"q{i}") == correct_option:
-                    correct_count += 1
+            correct_count = quiz_handler.score_answers(quiz_data["questions"], st.session_state.user_answers)
 
             # Save quiz results
             try:
-                database_manager.cursor.execute(
-                    """
-                    INSERT INTO quiz_results (chapter_id, email, score, reflection_after_quiz)
-                    VALUES (%s, %s, %s, %s)
-                    """,
-                    (chapter_id, user_email, correct_count, reflection_after_quiz),
-                )
-                database_manager.cursor.connection.commit()
+                quiz_handler.save_result(chapter_id, user_email, correct_count, reflection_after_quiz)
             except Exception as e:
                 st.error(f"Failed to save quiz results: {e}")
 
@@ -5,6 +5,7 @@ from UI.StudentUI.Quiz import QuizUI
 from UI.StudentUI.CoursePdf import UploadPdfUI
 from UI.StudentUI.ContextPdf import pdf_context_upload_ui
 from UI.common import init_student_ui_state
+from API.Chat.chat import chat_handler
 
 def StudentUI():
     init_student_ui_state()
@@ -13,6 +14,9 @@ def StudentUI():
     logout_col = st.columns([3, 1, 1])
     with logout_col[2]:
         if st.button("Logout", key="logout_btn"):
+            # Persist and release the user's chat memory
+            chat_handler.user_memories.evict(st.session_state["email"])
+
             # Clear session state
             st.session_state["logged_in"] = False
             st.session_state["email"] = None
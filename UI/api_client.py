@@ -0,0 +1,62 @@
+import os
+import json
+import requests
+
+# When set, the Streamlit UI sends chat turns to the FastAPI service (server.py)
+# instead of running the agent in-process.
+CHAT_API_URL = os.getenv("CHAT_API_URL", "").rstrip("/")
+
+
+def is_enabled() -> bool:
+    return bool(CHAT_API_URL)
+
+
+def login(email: str, password: str) -> str:
+    """
+    Exchange credentials for an API bearer token.
+    """
+    response = requests.post(
+        f"{CHAT_API_URL}/auth/login", json={"email": email, "password": password}, timeout=30
+    )
+    response.raise_for_status()
+    return response.json()["token"]
+
+
+def _iter_sse(response):
+    event_type, data = None, []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event_type = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+        elif not line and data:
+            yield event_type, json.loads("\n".join(data))
+            event_type, data = None, []
+
+
+def stream_chat(token: str, user_input: str, callback_handler=None):
+    """
+    Run a chat turn on the API, forwarding streamed tokens and tool payloads to `callback_handler`.
+    Returns (final_text, conversation_id), like `ChatHandler.conversational_rag_stream`.
+    """
+    with requests.post(
+        f"{CHAT_API_URL}/chat",
+        json={"message": user_input},
+        headers={"Authorization": f"Bearer {token}", "Accept": "text/event-stream"},
+        stream=True,
+        timeout=(10, 300),
+    ) as response:
+        response.raise_for_status()
+        for event_type, event in _iter_sse(response):
+            if event_type == "token" and callback_handler is not None:
+                callback_handler.on_llm_new_token(event["content"])
+            elif event_type in ("quiz", "lesson"):
+                if hasattr(callback_handler, "on_tool_payload"):
+                    callback_handler.on_tool_payload({"kind": event_type, "data": event["data"]})
+            elif event_type == "end":
+                if callback_handler is not None:
+                    callback_handler.on_llm_end(None)
+                return event["output"], event["conversation_id"]
+            elif event_type == "error":
+                return f"Error: {event['message']}", None
+    return "", None
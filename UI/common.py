@@ -8,9 +8,7 @@ feedback_handler = FeedbackHandler()
 
 def add_feedback_for_message(conversation_id: str, feedback_text: str):
     email = st.session_state["email"]
-    summarized_feedback = feedback_handler.save_feedback(
-        email, conversation_id, feedback_text
-    )
+    feedback_handler.save_feedback(email, conversation_id, feedback_text)
     # Flag session state indicating feedback was updated
     st.session_state["feedback_updated"] = True
 
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import List, Optional
 from langchain.tools import StructuredTool
 from langchain.agents import create_tool_calling_agent, AgentExecutor
@@ -61,3 +62,12 @@ def create_agent_executor(
         verbose=True,
     )
     return agent_executor
+
+
+@lru_cache(maxsize=None)
+def get_default_agent_executor() -> AgentExecutor:
+    """
+    Shared executor with the default tools and no memory, for one-off prompts.
+    It holds no per-call state, so pass callbacks per invocation if needed.
+    """
+    return create_agent_executor()
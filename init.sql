@@ -26,7 +26,11 @@ CREATE TABLE IF NOT EXISTS curriculums (
    duration_per_session INT CHECK (duration_per_session > 0), 
    goal_description TEXT,
    learning_goal TEXT,
-   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+   -- Materialized progress, maintained by CurriculumHandler.refresh_progress
+   total_chapters INT NOT NULL DEFAULT 0,
+   completed_chapters INT NOT NULL DEFAULT 0,
+   next_chapter_id INT
 );
 
 -- Curriculum Chapters Table
@@ -40,6 +44,31 @@ CREATE TABLE IF NOT EXISTS curriculum_chapters (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Migration: materialized progress columns on databases created before them
+ALTER TABLE curriculums ADD COLUMN IF NOT EXISTS total_chapters INT NOT NULL DEFAULT 0;
+ALTER TABLE curriculums ADD COLUMN IF NOT EXISTS completed_chapters INT NOT NULL DEFAULT 0;
+ALTER TABLE curriculums ADD COLUMN IF NOT EXISTS next_chapter_id INT;
+
+ALTER TABLE curriculums DROP CONSTRAINT IF EXISTS fk_curriculums_next_chapter;
+ALTER TABLE curriculums
+ADD CONSTRAINT fk_curriculums_next_chapter
+FOREIGN KEY (next_chapter_id) REFERENCES curriculum_chapters(chapter_id) ON DELETE SET NULL;
+
+-- Migration: backfill the progress columns (same logic as REFRESH_PROGRESS_QUERY); safe to re-run
+UPDATE curriculums cu
+SET total_chapters = progress.total,
+    completed_chapters = progress.completed,
+    next_chapter_id = progress.next_chapter_id
+FROM (
+    SELECT curriculum_id,
+           COUNT(*) AS total,
+           COUNT(*) FILTER (WHERE is_completed) AS completed,
+           MIN(chapter_id) FILTER (WHERE is_completed IS NOT TRUE) AS next_chapter_id
+    FROM curriculum_chapters
+    GROUP BY curriculum_id
+) AS progress
+WHERE cu.curriculum_id = progress.curriculum_id;
+
 -- Quiz Questions Table
 CREATE TABLE IF NOT EXISTS quiz_questions (
     question_id SERIAL PRIMARY KEY,
@@ -91,6 +120,68 @@ CREATE TABLE IF NOT EXISTS feedback (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Feedback Summaries Table (incrementally maintained by the feedback worker)
+CREATE TABLE IF NOT EXISTS feedback_summaries (
+    email VARCHAR(100) PRIMARY KEY REFERENCES users(email) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    last_feedback_id INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Session Memories Table (durable chat memory shared across app replicas)
+CREATE TABLE IF NOT EXISTS session_memories (
+    email VARCHAR(100) PRIMARY KEY REFERENCES users(email) ON DELETE CASCADE,
+    state JSONB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Curriculum Jobs Table (durable queue for background curriculum generation)
+CREATE TABLE IF NOT EXISTS curriculum_jobs (
+    job_id SERIAL PRIMARY KEY,
+    idempotency_key VARCHAR(64) UNIQUE NOT NULL,
+    email VARCHAR(100) REFERENCES users(email) ON DELETE CASCADE,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    progress VARCHAR(30) NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(255),
+    locked_at TIMESTAMP,
+    curriculum_id INT REFERENCES curriculums(curriculum_id) ON DELETE SET NULL,
+    last_error TEXT,
+    notified_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Curriculum Revisions Table (chapter operations applied by an improvement run)
+CREATE TABLE IF NOT EXISTS curriculum_revisions (
+    revision_id SERIAL PRIMARY KEY,
+    curriculum_id INT REFERENCES curriculums(curriculum_id) ON DELETE CASCADE,
+    improvements TEXT,
+    operations JSONB NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Daily Agenda Table (each user's incomplete chapters due on agenda_date, materialized at midnight)
+CREATE TABLE IF NOT EXISTS daily_agenda (
+    email VARCHAR(100) REFERENCES users(email) ON DELETE CASCADE,
+    agenda_date DATE NOT NULL,
+    chapters JSONB NOT NULL DEFAULT '[]'::jsonb,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (email, agenda_date)
+);
+
+-- Lesson Sections Table (chapter lessons, generated one section at a time as students reach them)
+CREATE TABLE IF NOT EXISTS lesson_sections (
+    chapter_id INT REFERENCES curriculum_chapters(chapter_id) ON DELETE CASCADE,
+    section_index SMALLINT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (chapter_id, section_index)
+);
+
 -- Table is properly indexed
 
 CREATE INDEX idx_curriculums_email_subject 
@@ -102,6 +193,15 @@ ON curriculums (created_at);
 CREATE INDEX idx_chapters_curriculum_id_is_completed
 ON curriculum_chapters (curriculum_id, is_completed);
 
+CREATE INDEX idx_chapters_incomplete_scheduled_date
+ON curriculum_chapters (scheduled_date) WHERE is_completed = FALSE;
+
+CREATE INDEX idx_curriculum_jobs_due
+ON curriculum_jobs (run_after) WHERE status IN ('queued', 'running');
+
+CREATE INDEX idx_curriculum_jobs_email_created_at
+ON curriculum_jobs (email, created_at);
+
 CREATE TABLE public.user_streaks (
     email VARCHAR(100) REFERENCES users(email) ON DELETE CASCADE,
     current_streak INT DEFAULT 0 NOT NULL CHECK (current_streak >= 0),
@@ -0,0 +1,101 @@
+"""
+Row-throughput benchmark for the bulk-write helpers against a real Postgres.
+
+Inserts chapter-shaped rows into a temporary copy of `curriculum_chapters`
+(dropped at commit, so nothing is left behind) with each write strategy:
+one `execute` per row (the old PDF and quiz paths), `executemany` (the old
+curriculum path) and `bulk_insert` (`execute_values`, with and without
+RETURNING). Uses the DB_* settings from `.env`.
+
+Usage:
+    python -m loadtest.bulk_insert --rows 1000 10000 --repeat 3
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+load_dotenv()
+
+from DB.index import database_manager
+
+TABLE = "bench_chapters"
+COLUMNS = ("curriculum_id", "title", "description", "scheduled_date")
+
+
+def make_rows(count: int) -> List[tuple]:
+    start = date.today()
+    return [
+        (1, f"Chapter {i}", f"Description of chapter {i}, long enough to resemble a generated one.", start + timedelta(days=i))
+        for i in range(count)
+    ]
+
+
+def per_row(cursor, rows):
+    for row in rows:
+        cursor.execute(f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}) VALUES (%s, %s, %s, %s)", row)
+
+
+def execute_many(cursor, rows):
+    cursor.executemany(f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}) VALUES (%s, %s, %s, %s)", rows)
+
+
+def bulk_insert(cursor, rows):
+    database_manager.bulk_insert(TABLE, COLUMNS, rows, cursor=cursor)
+
+
+def bulk_insert_returning(cursor, rows):
+    ids = database_manager.bulk_insert(TABLE, COLUMNS, rows, returning="chapter_id", cursor=cursor)
+    assert len(ids) == len(rows)
+
+
+STRATEGIES: Dict[str, Callable] = {
+    "execute per row": per_row,
+    "executemany": execute_many,
+    "bulk_insert": bulk_insert,
+    "bulk_insert RETURNING": bulk_insert_returning,
+}
+
+
+def time_strategy(strategy: Callable, rows: List[tuple]) -> float:
+    with database_manager.pooled_transaction() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE {TABLE} (LIKE curriculum_chapters INCLUDING DEFAULTS) ON COMMIT DROP")
+        started = time.perf_counter()
+        strategy(cursor, rows)
+        elapsed = time.perf_counter() - started
+        cursor.execute(f"SELECT COUNT(*) FROM {TABLE}")
+        assert cursor.fetchone()[0] == len(rows)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000], help="Row counts to insert")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per strategy; the best is reported")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    report = []
+    for count in args.rows:
+        rows = make_rows(count)
+        print(f"\n{count} rows")
+        print(f"{'strategy':<24}{'seconds':>10}{'rows/s':>12}")
+        for name, strategy in STRATEGIES.items():
+            best = min(time_strategy(strategy, rows) for _ in range(args.repeat))
+            report.append({"rows": count, "strategy": name, "seconds": round(best, 4), "rows_per_second": round(count / best)})
+            print(f"{name:<24}{best:>10.4f}{count / best:>12.0f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
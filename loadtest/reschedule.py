@@ -0,0 +1,125 @@
+"""
+Benchmark for the set-based missed-chapter rescheduling against a real Postgres.
+
+Seeds curricula whose chapters are all overdue (inside a transaction that is
+rolled back at the end, so nothing is left behind), then times
+`ChapterHanlder.reschedule_missed_chapters` against the per-curriculum Python
+loop it replaces (fetch the incomplete chapters, recompute the dates with
+`calculate_scheduled_dates`, write them back). Uses the DB_* settings from `.env`.
+
+Usage:
+    python -m loadtest.reschedule --curricula 10000 --chapters 12
+"""
+import os
+import sys
+import time
+import argparse
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+load_dotenv()
+os.environ["NIGHTLY_RESCHEDULE"] = "false"
+
+from DB.index import database_manager
+from API.chapter import chapter_handler
+from API.curriculum import curriculum_handler
+from utils.date_utils import get_today_date
+
+BENCH_EMAIL = "reschedule-bench@loadtest.local"
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed(cursor, curricula: int, chapters: int):
+    cursor.execute(
+        "INSERT INTO users (email, password_hash, role) VALUES (%s, 'x', 'Student') ON CONFLICT DO NOTHING",
+        (BENCH_EMAIL,),
+    )
+    cursor.execute(
+        """
+        INSERT INTO curriculums (email, subject, commitment_level, duration_per_session, start_date)
+        SELECT %s, 'Bench ' || i,
+               (ARRAY['Daily', 'Weekly', 'Twice a Week', 'Monthly'])[1 + i %% 4],
+               60, CURRENT_DATE - 120
+        FROM generate_series(1, %s) AS i
+        RETURNING curriculum_id
+        """,
+        (BENCH_EMAIL, curricula),
+    )
+    curriculum_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        """
+        INSERT INTO curriculum_chapters (curriculum_id, title, scheduled_date, is_completed)
+        SELECT c, 'Chapter ' || n, CURRENT_DATE - 120 + n * 3, n <= 2
+        FROM unnest(%s) AS c, generate_series(1, %s) AS n
+        """,
+        (curriculum_ids, chapters),
+    )
+    cursor.execute("ANALYZE curriculum_chapters")
+    return curriculum_ids
+
+
+def python_loop(cursor, curriculum_ids, today: str) -> int:
+    moved = 0
+    for curriculum_id in curriculum_ids:
+        cursor.execute(
+            """
+            SELECT cc.chapter_id, c.commitment_level
+            FROM curriculum_chapters cc
+            JOIN curriculums c ON cc.curriculum_id = c.curriculum_id
+            WHERE cc.curriculum_id = %s AND cc.is_completed = FALSE
+            ORDER BY cc.scheduled_date, cc.chapter_id
+            """,
+            (curriculum_id,),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            continue
+        dates = curriculum_handler.calculate_scheduled_dates(rows[0][1], today, len(rows))
+        cursor.executemany(
+            "UPDATE curriculum_chapters SET scheduled_date = %s WHERE chapter_id = %s",
+            [(scheduled_date, chapter_id) for (chapter_id, _), scheduled_date in zip(rows, dates)],
+        )
+        moved += len(rows)
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--curricula", type=int, default=10000, help="Curricula to seed")
+    parser.add_argument("--chapters", type=int, default=12, help="Chapters per curriculum")
+    parser.add_argument("--skip-loop", action="store_true", help="Only time the set-based statement")
+    args = parser.parse_args()
+
+    today = get_today_date()
+    try:
+        with database_manager.pooled_transaction() as cursor:
+            started = time.perf_counter()
+            curriculum_ids = seed(cursor, args.curricula, args.chapters)
+            print(f"Seeded {args.curricula * args.chapters} chapter rows in {time.perf_counter() - started:.2f}s")
+            cursor.execute("SAVEPOINT seeded")
+
+            started = time.perf_counter()
+            moved = chapter_handler.reschedule_missed_chapters(today=today, cursor=cursor)
+            print(f"set-based statement: {moved} chapters moved in {time.perf_counter() - started:.3f}s")
+
+            started = time.perf_counter()
+            again = chapter_handler.reschedule_missed_chapters(today=today, cursor=cursor)
+            print(f"second run (no-op):  {again} chapters moved in {time.perf_counter() - started:.3f}s")
+
+            if not args.skip_loop:
+                cursor.execute("ROLLBACK TO SAVEPOINT seeded")
+                started = time.perf_counter()
+                moved = python_loop(cursor, curriculum_ids, today)
+                print(f"per-curriculum loop: {moved} chapters moved in {time.perf_counter() - started:.3f}s")
+            raise Rollback()
+    except Rollback:
+        print("Rolled back the seeded data.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Concurrent-student load test for ChatHandler and the API handlers.
+
+Simulates N students, each on its own thread (as Streamlit serves each session),
+running a scripted session against stubbed providers with configurable latency:
+login, scheduled-chapter check, continue course, quiz, free chat and PDF upload.
+
+Usage:
+    python -m loadtest.run --students 50 --llm-latency 0.8 --db-latency 0.002
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from loadtest import stubs
+
+
+class OperationTimer:
+    """
+    Collects wall-clock latencies and error counts per named operation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def run(self, name: str, func: Callable, *args, **kwargs):
+        start = time.perf_counter()
+        failed = False
+        try:
+            result = func(*args, **kwargs)
+            if isinstance(result, tuple) and result and isinstance(result[0], str) and result[0].startswith("Error"):
+                failed = True
+            return result
+        except Exception as e:
+            failed = True
+            print(f"[ERROR] {name}: {e}")
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.latencies.setdefault(name, []).append(elapsed)
+                if failed:
+                    self.errors[name] = self.errors.get(name, 0) + 1
+
+
+class Sampler(threading.Thread):
+    """
+    Periodically samples background executor queue depth per lane, live per-user
+    memory entries and traced heap size.
+    """
+
+    def __init__(self, executor, chat_handler, interval: float = 0.25):
+        super().__init__(daemon=True)
+        self.executor = executor
+        self.chat_handler = chat_handler
+        self.interval = interval
+        self.samples: List[dict] = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            cache_stats = self.chat_handler.user_memories.stats()
+            sample = {
+                "t": time.perf_counter(),
+                "heap_bytes": tracemalloc.get_traced_memory()[0],
+                "user_memories": cache_stats["entries"],
+                "session_cache_bytes": cache_stats["bytes"],
+                "session_cache_evictions": cache_stats["evictions"],
+            }
+            for lane, lane_stats in self.executor.stats().items():
+                sample[f"queue.{lane}"] = lane_stats["queued"]
+            self.samples.append(sample)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class TokenCollector(BaseCallbackHandler):
+    """
+    Minimal stand-in for StreamlitCallbackHandler that only accumulates tokens.
+    """
+
+    def __init__(self):
+        self.tokens: List[str] = []
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.tokens.append(token)
+
+    def get_final_text(self) -> str:
+        return "".join(self.tokens)
+
+
+def student_session(student_id: int, timer: OperationTimer, think_time: float):
+    """
+    One scripted student session. Mirrors what MainChatUI and the upload tabs
+    do for a typical study day.
+    """
+    import streamlit as st
+    from API.auth import auth_handler
+    from API.chapter import chapter_handler
+    from API.context import context_handler
+    from API.curriculum import curriculum_handler
+    from API.Chat.chat import chat_handler
+
+    email = f"student{student_id}@loadtest.local"
+    st.session_state["email"] = email
+    st.session_state["chat_history"] = []
+
+    def pause():
+        if think_time:
+            time.sleep(random.uniform(0, think_time))
+
+    def chat(text: str):
+        return chat_handler.conversational_rag_stream(
+            email=email, user_input=text, callback_handler=TokenCollector()
+        )
+
+    timer.run("login", auth_handler.validate_user, email, "loadtest")
+    pause()
+    timer.run("scheduled_chapters", chapter_handler.get_scheduled_chapters, email)
+    pause()
+    timer.run("chat.first_turn", chat, "Hi! What is scheduled for me today?")
+    pause()
+    timer.run("chat.continue_course", chat, "Please continue my Python course.")
+    pause()
+    timer.run("chat.start_quiz", chat, "I'm ready, start the quiz.")
+    timer.run("quiz.fetch_questions", curriculum_handler.fetch_quiz_questions_data, 1)
+    pause()
+    timer.run("chat.free", chat, "Can you explain how variable scoping works?")
+    pause()
+    pdf = stubs.make_pdf(f"Lecture notes for student {student_id} " * 20)
+    timer.run(
+        "pdf.upload_context",
+        context_handler.process_pdfs,
+        pdf_files=[pdf],
+        user_email=email,
+        course_id="1",
+    )
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    # Nearest-rank percentile
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build_report(timer: OperationTimer, sampler: Sampler, elapsed: float, students: int) -> dict:
+    from utils.agent_utils import tool_selector
+
+    operations = {}
+    total_ops = 0
+    for name, values in sorted(timer.latencies.items()):
+        total_ops += len(values)
+        operations[name] = {
+            "count": len(values),
+            "errors": timer.errors.get(name, 0),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+        }
+
+    queues = {}
+    for key in sampler.samples[0] if sampler.samples else {}:
+        if key.startswith("queue."):
+            depths = [s[key] for s in sampler.samples]
+            queues[key[len("queue."):]] = {"max": max(depths), "mean": round(sum(depths) / len(depths), 2)}
+
+    heap = [s["heap_bytes"] for s in sampler.samples] or [0]
+    return {
+        "students": students,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_ops_per_s": round(total_ops / elapsed, 2) if elapsed else 0.0,
+        "sessions_per_s": round(students / elapsed, 2) if elapsed else 0.0,
+        "operations": operations,
+        "background_queue_depth": queues,
+        "background_lanes": sampler.executor.stats(),
+        "memory": {
+            "heap_start_mb": round(heap[0] / 2**20, 2),
+            "heap_peak_mb": round(tracemalloc.get_traced_memory()[1] / 2**20, 2),
+            "heap_end_mb": round(heap[-1] / 2**20, 2),
+            "user_memories_end": sampler.samples[-1]["user_memories"] if sampler.samples else 0,
+            "session_cache_peak_mb": round(
+                max((s["session_cache_bytes"] for s in sampler.samples), default=0) / 2**20, 2
+            ),
+            "session_cache_evictions": sampler.samples[-1]["session_cache_evictions"] if sampler.samples else 0,
+        },
+        "coalesced_turns": sampler.chat_handler.inflight_turns.stats(),
+        "tool_subsetting": tool_selector.stats(),
+        "providers": stubs.STATS.snapshot(),
+    }
+
+
+def print_report(report: dict):
+    print(f"\n=== Load test: {report['students']} students in {report['elapsed_s']}s ===")
+    print(f"Throughput: {report['throughput_ops_per_s']} ops/s, {report['sessions_per_s']} sessions/s\n")
+    print(f"{'operation':<24}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in report["operations"].items():
+        print(
+            f"{name:<24}{row['count']:>7}{row['errors']:>8}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+        )
+    print("\nBackground lane queue depth:")
+    for name, row in report["background_queue_depth"].items():
+        lane = report["background_lanes"][name]
+        print(
+            f"  {name:<22} max={row['max']} mean={row['mean']} wait_p95={lane['wait_p95_ms']}ms "
+            f"rejected={lane['rejected']} failed={lane['failed']}"
+        )
+    memory = report["memory"]
+    print(
+        f"\nHeap: start={memory['heap_start_mb']}MB peak={memory['heap_peak_mb']}MB "
+        f"end={memory['heap_end_mb']}MB, user_memories={memory['user_memories_end']}"
+    )
+    print(
+        f"Session cache: peak={memory['session_cache_peak_mb']}MB "
+        f"evictions={memory['session_cache_evictions']}"
+    )
+    print(f"Chat turns: {report['coalesced_turns']}")
+    print(f"Tool subsetting: {report['tool_subsetting']}")
+    print(f"Provider calls: {report['providers']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=20, help="Number of concurrent students")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Seconds per chat completion")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Seconds per streamed token")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds per embedding call")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Seconds per Azure Search call")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="Seconds per SQL statement")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max seconds a student pauses between steps")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    stubs.install_stubs(
+        stubs.Latency(
+            llm=args.llm_latency,
+            llm_token=args.token_latency,
+            embedding=args.embedding_latency,
+            search=args.search_latency,
+            db=args.db_latency,
+        )
+    )
+
+    tracemalloc.start()
+
+    # Import after the stubs are installed so the handlers bind to them
+    from API.Chat.chat import chat_handler
+    from utils.executor_utils import background_executor
+
+    sampler = Sampler(background_executor, chat_handler)
+    timer = OperationTimer()
+
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.students) as students:
+        futures = [
+            students.submit(student_session, i, timer, args.think_time)
+            for i in range(args.students)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+
+    report = build_report(timer, sampler, elapsed, args.students)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+"""
+Stubbed providers for the load-test harness.
+
+Replaces Postgres (psycopg2), Azure AI Search, Azure OpenAI (chat + embeddings)
+and Streamlit with in-process fakes that sleep for a configurable latency, so
+`ChatHandler` and the API handlers can be driven directly without any cloud
+resources. `install_stubs()` must run before any project module is imported.
+"""
+import os
+import sys
+import json
+import asyncio
+import time
+import types
+import random
+import threading
+import itertools
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+
+class Latency:
+    """
+    Per-provider latency in seconds. Each call sleeps for `base * U(1 - jitter, 1 + jitter)`.
+    """
+
+    def __init__(
+        self,
+        llm: float = 0.8,
+        llm_token: float = 0.005,
+        embedding: float = 0.05,
+        search: float = 0.05,
+        db: float = 0.002,
+        jitter: float = 0.25,
+    ):
+        self.llm = llm
+        self.llm_token = llm_token
+        self.embedding = embedding
+        self.search = search
+        self.db = db
+        self.jitter = jitter
+
+    def sleep(self, base: float):
+        if base <= 0:
+            return
+        time.sleep(base * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+LATENCY = Latency()
+
+
+class ProviderStats:
+    """
+    Thread-safe counters shared by all stubs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+
+STATS = ProviderStats()
+
+
+# ---------------------------------------------------------------------------
+# Postgres
+# ---------------------------------------------------------------------------
+
+def _default_rows() -> List[tuple]:
+    import bcrypt
+
+    password_hash = bcrypt.hashpw(b"loadtest", bcrypt.gensalt(rounds=4)).decode("utf-8")
+    today = date.today()
+    return [
+        # (substring of the SQL statement, fetch result)
+        ("SELECT password_hash FROM users", [(password_hash,)]),
+        ("SELECT COUNT(*) FROM users", [(1,)]),
+        ("SELECT role FROM users", [("Student",)]),
+        ("SELECT school_id FROM users", [(123456,)]),
+        ("SELECT email FROM users WHERE school_id", [("instructor@loadtest.local",)]),
+        # The enrollment summary first: the subject index query is a prefix of it
+        (
+            "SELECT curriculum_id, subject, start_date",
+            [(1, "Python", today, "Daily", 60, "Learn Python", "Write scripts", datetime.now(), 1, 5)],
+        ),
+        ("SELECT curriculum_id, subject", [(1, "Python")]),
+        ("SELECT c.chapter_id, c.title, c.description, cu.subject", [(1, "Variables", "Names and values", "Python")]),
+        (
+            "FROM daily_agenda",
+            [([{"chapter_id": 1, "title": "Variables", "scheduled_date": today.isoformat(), "subject": "Python"}],)],
+        ),
+        ("SELECT EXISTS", [(True,)]),
+        # Chapters without a quiz: every stub chapter already has one
+        ("SELECT cc.chapter_id, cc.title, cc.description", []),
+        (
+            "FROM quiz_questions",
+            [(f"Question {i}?", "A", "B", "C", "D", "A") for i in range(6)],
+        ),
+        ("SELECT chapter_id FROM curriculum_chapters", [(1,)]),
+        ("SELECT curriculum_id FROM curriculums", []),
+        ("SELECT feedback_text FROM feedback", [("Use more examples.",)]),
+        ("SELECT current_streak, longest_streak", [(3, 5)]),
+    ]
+
+
+class FakeCursor:
+    """
+    Mimics the single psycopg2 cursor shared by every handler.
+
+    `execute` holds the connection lock (as libpq does) and stores the result on
+    the cursor. A `fetch*` from a different thread than the one that issued the
+    matching `execute` is counted as a cursor race, which is exactly the failure
+    mode of sharing one cursor between concurrent Streamlit sessions.
+    """
+
+    def __init__(self, connection: "FakeConnection"):
+        self.connection = connection
+        self._rows: List[tuple] = []
+        self.rowcount = -1
+        self._owner: Optional[int] = None
+        self._ids = itertools.count(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query: str, params: Any = None):
+        with self.connection.lock:
+            LATENCY.sleep(LATENCY.db)
+            STATS.incr("db.execute")
+            self._owner = threading.get_ident()
+            self._rows = self._route(query)
+            self.rowcount = len(self._rows)
+
+    def executemany(self, query: str, params_seq: Any):
+        for params in params_seq:
+            self.execute(query, params)
+
+    def _route(self, query: str) -> List[tuple]:
+        if "curriculum_jobs" in query:
+            return []  # No background curriculum jobs
+        if "RETURNING" in query:
+            return [(next(self._ids),)]
+        for needle, rows in self.connection.rows:
+            if needle in query:
+                return list(rows)
+        return []
+
+    def _check_owner(self):
+        if self._owner is not None and self._owner != threading.get_ident():
+            STATS.incr("db.cursor_race")
+
+    def fetchone(self):
+        self._check_owner()
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        self._check_owner()
+        rows, self._rows = self._rows, []
+        return rows
+
+
+class FakeConnection:
+    def __init__(self):
+        self.autocommit = False
+        self.closed = False
+        self.lock = threading.Lock()
+        self.rows = _default_rows()
+        self._cursor = FakeCursor(self)
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        STATS.incr("db.commit")
+
+    def rollback(self):
+        STATS.incr("db.rollback")
+
+
+class FakeConnectionPool:
+    def __init__(self, minconn: int, maxconn: int, **kwargs):
+        self._lock = threading.Lock()
+        self._idle: List[FakeConnection] = []
+
+    def getconn(self) -> FakeConnection:
+        with self._lock:
+            return self._idle.pop() if self._idle else FakeConnection()
+
+    def putconn(self, conn: FakeConnection):
+        with self._lock:
+            self._idle.append(conn)
+
+
+def _psycopg2_module() -> types.ModuleType:
+    module = types.ModuleType("psycopg2")
+    module.connect = lambda **kwargs: FakeConnection()
+    module.pool = types.ModuleType("psycopg2.pool")
+    module.pool.ThreadedConnectionPool = FakeConnectionPool
+    module.extras = types.ModuleType("psycopg2.extras")
+    module.extras.execute_values = _execute_values
+    return module
+
+
+def _execute_values(cursor: FakeCursor, query: str, argslist: Any, template=None, page_size: int = 100, fetch: bool = False):
+    # One round trip per page, like the real multi-row INSERT
+    argslist = list(argslist)
+    result = []
+    for i in range(0, len(argslist), page_size):
+        page = argslist[i:i + page_size]
+        cursor.execute(query, page)
+        if fetch:
+            cursor.fetchall()
+            result.extend((next(cursor._ids),) for _ in page)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Azure AI Search / Azure OpenAI embeddings
+# ---------------------------------------------------------------------------
+
+class FakeSearchClient:
+    def search(self, *args, **kwargs):
+        LATENCY.sleep(LATENCY.search)
+        STATS.incr("search.query")
+        return []
+
+    def upload_documents(self, documents: List[dict]):
+        LATENCY.sleep(LATENCY.search)
+        STATS.incr("search.upload", len(documents))
+        return types.SimpleNamespace(results=[])
+
+
+class _AsyncResults:
+    def __init__(self, results: List[dict]):
+        self._results = list(results)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._results:
+            raise StopAsyncIteration
+        return self._results.pop(0)
+
+
+class FakeAsyncSearchClient:
+    async def search(self, *args, **kwargs):
+        await asyncio.sleep(LATENCY.search)
+        STATS.incr("search.query")
+        return _AsyncResults([])
+
+    async def upload_documents(self, documents: List[dict]):
+        await asyncio.sleep(LATENCY.search)
+        STATS.incr("search.upload", len(documents))
+        return types.SimpleNamespace(results=[])
+
+
+class _FakeAsyncEmbeddings:
+    async def create(self, input: Any = None, model: Optional[str] = None, **kwargs):
+        await asyncio.sleep(LATENCY.embedding)
+        STATS.incr("embedding.create")
+        return types.SimpleNamespace(data=[types.SimpleNamespace(embedding=[0.0] * 1536)])
+
+
+class FakeAsyncOpenAIClient:
+    def __init__(self, *args, **kwargs):
+        self.embeddings = _FakeAsyncEmbeddings()
+
+
+class _FakeEmbeddings:
+    def create(self, input: Any = None, model: Optional[str] = None, **kwargs):
+        LATENCY.sleep(LATENCY.embedding)
+        STATS.incr("embedding.create")
+        return types.SimpleNamespace(data=[types.SimpleNamespace(embedding=[0.0] * 1536)])
+
+
+class FakeOpenAIClient:
+    def __init__(self, *args, **kwargs):
+        self.embeddings = _FakeEmbeddings()
+
+
+def _azure_search_module() -> types.ModuleType:
+    module = types.ModuleType("Azure.Search")
+    module.search_client = FakeSearchClient()
+    module.pdf_client = FakeSearchClient()
+    module.client = FakeOpenAIClient()
+    module.async_search_client = FakeAsyncSearchClient()
+    module.async_pdf_client = FakeAsyncSearchClient()
+    module.async_client = FakeAsyncOpenAIClient()
+    for name in (
+        "AZURE_OPENAI_ENDPOINT",
+        "AZURE_OPENAI_API_KEY",
+        "AZURE_OPENAI_DEPLOYMENT",
+        "OPENAI_API_VERSION",
+        "TEXT_EMBEDDING_MODEL_NAME",
+    ):
+        setattr(module, name, os.environ[name])
+    return module
+
+
+def _openai_module() -> types.ModuleType:
+    module = types.ModuleType("openai")
+    module.AzureOpenAI = FakeOpenAIClient
+    module.AsyncAzureOpenAI = FakeAsyncOpenAIClient
+    module.embeddings = _FakeEmbeddings()
+    return module
+
+
+# ---------------------------------------------------------------------------
+# Azure OpenAI chat
+# ---------------------------------------------------------------------------
+
+# (keyword in the user turn, tool to call, tool arguments)
+SCRIPTED_TOOL_CALLS = [
+    ("continue my", "ContinueCourse", {"subject": "Python"}),
+    ("start the quiz", "StartQuiz", {"chapter_id": 1}),
+    ("what is scheduled", "FetchScheduledChapters", {}),
+    ("enrolled in", "GetCurrentEnrollment", {}),
+]
+
+STUB_QUIZ = [
+    {"question": f"Question {i}?", "options": ["A", "B", "C", "D"], "correct_option": "A"}
+    for i in range(6)
+]
+
+STUB_REPLY = (
+    "Here is a short explanation with an example. Variables bind names to values, "
+    "and Python resolves them at runtime. Would you like to continue learning?"
+)
+
+
+def _chat_model_module() -> types.ModuleType:
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+    class StubChatModel(BaseChatModel):
+        """
+        Chat model that sleeps like Azure OpenAI and answers from a script:
+        the first step of a turn calls the tool matching a keyword in the user
+        input, and any step after a tool result answers in plain text.
+        """
+
+        azure_deployment: str = "gpt-4o"
+        temperature: float = 0
+        top_p: float = 0
+        streaming: bool = False
+        tools_bound: bool = False
+
+        @property
+        def _llm_type(self) -> str:
+            return "loadtest-stub"
+
+        def bind_tools(self, tools, **kwargs):
+            return self.model_copy(update={"tools_bound": True})
+
+        def _respond(self, messages) -> AIMessage:
+            last = messages[-1]
+            text = str(last.content).lower()
+            # Script on what the student typed, not on the injected context around it
+            query = text.rsplit("**user query**", 1)[-1]
+            if self.tools_bound and not isinstance(last, ToolMessage):
+                for keyword, tool, args in SCRIPTED_TOOL_CALLS:
+                    if keyword in query:
+                        call_id = f"call_{random.getrandbits(32):x}"
+                        return AIMessage(
+                            content="",
+                            tool_calls=[{"name": tool, "args": args, "id": call_id}],
+                        )
+            if "multiple-choice" in text:
+                return AIMessage(content=json.dumps(STUB_QUIZ))
+            if "json" in text:
+                return AIMessage(content=json.dumps([{"title": "Variables", "description": "Names and values"}]))
+            return AIMessage(content=STUB_REPLY)
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            LATENCY.sleep(LATENCY.llm)
+            STATS.incr(f"llm.{self.azure_deployment}")
+            message = self._respond(messages)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            LATENCY.sleep(LATENCY.llm)
+            STATS.incr(f"llm.{self.azure_deployment}")
+            message = self._respond(messages)
+            if message.tool_calls:
+                call = message.tool_calls[0]
+                yield ChatGenerationChunk(
+                    message=AIMessageChunk(
+                        content="",
+                        tool_call_chunks=[
+                            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}
+                        ],
+                    )
+                )
+                return
+            for word in message.content.split(" "):
+                LATENCY.sleep(LATENCY.llm_token)
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    module = types.ModuleType("langchain_openai")
+    module.AzureChatOpenAI = StubChatModel
+    return module
+
+
+# ---------------------------------------------------------------------------
+# Streamlit
+# ---------------------------------------------------------------------------
+
+class _SessionState(threading.local):
+    """
+    Per-thread stand-in for `st.session_state`; every simulated student runs on
+    its own thread, as each Streamlit session does.
+    """
+
+    def __init__(self):
+        self.__dict__["_data"] = {"chat_history": []}
+
+    def __getattr__(self, name):
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self._data[name] = value
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+
+def _streamlit_module() -> types.ModuleType:
+    module = types.ModuleType("streamlit")
+    module.session_state = _SessionState()
+    module.error = lambda *args, **kwargs: STATS.incr("streamlit.error")
+    module.stop = lambda: None
+    module.delta_generator = types.SimpleNamespace(DeltaGenerator=object)
+    return module
+
+
+def install_stubs(latency: Optional[Latency] = None):
+    """
+    Register the stub providers in `sys.modules`. Must be called before any
+    project module is imported.
+    """
+    global LATENCY
+    if latency is not None:
+        LATENCY = latency
+
+    for name in (
+        "AZURE_OPENAI_ENDPOINT",
+        "AZURE_OPENAI_API_KEY",
+        "AZURE_OPENAI_DEPLOYMENT",
+        "OPENAI_API_VERSION",
+        "TEXT_EMBEDDING_MODEL_NAME",
+    ):
+        os.environ.setdefault(name, "loadtest")
+
+    psycopg2 = _psycopg2_module()
+    sys.modules["psycopg2"] = psycopg2
+    sys.modules["psycopg2.pool"] = psycopg2.pool
+    sys.modules["psycopg2.extras"] = psycopg2.extras
+    sys.modules["openai"] = _openai_module()
+    sys.modules["streamlit"] = _streamlit_module()
+    sys.modules["langchain_openai"] = _chat_model_module()
+
+    import Azure  # noqa: F401  (namespace package must exist before the submodule is replaced)
+    sys.modules["Azure.Search"] = _azure_search_module()
+
+
+def make_pdf(text: str) -> bytes:
+    """
+    Build a minimal single-page PDF containing `text`, readable by PyPDF2.
+    """
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF".encode()
+    return bytes(out)
@@ -0,0 +1,264 @@
+import json
+import asyncio
+import threading
+
+from dotenv import load_dotenv
+
+# Load environment variables before the handlers read them
+load_dotenv()
+
+from typing import Dict, List
+from pydantic import BaseModel
+from fastapi import Depends, FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from API.auth import auth_handler
+from API.pdf import pdf_handler
+from API.quiz import QuizNotAvailableError, quiz_handler
+from API.chapter import chapter_handler
+from API.context import context_handler
+from API.curriculum_jobs import curriculum_job_handler
+from API.escalation import escalation_handler
+from API.Chat.chat import chat_handler
+from utils.executor_utils import background_executor
+from utils.agent_utils import tool_selector
+
+app = FastAPI(title="Learning Companion API")
+bearer_scheme = HTTPBearer()
+
+# The auth and escalation handlers share `database_manager.cursor`; sync endpoints run
+# on FastAPI's thread pool, so calls into them are serialized.
+shared_cursor_lock = threading.Lock()
+
+
+class LoginRequest(BaseModel):
+    email: str
+    password: str
+
+
+class ChatRequest(BaseModel):
+    message: str
+
+
+class QuizSubmission(BaseModel):
+    answers: Dict[str, str]  # {"q1": "<chosen option text>", ...}
+    reflection: str
+
+
+class TicketRequest(BaseModel):
+    question: str
+
+
+class TicketMessageRequest(BaseModel):
+    message: str
+
+
+def current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> str:
+    email = auth_handler.verify_token(credentials.credentials)
+    if email is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return email
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+@app.get("/health")
+def health():
+    return {
+        "status": "ok",
+        "sessions": chat_handler.user_memories.stats(),
+        "turns": chat_handler.inflight_turns.stats(),
+        "background": background_executor.stats(),
+        "tools": tool_selector.stats(),
+        "agents": chat_handler.agent_cache.stats(),
+    }
+
+
+@app.post("/auth/login")
+def login(body: LoginRequest):
+    with shared_cursor_lock:
+        valid = auth_handler.validate_user(body.email, body.password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    return {"token": auth_handler.issue_token(body.email)}
+
+
+@app.post("/chat")
+async def chat(body: ChatRequest, email: str = Depends(current_user)):
+    """
+    Run one chat turn and stream it as server-sent events: `token` events while the
+    model streams, `quiz` / `lesson` events carrying tool payloads that bypass the
+    model, then a single `end` (or `error`) event with the final output.
+    """
+    # Sessions live in the shared session store; any worker may have advanced this
+    # one since it was cached here, so start the turn from the stored copy. Not while
+    # a turn for this user is still running here: that turn's messages are only in
+    # the cached entry until it finishes and persists it.
+    if not chat_handler.inflight_turns.has_inflight(email):
+        chat_handler.user_memories.discard(email)
+
+    async def event_stream():
+        async for event in chat_handler.astream_chat(email, body.message):
+            yield format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/pdf/course")
+def create_course_from_pdfs(files: List[UploadFile] = File(...), email: str = Depends(current_user)):
+    return {"message": pdf_handler.generate_curriculum(email=email, pdf_files=files)}
+
+
+@app.post("/pdf/context")
+def upload_context_pdfs(
+    files: List[UploadFile] = File(...),
+    course_id: str = Form("default_course"),
+    email: str = Depends(current_user),
+):
+    extraction_result = context_handler.process_pdfs(pdf_files=files, user_email=email, course_id=course_id)
+    return {"files": {filename: len(text) for filename, text in extraction_result.items()}}
+
+
+@app.get("/quiz/{chapter_id}")
+def get_quiz(chapter_id: int, email: str = Depends(current_user)):
+    quiz = quiz_handler.get_quiz(email, chapter_id)
+    if quiz is None:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    if not quiz["questions"]:
+        raise HTTPException(status_code=503, detail=f"The quiz for Chapter ID {chapter_id} could not be generated right now.")
+    # Answers are graded server-side on submit
+    quiz["questions"] = [
+        {"question": q["question"], "options": q["options"]} for q in quiz["questions"]
+    ]
+    return quiz
+
+
+@app.post("/quiz/{chapter_id}/submit")
+def submit_quiz(chapter_id: int, body: QuizSubmission, email: str = Depends(current_user)):
+    if not body.reflection.strip():
+        raise HTTPException(status_code=422, detail="Reflection is required to complete the quiz.")
+    try:
+        result = quiz_handler.submit_quiz(email, chapter_id, body.answers, body.reflection)
+    except QuizNotAvailableError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    return result
+
+
+@app.post("/schedule/reschedule")
+def reschedule_missed_chapters(email: str = Depends(current_user)):
+    return {"rescheduled": chapter_handler.reschedule_missed_chapters(email=email)}
+
+
+def _job_view(job: dict) -> dict:
+    return {
+        "job_id": job["job_id"],
+        "subject": job["payload"]["topic"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "attempts": job["attempts"],
+        "curriculum_id": job["curriculum_id"],
+        "message": curriculum_job_handler.describe(job),
+    }
+
+
+@app.get("/jobs")
+def list_curriculum_jobs(email: str = Depends(current_user)):
+    return [_job_view(job) for job in curriculum_job_handler.get_recent_jobs(email)]
+
+
+@app.get("/jobs/{job_id}")
+def get_curriculum_job(job_id: int, email: str = Depends(current_user)):
+    job = curriculum_job_handler.get_job(job_id, email)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_view(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_curriculum_job(job_id: int, email: str = Depends(current_user)):
+    """
+    Stream `progress` events whenever the job's status or progress changes, ending
+    once it has succeeded or failed.
+    """
+    job = await asyncio.to_thread(curriculum_job_handler.get_job, job_id, email)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream(job):
+        last = None
+        while True:
+            view = _job_view(job)
+            if (view["status"], view["progress"]) != last:
+                last = (view["status"], view["progress"])
+                yield format_sse({"type": "progress", **view})
+            if view["status"] in ("succeeded", "failed"):
+                return
+            await asyncio.sleep(1)
+            job = await asyncio.to_thread(curriculum_job_handler.get_job, job_id, email)
+
+    return StreamingResponse(
+        event_stream(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _student_ticket(email: str, ticket_id: int):
+    with shared_cursor_lock:
+        tickets = escalation_handler.get_student_tickets(email)
+    ticket = next((t for t in tickets if t[0] == ticket_id), None)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return ticket
+
+
+@app.get("/tickets")
+def list_tickets(email: str = Depends(current_user)):
+    with shared_cursor_lock:
+        tickets = escalation_handler.get_student_tickets(email)
+    return [
+        {
+            "ticket_id": t[0],
+            "escalated_message": t[2],
+            "ticket_status": t[3],
+            "created_at": t[4].isoformat(),
+        }
+        for t in tickets
+    ]
+
+
+@app.post("/tickets")
+def create_ticket(body: TicketRequest, email: str = Depends(current_user)):
+    with shared_cursor_lock:
+        message = escalation_handler.escalate_to_instructor(email, body.question)
+    return {"message": message}
+
+
+@app.get("/tickets/{ticket_id}/messages")
+def get_ticket_messages(ticket_id: int, email: str = Depends(current_user)):
+    _student_ticket(email, ticket_id)
+    with shared_cursor_lock:
+        thread = escalation_handler.get_ticket_thread(ticket_id)
+    return [
+        {"role": role, "message_content": content, "created_at": created_at.isoformat()}
+        for role, content, created_at in thread
+    ]
+
+
+@app.post("/tickets/{ticket_id}/messages")
+def add_ticket_message(ticket_id: int, body: TicketMessageRequest, email: str = Depends(current_user)):
+    ticket = _student_ticket(email, ticket_id)
+    if ticket[3] == "resolved":
+        raise HTTPException(status_code=409, detail="This ticket is resolved.")
+    with shared_cursor_lock:
+        escalation_handler.add_ticket_message(ticket_id=ticket_id, role="Student", message_content=body.message.strip())
+    return {"status": "sent"}
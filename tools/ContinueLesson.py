@@ -0,0 +1,28 @@
+from typing import Callable, Optional
+from pydantic import BaseModel, Field
+from langchain.tools import StructuredTool
+
+from API.lesson import lesson_handler
+
+
+class ContinueLessonInput(BaseModel):
+    chapter_id: int = Field(
+        description="The ID of the chapter whose lesson the user is reading"
+    )
+    section: int = Field(
+        description="The 1-based number of the lesson section to show next"
+    )
+
+
+def get_continue_lesson_tool(
+    email: str,
+    on_continue_course: Optional[Callable[[str, str, str], None]] = None,
+):
+    return StructuredTool.from_function(
+        func=lambda chapter_id, section: lesson_handler.continue_lesson(
+            email, chapter_id, section, on_continue_course
+        ),
+        name="ContinueLesson",
+        description="Use when the user wants the next section of the chapter lesson started by ContinueCourse",
+        args_schema=ContinueLessonInput,
+    )
@@ -0,0 +1,18 @@
+from langchain.tools import StructuredTool
+
+from API.curriculum_jobs import curriculum_job_handler
+
+
+def get_course_generation_status(email: str) -> str:
+    jobs = curriculum_job_handler.get_recent_jobs(email)
+    if not jobs:
+        return "No course is being generated for the user."
+    return "\n".join(curriculum_job_handler.describe(job) for job in jobs)
+
+
+def get_course_generation_status_tool(email: str):
+    return StructuredTool.from_function(
+        func=lambda: get_course_generation_status(email),
+        name="CourseGenerationStatus",
+        description="Use to check the progress of courses the user asked to generate",
+    )
@@ -1,7 +1,8 @@
 import os
+import json
 from pydantic import BaseModel, Field
 from langchain.tools import StructuredTool
-from Azure.Search import pdf_client, client
+from Azure.Search import pdf_client, client, async_pdf_client, async_client
 from utils.llm_utils import get_llm_fast
 
 class RetrieveCourseContextInput(BaseModel):
@@ -42,6 +43,40 @@ def filter_relevant_results(query: str, search_results: list) -> list:
         print(f"[ERROR] LLM filtering failed: {str(e)}")
         return search_results  # Fallback: Return all results if filtering fails
 
+async def afilter_relevant_results(query: str, search_results: list) -> list:
+    print("[DEBUG] Filtering search results using LLM grader (async).")
+
+    if not search_results:
+        return []
+
+    llm = get_llm_fast()
+    prompt = f"""
+    You are a grader tasked with filtering search results for relevance.
+    The query is: "{query}"
+    
+    Given the following search results, determine which ones are relevant. 
+    Return a JSON list of only the relevant results.
+
+    Search Results:
+    {search_results}
+
+    Output format (JSON list of relevant results):
+    [
+        "Relevant Result 1",
+        "Relevant Result 2",
+        ...
+    ]
+    """
+
+    try:
+        response = await llm.ainvoke(prompt)
+        relevant_results = json.loads(response.content)
+        print(f"[DEBUG] Filtered results count: {len(relevant_results)}")
+        return relevant_results
+    except Exception as e:
+        print(f"[ERROR] LLM filtering failed: {str(e)}")
+        return search_results  # Fallback: Return all results if filtering fails
+
 def get_course_context_tool(email: str) -> StructuredTool:
     def course_context_func(query: str, course_id: str) -> str:
         print(f"[DEBUG] Starting course_context_func with query: '{query}' and course_id: '{course_id}'")
@@ -96,8 +131,47 @@ def get_course_context_tool(email: str) -> StructuredTool:
             print(f"[ERROR] Exception occurred: {str(e)}")
             return f"Error retrieving course context: {str(e)}"
 
+    async def acourse_context_func(query: str, course_id: str) -> str:
+        print(f"[DEBUG] Starting acourse_context_func with query: '{query}' and course_id: '{course_id}'")
+        try:
+            embedding_response = await async_client.embeddings.create(
+                model=os.getenv('TEXT_EMBEDDING_MODEL_NAME'),
+                input=[query]
+            )
+            embedding_vector = embedding_response.data[0].embedding
+
+            filter_query = f"user_email eq '{email}' and course_id eq '{course_id}'"
+            search_results = await async_pdf_client.search(
+                search_text="*",
+                filter=filter_query,
+                vector_queries=[
+                    {
+                        "kind": "vector",
+                        "vector": embedding_vector,
+                        "fields": "vector", 
+                        "k": 6
+                    }
+                ]
+            )
+            raw_contexts = [
+                result.get("content", "")
+                async for result in search_results
+                if result.get("content", "")
+            ]
+            print(f"[DEBUG] Extracted raw contexts count: {len(raw_contexts)}")
+
+            filtered_contexts = await afilter_relevant_results(query, raw_contexts)
+            if not filtered_contexts:
+                return "No relevant context found from your uploaded course materials."
+            return "\n\n".join(filtered_contexts)
+
+        except Exception as e:
+            print(f"[ERROR] Exception occurred: {str(e)}")
+            return f"Error retrieving course context: {str(e)}"
+
     return StructuredTool.from_function(
         func=course_context_func,
+        coroutine=acourse_context_func,
         args_schema=RetrieveCourseContextInput,
         name="retrieve_course_context",
         description=(
@@ -6,6 +6,10 @@ from API.curriculum import curriculum_handler
 def get_enrollment_tool(email: str):
     return StructuredTool.from_function(
         func=lambda: curriculum_handler.get_current_enrollment(email),
+        coroutine=lambda: curriculum_handler.aget_current_enrollment(email),
         name="GetCurrentEnrollment",
-        description="Use to find out what course the user is currently enrolled in",
+        description=(
+            "Use to find out what course the user is currently enrolled in. "
+            "Already in the session context; call only to refresh it, e.g. after a new course was created."
+        ),
     )
@@ -1,40 +1,66 @@
 from langchain.tools import StructuredTool
 from langchain.schema import HumanMessage, AIMessage
-from Azure.Search import search_client
+from Azure.Search import search_client, async_search_client
+
+def _parse_past_messages(results) -> list:
+    past_messages = []
+    for result in results:
+        if "question" in result and "response" in result:
+            past_messages.append(HumanMessage(content=str(result["question"])))
+            past_messages.append(AIMessage(content=str(result["response"])))
+    return past_messages
+
+def search_past_messages(email: str, query: str, limit: int = 10) -> list:
+    try:
+        print(f"Retrieving past messages for email: {email}, query: {query}")
+
+        # Perform the search using the SearchClient
+        results = search_client.search(
+            search_text=query,
+            filter=f"email eq '{email}'",
+            search_fields=["question", "response"],
+            select=["question", "response"],
+            top=limit,
+        )
+
+        # Parse the search results
+        return _parse_past_messages(results)
+
+    except Exception as e:
+        print(f"Error retrieving past messages: {e}")
+        return []
+
+async def asearch_past_messages(email: str, query: str, limit: int = 10) -> list:
+    try:
+        print(f"Retrieving past messages (async) for email: {email}, query: {query}")
+        results = await async_search_client.search(
+            search_text=query,
+            filter=f"email eq '{email}'",
+            search_fields=["question", "response"],
+            select=["question", "response"],
+            top=limit,
+        )
+        return _parse_past_messages([result async for result in results])
+
+    except Exception as e:
+        print(f"Error retrieving past messages: {e}")
+        return []
 
 def get_past_messages_tool(email: str):
     def fetch_past_messages(query: str, limit: int = 10):
-        try:
-            print(f"Retrieving past messages for email: {email}, query: {query}")
-
-            # Perform the search using the SearchClient
-            results = search_client.search(
-                search_text=query,
-                filter=f"email eq '{email}'",
-                search_fields=["question", "response"],
-                select=["question", "response"],
-                top=limit,
-            )
-
-            # Parse the search results
-            past_messages = []
-            for result in results:
-                if "question" in result and "response" in result:
-                    past_messages.append(HumanMessage(content=str(result["question"])))
-                    past_messages.append(AIMessage(content=str(result["response"])))
-
-            return past_messages
-
-        except Exception as e:
-            print(f"Error retrieving past messages: {e}")
-            return []
+        return search_past_messages(email, query, limit)
+
+    async def afetch_past_messages(query: str, limit: int = 10):
+        return await asearch_past_messages(email, query, limit)
 
     # Create and return the tool
     return StructuredTool.from_function(
         func=fetch_past_messages,
+        coroutine=afetch_past_messages,
         name="GetPastMessages",
         description=(
             "Use this tool to retrieve past messages relevant to the current input. "
-            "Provide the user's query as input to get relevant past interactions."
+            "Provide the user's query as input to get relevant past interactions. "
+            "The most relevant ones are already in the session context; call only to search for others."
         ),
-    )
\ No newline at end of file
+    )
@@ -7,6 +7,6 @@ def get_today_date_tool():
     return StructuredTool.from_function(
         func=get_today_date,
         name="GetTodayDate",
-        description="Use to get today's date in YYYY-MM-DD format",
+        description="Use to get today's date in YYYY-MM-DD format. Already in the session context; call only to refresh it.",
         return_direct=False,
     )
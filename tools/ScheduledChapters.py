@@ -6,7 +6,11 @@ from API.chapter import chapter_handler
 def get_scheduled_chapters_tool(email: str):
     return StructuredTool.from_function(
         func=lambda: chapter_handler.get_scheduled_chapters(email),
+        coroutine=lambda: chapter_handler.aget_scheduled_chapters(email),
         name="FetchScheduledChapters",
-        description="Fetch today's date and the user's scheduled chapters.",
+        description=(
+            "Fetch today's date and the user's scheduled chapters. "
+            "Already in the session context; call only to refresh it, e.g. after a chapter was completed."
+        ),
         return_direct=False,
     )
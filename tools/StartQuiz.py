@@ -3,7 +3,8 @@ from pydantic import BaseModel, Field
 from langchain.tools import StructuredTool
 
 from DB.index import database_manager
-from API.curriculum import curriculum_handler
+from API.curriculum import curriculum_handler, ensure_quiz_for_chapter
+from utils.passthrough_utils import QUIZ_PAYLOAD, publish_payload
 
 
 class StartQuizInput(BaseModel):
@@ -18,39 +19,50 @@ def start_quiz(chapter_id: int, email: str):
     Fetch questions for a given chapter ID and return them as a structured JSON.
     """
     # Validate chapter
-    database_manager.cursor.execute(
+    if not database_manager.run_query(
         "SELECT chapter_id FROM curriculum_chapters WHERE chapter_id = %s",
         (chapter_id,),
-    )
-    if not database_manager.cursor.fetchone():
+        fetch="one",
+    ):
         return json.dumps(
             {"status": "error", "message": "Invalid chapter ID provided."}
         )
 
-    # Fetch quiz questions
+    # Fetch quiz questions, generating them now if background generation has not caught up
     questions = curriculum_handler.fetch_quiz_questions_data(chapter_id)
+    if not questions and ensure_quiz_for_chapter(chapter_id):
+        questions = curriculum_handler.fetch_quiz_questions_data(chapter_id)
     if not questions:
         return json.dumps(
             {
                 "status": "error",
-                "message": f"No quiz questions found for Chapter ID {chapter_id}.",
+                "message": f"The quiz for Chapter ID {chapter_id} could not be generated right now. Please try again.",
             }
         )
 
-    # Return questions as structured JSON
     formatted_questions = [
         {"question": q[0], "options": [q[1], q[2], q[3], q[4]], "correct_option": q[5]}
         for q in questions
     ]
+    quiz = {"status": "success", "email": email, "chapter_id": chapter_id, "questions": formatted_questions}
+
+    # Hand the quiz straight to the quiz UI; the model only frames it
+    if publish_payload(QUIZ_PAYLOAD, quiz):
+        return (
+            f"The {len(formatted_questions)}-question quiz for chapter {chapter_id} has been opened "
+            "on the user's quiz screen. Reply with one short sentence wishing them luck; "
+            "do not repeat the questions."
+        )
 
-    return f'Respond with this JSON object only {json.dumps({"status": "success", "email": email, "chapter_id": chapter_id, "questions": formatted_questions})}'
+    # No side channel (tool used outside a chat turn): return questions as structured JSON
+    return f'Respond with this JSON object only {json.dumps(quiz)}'
 
 
 def get_start_quiz_tool(email: str):
     return StructuredTool.from_function(
         func=lambda chapter_id: start_quiz(chapter_id, email),
         name="StartQuiz",
-        description="Use this tool to start or continue to the MCQ quiz for a given chapter. Response user with JSON object only.",
+        description="Use this tool to start or continue to the MCQ quiz for a given chapter. The quiz is shown to the user directly; follow the instructions in the tool output.",
         args_schema=StartQuizInput,
         return_direct=False,
     )
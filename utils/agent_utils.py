@@ -1,3 +1,14 @@
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Set
+
+from langchain.tools import StructuredTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from utils.token_utils import count_tokens
 from tools.StartQuiz import get_start_quiz_tool
 from tools.PdfToCourse import get_pdftocourse_tool
 from tools.Escalation import get_escalation_tool
@@ -6,10 +17,12 @@ from tools.GetEnrollment import get_enrollment_tool
 from tools.ScrapeWebsite import get_scrape_website_tool
 from tools.StudyIntention import get_study_intention_tool
 from tools.ContinueCourse import get_continue_course_tool
+from tools.ContinueLesson import get_continue_lesson_tool
 from tools.ScheduledChapters import get_scheduled_chapters_tool
 from tools.GetPastMessages import get_past_messages_tool
 from tools.PdfToContext import get_upload_pdfs_tool
 from tools.GetCourseContext import get_course_context_tool
+from tools.CourseGenerationStatus import get_course_generation_status_tool
 
 def build_agent_tools(email, on_continue_course):
     """
@@ -21,6 +34,7 @@ def build_agent_tools(email, on_continue_course):
         get_study_intention_tool(email=email),
         get_today_date_tool(),
         get_continue_course_tool(email=email, on_continue_course=on_continue_course),
+        get_continue_lesson_tool(email=email, on_continue_course=on_continue_course),
         get_scrape_website_tool(),
         get_escalation_tool(email=email),
         get_start_quiz_tool(email=email),
@@ -28,4 +42,217 @@ def build_agent_tools(email, on_continue_course):
         get_scheduled_chapters_tool(email=email),
         get_upload_pdfs_tool(),
         get_course_context_tool(email=email),
+        get_course_generation_status_tool(email=email),
     ]
+
+
+TOOL_SUBSETTING = os.getenv("TOOL_SUBSETTING", "true").lower() == "true"
+AGENT_CACHE_MAX_BYTES = int(float(os.getenv("AGENT_CACHE_MAX_MB", 128)) * 1024 * 1024)
+# Rough resident sizes used for the agent cache's byte budget
+AGENT_TOOLS_BYTES = 32 * 1024
+AGENT_EXECUTOR_BYTES = 64 * 1024
+# Tool subsets vary by intent; keep the executors for the most recent few per user
+MAX_AGENT_EXECUTORS_PER_USER = 4
+
+# The prompt requires a course lookup (and an escalation offer) for any course
+# question, so these two are in every subset.
+BASE_TOOLS = {"retrieve_course_context", "EscalateToInstructor"}
+
+INTENT_TOOLS: Dict[str, Set[str]] = {
+    "quiz": {"StartQuiz"},
+    "course": {"ContinueCourse", "ContinueLesson", "GetCurrentEnrollment", "FetchScheduledChapters", "GetTodayDate"},
+    "enrollment": {"GetCurrentEnrollment", "StudyIntention", "CourseGenerationStatus"},
+    "retrieval": {"GetPastMessages", "ScrapeWebsite"},
+    "escalation": set(),
+    "pdf": {"PDFtoCourse", "PDFtoContext"},
+}
+
+INTENT_PATTERNS: Dict[str, re.Pattern] = {
+    intent: re.compile(pattern, re.IGNORECASE)
+    for intent, pattern in {
+        "quiz": r"\b(quiz\w*|mcqs?|test me|test my)\b",
+        "course": r"\b(continue|resume|next (chapter|lesson|topic|section|part)|lesson|sections?|chapters?|schedule\w*|today)\b",
+        "enrollment": r"\b(enrol\w*|courses?|learn|study|curriculum|sign up|is it ready)\b",
+        "retrieval": r"\b(remember|last time|earlier|previous\w*|we (discussed|talked)|website|url|link)\b|https?://",
+        "escalation": r"\b(instructor|teacher|lecturer|escalat\w*|tickets?)\b",
+        "pdf": r"\b(pdfs?|upload\w*|documents?)\b",
+    }.items()
+}
+
+
+class ToolSelector:
+    """
+    Picks the tools an agent turn needs with a keyword intent classifier, so the
+    model is not sent every tool schema on every turn. A turn whose input matches no
+    intent (e.g. "yes", or a general question) gets the full set.
+
+    When the previous reply ended with a question, the input is probably an answer
+    to it, so the intents of that exchange (the student's previous message and the
+    trailing question) are added to the input's own.
+
+    Tracks, per turn and in aggregate, how many tool-schema prompt tokens the
+    subset saved compared to the full set.
+    """
+
+    def __init__(self, enabled: bool = TOOL_SUBSETTING):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._schema_tokens: Dict[str, int] = {}
+        self.turns = 0
+        self.full_set_turns = 0
+        self.follow_up_turns = 0
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+
+    @staticmethod
+    def classify(user_input: str) -> List[str]:
+        return [intent for intent, pattern in INTENT_PATTERNS.items() if pattern.search(user_input)]
+
+    @staticmethod
+    def trailing_question(message: str) -> str:
+        """
+        The last sentence of `message` if it is a question, otherwise "".
+        """
+        message = (message or "").strip()
+        if not message.endswith("?"):
+            return ""
+        return re.split(r"(?<=[.!?])\s+|\n", message)[-1]
+
+    def schema_tokens(self, tool: StructuredTool) -> int:
+        """
+        Prompt tokens of a tool's function schema (cached per tool name; schemas are static).
+        """
+        tokens = self._schema_tokens.get(tool.name)
+        if tokens is None:
+            tokens = count_tokens(json.dumps(convert_to_openai_tool(tool)))
+            self._schema_tokens[tool.name] = tokens
+        return tokens
+
+    def select(
+        self,
+        tools: List[StructuredTool],
+        user_input: str,
+        last_ai_message: str = "",
+        last_user_message: str = "",
+    ) -> List[StructuredTool]:
+        """
+        `last_user_message` and `last_ai_message` are the previous exchange. If the reply
+        ended with a question, its intents carry over: "Daily, 1 hour per session" in
+        answer to "How often would you like to study?" keeps the StudyIntention tools
+        the previous "I want to learn Python" asked for.
+        """
+        intents, follow_up = [], False
+        if self.enabled:
+            intents = self.classify(user_input)
+            question = self.trailing_question(last_ai_message)
+            if question:
+                carried = self.classify(f"{last_user_message}\n{question}")
+                follow_up = bool(set(carried) - set(intents))
+                intents += [intent for intent in carried if intent not in intents]
+        if intents:
+            wanted = set(BASE_TOOLS).union(*(INTENT_TOOLS[intent] for intent in intents))
+            selected = [tool for tool in tools if tool.name in wanted]
+        else:
+            selected = tools
+
+        full_tokens = sum(self.schema_tokens(tool) for tool in tools)
+        sent_tokens = sum(self.schema_tokens(tool) for tool in selected)
+        with self._lock:
+            self.turns += 1
+            self.full_set_turns += not intents
+            self.follow_up_turns += follow_up
+            self.tokens_sent += sent_tokens
+            self.tokens_saved += full_tokens - sent_tokens
+        print(
+            f"[INFO] Tools for turn: intents={intents or 'unsure'}, {len(selected)}/{len(tools)} tools, "
+            f"{sent_tokens} schema tokens (saved {full_tokens - sent_tokens})"
+        )
+        return selected
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "turns": self.turns,
+                "full_set_turns": self.full_set_turns,
+                "follow_up_turns": self.follow_up_turns,
+                "schema_tokens_sent": self.tokens_sent,
+                "schema_tokens_saved": self.tokens_saved,
+                "avg_tokens_saved_per_turn": round(self.tokens_saved / self.turns, 1) if self.turns else 0.0,
+            }
+
+
+tool_selector = ToolSelector()
+
+
+class AgentCache:
+    """
+    Per-user agent tools and executors (one per tool subset), kept apart from the
+    session cache: API workers drop and reload the session on every turn, and the
+    tools and executors hold no conversation state worth reloading with it.
+    Executors are built without memory; callers bind the turn's memory on a copy.
+    Bounded by an estimated byte budget of its own, evicting the least recently
+    active users first.
+    """
+
+    def __init__(self, max_bytes: int = AGENT_CACHE_MAX_BYTES, max_executors: int = MAX_AGENT_EXECUTORS_PER_USER):
+        self.max_bytes = max_bytes
+        self.max_executors = max_executors
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, email: str) -> dict:
+        entry = self._entries.get(email)
+        if entry is None:
+            entry = self._entries[email] = {"tools": None, "executors": OrderedDict()}
+        self._entries.move_to_end(email)
+        return entry
+
+    def _resize(self, email: str):
+        entry = self._entries[email]
+        size = AGENT_TOOLS_BYTES * (entry["tools"] is not None) + AGENT_EXECUTOR_BYTES * len(entry["executors"])
+        self.current_bytes += size - self._sizes.get(email, 0)
+        self._sizes[email] = size
+        # Never evict the most recently active user, even if it alone exceeds the budget
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            evicted, _ = self._entries.popitem(last=False)
+            self.current_bytes -= self._sizes.pop(evicted, 0)
+            self.evictions += 1
+
+    def get_tools(self, email: str, build: Callable[[], List[StructuredTool]]) -> List[StructuredTool]:
+        with self._lock:
+            tools = self._entry(email)["tools"]
+        if tools is None:
+            tools = build()
+            with self._lock:
+                entry = self._entry(email)
+                # Keep the first build if another turn raced us
+                tools = entry["tools"] = entry["tools"] or tools
+                self._resize(email)
+        return tools
+
+    def get_executor(self, email: str, key: frozenset, build: Callable[[], Any]):
+        with self._lock:
+            executor = self._entry(email)["executors"].get(key)
+        if executor is None:
+            executor = build()
+            with self._lock:
+                executors = self._entry(email)["executors"]
+                executor = executors.setdefault(key, executor)
+                while len(executors) > self.max_executors:
+                    executors.popitem(last=False)
+                self._resize(email)
+        return executor
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._entries),
+                "executors": sum(len(entry["executors"]) for entry in self._entries.values()),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,179 @@
+import os
+import re
+import time
+import asyncio
+import threading
+
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from langchain.callbacks.base import BaseCallbackHandler
+
+# Debounce after a turn finishes: only reruns and double-clicks land this close,
+# a student deliberately repeating a message (e.g. "yes" twice) gets a fresh turn
+COALESCE_WINDOW_SECONDS = float(os.getenv("COALESCE_WINDOW_SECONDS", 1))
+# How long a duplicate waits for the original turn before giving up
+COALESCE_WAIT_TIMEOUT_SECONDS = float(os.getenv("COALESCE_WAIT_TIMEOUT_SECONDS", 300))
+
+
+def normalize_input(user_input: str) -> str:
+    """
+    Case- and whitespace-insensitive form of a user message, used as the coalescing key.
+    """
+    return re.sub(r"\s+", " ", user_input or "").strip().lower()
+
+
+class InflightTurn:
+    """
+    A chat turn in progress. The owner records streamed tokens, tool payloads and the
+    final result; duplicate submissions follow it, replaying the tokens seen so far.
+    """
+
+    def __init__(self, key: Tuple[str, str]):
+        self.key = key
+        self.tokens: List[str] = []
+        self.payloads: List[dict] = []
+        self.result: Any = None
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self._condition = threading.Condition()
+
+    def add_token(self, token: str):
+        with self._condition:
+            self.tokens.append(token)
+            self._condition.notify_all()
+
+    def add_payload(self, payload: dict):
+        with self._condition:
+            self.payloads.append(payload)
+
+    def finish(self, result: Any):
+        with self._condition:
+            self.result = result
+            self.done = True
+            self.finished_at = time.time()
+            self._condition.notify_all()
+
+    def wait_for_tokens(self, start: int, timeout: float) -> Tuple[List[str], bool]:
+        """
+        Block until there are tokens past `start` or the turn is done.
+        Returns (new_tokens, done).
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.done or len(self.tokens) > start, timeout)
+            return self.tokens[start:], self.done
+
+    def follow(self, callback_handler: Optional[BaseCallbackHandler] = None, timeout: float = COALESCE_WAIT_TIMEOUT_SECONDS):
+        """
+        Replay this turn's tokens into `callback_handler` as they arrive and return its result.
+        Tool payloads are handed to the handler's `on_tool_payload`, if it has one, once the turn is done.
+        """
+        deadline = time.monotonic() + timeout
+        seen = 0
+        while True:
+            tokens, done = self.wait_for_tokens(seen, max(deadline - time.monotonic(), 0))
+            seen += len(tokens)
+            if callback_handler is not None:
+                for token in tokens:
+                    callback_handler.on_llm_new_token(token)
+            if done:
+                if callback_handler is not None:
+                    for payload in self.payloads:
+                        if hasattr(callback_handler, "on_tool_payload"):
+                            callback_handler.on_tool_payload(payload)
+                    callback_handler.on_llm_end(None)
+                return self.result
+            if time.monotonic() >= deadline:
+                raise TimeoutError("Timed out waiting for the original chat turn")
+
+    async def afollow(self, timeout: float = COALESCE_WAIT_TIMEOUT_SECONDS) -> AsyncIterator[str]:
+        """
+        Async variant of `follow` yielding token batches; the result and tool payloads
+        are in `self.result` and `self.payloads` once exhausted.
+        """
+        deadline = time.monotonic() + timeout
+        seen = 0
+        while True:
+            tokens, done = await asyncio.to_thread(
+                self.wait_for_tokens, seen, max(deadline - time.monotonic(), 0)
+            )
+            seen += len(tokens)
+            if tokens:
+                yield "".join(tokens)
+            if done:
+                return
+            if time.monotonic() >= deadline:
+                raise TimeoutError("Timed out waiting for the original chat turn")
+
+
+class TurnRecorder(BaseCallbackHandler):
+    """
+    Forwards streamed tokens of the owning turn to its followers.
+    """
+
+    def __init__(self, turn: InflightTurn):
+        self.turn = turn
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.turn.add_token(token)
+
+
+class TurnCoalescer:
+    """
+    In-flight registry of chat turns keyed by (email, normalized input).
+
+    `begin` returns (turn, is_owner). The owner runs the turn and must call `finish`;
+    anyone else submitting the same input while it runs, or within the short
+    `window` debounce after it finishes, gets the same turn to follow instead of
+    starting a new agent run.
+    """
+
+    def __init__(self, window: float = COALESCE_WINDOW_SECONDS):
+        self.window = window
+        self.started = 0
+        self.coalesced = 0
+        self._turns: Dict[Tuple[str, str], InflightTurn] = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        expired = [
+            key for key, turn in self._turns.items()
+            if turn.done and now - turn.finished_at > self.window
+        ]
+        for key in expired:
+            del self._turns[key]
+
+    def begin(self, email: str, user_input: str) -> Tuple[InflightTurn, bool]:
+        key = (email, normalize_input(user_input))
+        with self._lock:
+            self._expire(time.time())
+            turn = self._turns.get(key)
+            if turn is not None:
+                self.coalesced += 1
+                print(f"[INFO] Coalesced duplicate chat turn for {email} ({self.coalesced} so far)")
+                return turn, False
+            turn = InflightTurn(key)
+            self._turns[key] = turn
+            self.started += 1
+            return turn, True
+
+    def finish(self, turn: InflightTurn, result: Any, cache: bool = True):
+        """
+        Publish the owner's result to followers. With `cache=False` (e.g. on errors)
+        the turn is dropped right away so the next submission starts a fresh run.
+        """
+        turn.finish(result)
+        if not cache:
+            with self._lock:
+                if self._turns.get(turn.key) is turn:
+                    del self._turns[turn.key]
+
+    def has_inflight(self, email: str) -> bool:
+        """
+        Whether a turn for this user is still running in this process.
+        """
+        with self._lock:
+            return any(key[0] == email and not turn.done for key, turn in self._turns.items())
+
+    def stats(self) -> dict:
+        with self._lock:
+            inflight = sum(1 for turn in self._turns.values() if not turn.done)
+            return {"started": self.started, "coalesced": self.coalesced, "inflight": inflight}
@@ -1,14 +1,91 @@
-from langchain.callbacks.base import BaseCallbackHandler
+import os
+import asyncio
+
 from API.chapter import chapter_handler
-from tools.GetCourseContext import get_course_context_tool
+from API.curriculum import curriculum_handler
+from tools.GetPastMessages import search_past_messages, asearch_past_messages
+from utils.date_utils import get_today_date
+from utils.executor_utils import background_executor
+
+PAST_MESSAGES_IN_CONTEXT = int(os.getenv("PAST_MESSAGES_IN_CONTEXT", 3))
+
+
+def _session_context(scheduled_chapters, enrollment, past_messages) -> dict:
+    """
+    Shape the pre-loaded facts; a fetch that failed is reported as unavailable
+    instead of failing the turn (the agent can still refresh it with its tool).
+    """
+    if isinstance(scheduled_chapters, BaseException):
+        print(f"[WARN] Could not pre-load scheduled chapters: {scheduled_chapters}")
+        scheduled_chapters = {"today_date": get_today_date(), "scheduled_chapters": []}
+    if isinstance(enrollment, BaseException):
+        print(f"[WARN] Could not pre-load enrollment: {enrollment}")
+        enrollment = "Unavailable; use GetCurrentEnrollment."
+    if isinstance(past_messages, BaseException):
+        print(f"[WARN] Could not pre-load past messages: {past_messages}")
+        past_messages = []
+    return {
+        "today_date": scheduled_chapters.get("today_date", ""),
+        "scheduled_chapters": scheduled_chapters.get("scheduled_chapters", []),
+        "enrollment": enrollment,
+        "past_messages": past_messages,
+    }
+
+
+def preload_session_context(email: str, user_input: str) -> dict:
+    """
+    Fetch the facts the agent needs at the start of a session (today's date, scheduled
+    chapters, enrollment and relevant past messages) concurrently, so they can be
+    injected into the first prompt instead of being gathered one tool call at a time.
+    """
+    futures = [
+        background_executor.submit("interactive", chapter_handler.get_scheduled_chapters, email),
+        background_executor.submit("interactive", curriculum_handler.get_current_enrollment, email),
+        background_executor.submit(
+            "interactive", search_past_messages, email, user_input, PAST_MESSAGES_IN_CONTEXT
+        ),
+    ]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return _session_context(*results)
+
+
+async def apreload_session_context(email: str, user_input: str) -> dict:
+    """
+    Async variant of `preload_session_context`.
+    """
+    results = await asyncio.gather(
+        chapter_handler.aget_scheduled_chapters(email),
+        curriculum_handler.aget_current_enrollment(email),
+        asearch_past_messages(email, user_input, PAST_MESSAGES_IN_CONTEXT),
+        return_exceptions=True,
+    )
+    return _session_context(*results)
 
-def build_initial_context(email: str, summarized_feedback: str, user_input: str):
+
+def _format_past_messages(past_messages: list, max_chars: int = 300) -> str:
+    # Messages come in (question, response) pairs
+    lines = [
+        f"- Q: {question.content[:max_chars]}\n  A: {response.content[:max_chars]}"
+        for question, response in zip(past_messages[::2], past_messages[1::2])
+    ]
+    return "\n".join(lines) or "None"
+
+
+def build_initial_context(email: str, summarized_feedback: str, user_input: str, session_context: dict = None):
     """
-    Builds a context for first-time user queries based on scheduled chapters, date, and feedback.
+    Builds a context for first-time user queries from the pre-loaded session facts
+    (date, scheduled chapters, enrollment, past messages) and feedback.
+    `session_context` may be passed in when the caller already fetched it.
     """
-    scheduled_chapters = chapter_handler.get_scheduled_chapters(email)
-    today_date = scheduled_chapters.get("today_date", "")
-    chapters = scheduled_chapters.get("scheduled_chapters", [])
+    if session_context is None:
+        session_context = preload_session_context(email, user_input)
+    today_date = session_context["today_date"]
+    chapters = session_context["scheduled_chapters"]
 
     if chapters:
         # Group chapters by subject
@@ -21,29 +98,28 @@ def build_initial_context(email: str, summarized_feedback: str, user_input: str)
             f"- {subj} ({chapters_by_subject[subj][0]['title']})"
             for subj in chapters_by_subject.keys()
         ])
+        schedule_context = f"""**Available Subjects:**
+        {subjects_context}
 
-        reminder_context = f"""
+        Return subjects_context as it is because it contains the course name
+        and chapter they last stop. Encourage them to continue their learning journey."""
+    else:
+        schedule_context = """User doesn't have any scheduled chapters for today.
+        Encourage them to continue their learning journey."""
+
+    return f"""
         **Summarized Feedback:**
         {summarized_feedback}
 
+        **Session Context** (already fetched; do not call tools for these facts unless they need refreshing)
         **Today's Date:** {today_date}
-        **Available Subjects:**
-        {subjects_context}
+        **Current Enrollment:**
+        {session_context["enrollment"]}
+        **Relevant Past Messages:**
+        {_format_past_messages(session_context["past_messages"])}
 
-        Return subjects_context as it is because it contains the course name 
-        and chapter they last stop. Encourage them to continue their learning journey.
-
-        **User Query**
-        {user_input}
-        """
-    else:
-        reminder_context = f"""
-        **Summarized Feedback:**
-        {summarized_feedback}
+        {schedule_context}
 
-        User doesn't have any scheduled chapters for today. 
-        Encourage them to continue their learning journey.
         **User Query**
         {user_input}
         """
-    return reminder_context
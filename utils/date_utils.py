@@ -5,3 +5,12 @@ def get_today_date():
     today = (datetime.now(timezone.utc) + timedelta(hours=8)).strftime("%Y-%m-%d")
     print(f"today_date: Today is: {today}")
     return today
+
+
+def seconds_until_tomorrow():
+    """
+    Seconds until the next midnight in the same UTC+8 day as `get_today_date`.
+    """
+    now = datetime.now(timezone.utc) + timedelta(hours=8)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
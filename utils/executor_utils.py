@@ -0,0 +1,193 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+
+class LaneFullError(RuntimeError):
+    """
+    Raised by `PriorityExecutor.submit` when a lane's queue is full and the lane rejects overflow.
+    """
+
+
+class Lane:
+    """
+    A named class of background work. Lanes with a lower `priority` value are served
+    first; `max_workers` caps how many of the shared workers the lane may occupy and
+    `max_queue` bounds how much work may wait. When the queue is full, `overflow`
+    decides what happens: "reject" raises `LaneFullError`, "caller_runs" runs the
+    task in the submitting thread instead (natural backpressure for work the caller
+    waits on anyway).
+    """
+
+    def __init__(self, name: str, priority: int, max_workers: int, max_queue: int, overflow: str = "reject"):
+        self.name = name
+        self.priority = priority
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+
+        self.queue: deque = deque()
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.caller_runs = 0
+        self.wait_times: deque = deque(maxlen=512)  # seconds spent queued, most recent tasks
+
+
+def _lane_from_env(name: str, priority: int, max_workers: int, max_queue: int, overflow: str) -> Lane:
+    prefix = f"EXECUTOR_{name.upper()}"
+    return Lane(
+        name,
+        priority,
+        int(os.getenv(f"{prefix}_WORKERS", max_workers)),
+        int(os.getenv(f"{prefix}_QUEUE", max_queue)),
+        overflow,
+    )
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class PriorityExecutor:
+    """
+    One pool of worker threads shared by all background LLM work, split into
+    priority lanes with per-lane concurrency caps and bounded queues.
+
+    Every future is observed: failures are logged with their lane and task name
+    and counted, so fire-and-forget work never fails silently. `stats()` exports
+    queue depth, running tasks and queue wait times per lane.
+    """
+
+    def __init__(self, lanes: List[Lane], max_workers: int):
+        self.lanes: Dict[str, Lane] = {lane.name: lane for lane in lanes}
+        self._by_priority = sorted(lanes, key=lambda lane: lane.priority)
+        self._condition = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"background-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, lane: str, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Queue `fn(*args, **kwargs)` on `lane` and return its future.
+        """
+        lane_obj = self.lanes[lane]
+        future = Future()
+        task_name = getattr(fn, "__qualname__", repr(fn))
+        future.add_done_callback(lambda f: self._observe(lane_obj, task_name, f))
+
+        with self._condition:
+            lane_obj.submitted += 1
+            if len(lane_obj.queue) < lane_obj.max_queue:
+                lane_obj.queue.append((future, fn, args, kwargs, time.monotonic()))
+                self._condition.notify()
+                return future
+            if lane_obj.overflow != "caller_runs":
+                lane_obj.rejected += 1
+                print(f"[WARN] Background lane '{lane}' is full ({lane_obj.max_queue} queued); rejected {task_name}")
+                raise LaneFullError(f"Background lane '{lane}' is full")
+            lane_obj.caller_runs += 1
+
+        # Queue full: run in the caller's thread so the overload slows the producer down
+        print(f"[WARN] Background lane '{lane}' is full; running {task_name} in the caller")
+        self._run(future, fn, args, kwargs)
+        return future
+
+    def try_submit(self, lane: str, fn: Callable, *args, **kwargs) -> Optional[Future]:
+        """
+        Like `submit`, but returns None instead of raising when the lane is full.
+        """
+        try:
+            return self.submit(lane, fn, *args, **kwargs)
+        except LaneFullError:
+            return None
+
+    @staticmethod
+    def _run(future: Future, fn: Callable, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _observe(self, lane: Lane, task_name: str, future: Future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        with self._condition:
+            if error is None:
+                lane.completed += 1
+            else:
+                lane.failed += 1
+        if error is not None:
+            print(f"[ERROR] Background task {task_name} in lane '{lane.name}' failed: {error!r}")
+
+    def _next_task(self):
+        for lane in self._by_priority:
+            if lane.queue and lane.running < lane.max_workers:
+                future, fn, args, kwargs, enqueued_at = lane.queue.popleft()
+                lane.running += 1
+                lane.wait_times.append(time.monotonic() - enqueued_at)
+                return lane, (future, fn, args, kwargs)
+        return None, None
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                lane, task = self._next_task()
+                while task is None:
+                    self._condition.wait()
+                    lane, task = self._next_task()
+            try:
+                self._run(*task)
+            finally:
+                with self._condition:
+                    lane.running -= 1
+                    # A slot in this lane freed up; queued work may now be runnable
+                    self._condition.notify_all()
+
+    def stats(self) -> Dict[str, dict]:
+        with self._condition:
+            return {
+                lane.name: {
+                    "queued": len(lane.queue),
+                    "running": lane.running,
+                    "max_workers": lane.max_workers,
+                    "max_queue": lane.max_queue,
+                    "submitted": lane.submitted,
+                    "completed": lane.completed,
+                    "failed": lane.failed,
+                    "rejected": lane.rejected,
+                    "caller_runs": lane.caller_runs,
+                    "wait_p50_ms": round(_percentile(list(lane.wait_times), 50) * 1000, 1),
+                    "wait_p95_ms": round(_percentile(list(lane.wait_times), 95) * 1000, 1),
+                    "wait_max_ms": round(max(lane.wait_times, default=0) * 1000, 1),
+                }
+                for lane in self._by_priority
+            }
+
+
+# Shared executor for all background LLM work:
+# - interactive: work a user is waiting on (pre-loading the session context)
+# - prefetch: work a user will probably need soon (quizzes, next lesson sections, quick replies)
+# - maintenance: bookkeeping nobody waits on (rolling and feedback summaries)
+background_executor = PriorityExecutor(
+    lanes=[
+        _lane_from_env("interactive", 0, max_workers=12, max_queue=32, overflow="caller_runs"),
+        _lane_from_env("prefetch", 1, max_workers=6, max_queue=64, overflow="reject"),
+        _lane_from_env("maintenance", 2, max_workers=2, max_queue=256, overflow="reject"),
+    ],
+    max_workers=int(os.getenv("EXECUTOR_WORKERS", 12)),
+)
@@ -1,27 +1,146 @@
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from langchain.schema import HumanMessage
+
 from DB.index import database_manager
-from agent import create_agent_executor
+from utils.llm_utils import get_llm_fast
+from utils.executor_utils import LaneFullError, background_executor
+
+NO_FEEDBACK_SUMMARY = "No past feedback found."
+# Feedback entries folded per LLM call; a larger backlog takes several batches
+FEEDBACK_SUMMARY_BATCH_SIZE = 50
+
+# Called with (email, summary) whenever a stored summary changes
+feedback_summary_listeners: List[Callable[[str, str], None]] = []
+
+_pending_lock = threading.Lock()
+_pending = set()  # emails with a summarization job queued or running
+_rerun = set()  # emails that received more feedback while their job was running
+
+
+def get_feedback_summary(email: str) -> str:
+    """
+    Read the stored feedback summary for a user. Never calls an LLM.
+    """
+    try:
+        row = database_manager.run_query(
+            "SELECT summary FROM feedback_summaries WHERE email = %s",
+            (email,),
+            fetch="one",
+        )
+        return row[0] if row and row[0] else NO_FEEDBACK_SUMMARY
+    except Exception as e:
+        print(f"[ERROR] Failed to read feedback summary for {email}: {e}")
+        return NO_FEEDBACK_SUMMARY
 
-def fetch_and_summarize_feedback(email: str):
-    database_manager.cursor.execute(
+
+def _fold_feedback_batch(email: str) -> Tuple[Optional[str], int]:
+    """
+    Fold up to FEEDBACK_SUMMARY_BATCH_SIZE entries received since the last run into
+    the stored summary and persist it. Returns (new summary or None, entries folded).
+    """
+    row = database_manager.run_query(
+        "SELECT summary, last_feedback_id FROM feedback_summaries WHERE email = %s",
+        (email,),
+        fetch="one",
+    )
+    previous_summary, last_feedback_id = row if row else ("", 0)
+
+    new_entries = database_manager.run_query(
         """
-        SELECT feedback_text FROM feedback WHERE email = %s ORDER BY created_at DESC LIMIT 10
+        SELECT feedback_id, feedback_text FROM feedback
+        WHERE email = %s AND feedback_id > %s
+        ORDER BY feedback_id ASC
+        LIMIT %s
         """,
-        (email,),
+        (email, last_feedback_id, FEEDBACK_SUMMARY_BATCH_SIZE),
     )
-    feedback_entries = database_manager.cursor.fetchall()
-    feedback_texts = [entry[0] for entry in feedback_entries]
 
-    if not feedback_texts:
-        return "No past feedback found."
+    if not new_entries:
+        return None, 0
+
+    feedback_texts = [text for _, text in new_entries if text]
+    prompt = f"""
+    Maintain a short summary of user feedback used to improve future prompts.
 
-    feedback_prompt = f"""
-    Summarize the feedback of users to improve future prompts.
+    Current summary: {previous_summary or "None"}
 
-    Feedback entries: {feedback_texts}
+    New feedback entries: {feedback_texts}
 
-    Provide in actionable format and make it short and concise. 
-    Generalize the feedback to improve the model.
+    Fold the new entries into the current summary. Provide it in actionable format,
+    short and concise, and generalize the feedback to improve the model.
+    Reply with the updated summary only.
+    """
+    summary = get_llm_fast().invoke([HumanMessage(content=prompt)]).content.strip()
+
+    database_manager.run_query(
+        """
+        INSERT INTO feedback_summaries (email, summary, last_feedback_id, updated_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (email) DO UPDATE
+        SET summary = EXCLUDED.summary,
+            last_feedback_id = EXCLUDED.last_feedback_id,
+            updated_at = EXCLUDED.updated_at
+        """,
+        (email, summary, new_entries[-1][0]),
+        fetch="none",
+    )
+
+    print(f"[INFO] Folded {len(new_entries)} feedback entries into summary for {email}")
+    return summary, len(new_entries)
+
+
+def update_feedback_summary(email: str) -> Optional[str]:
+    """
+    Fold feedback received since the last run into the user's stored summary
+    using the fast model, one batch at a time until the backlog is drained, and
+    persist the result. Returns the new summary, or None if there was no new feedback.
+    """
+    summary = None
+    while True:
+        batch_summary, folded = _fold_feedback_batch(email)
+        summary = batch_summary or summary
+        if folded < FEEDBACK_SUMMARY_BATCH_SIZE:
+            break
+    if summary is None:
+        return None
+
+    for listener in feedback_summary_listeners:
+        try:
+            listener(email, summary)
+        except Exception as e:
+            print(f"[ERROR] Feedback summary listener failed: {e}")
+    return summary
+
+
+def _run_feedback_summary(email: str):
+    while True:
+        try:
+            update_feedback_summary(email)
+        except Exception as e:
+            print(f"[ERROR] Failed to update feedback summary for {email}: {e}")
+        with _pending_lock:
+            if email in _rerun:
+                _rerun.discard(email)
+                continue
+            _pending.discard(email)
+            return
+
+
+def schedule_feedback_summary(email: str):
+    """
+    Queue an incremental summary update for the user. Submissions for a user whose
+    job is already queued or running are coalesced into one follow-up run.
     """
-    agent_executor = create_agent_executor()
-    response = agent_executor.invoke({"input": feedback_prompt})
-    return response.get("output", "").strip()
+    with _pending_lock:
+        if email in _pending:
+            _rerun.add(email)
+            return
+        _pending.add(email)
+    try:
+        background_executor.submit("maintenance", _run_feedback_summary, email)
+    except LaneFullError:
+        # The feedback stays unsummarized until the user's next feedback
+        with _pending_lock:
+            _pending.discard(email)
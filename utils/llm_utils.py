@@ -1,23 +1,66 @@
+import threading
+from collections import Counter
 from langchain_openai import AzureChatOpenAI
-from typing import Optional, List
+from typing import Dict, Optional, List
 from langchain.callbacks.base import BaseCallbackHandler
 
+# Process-wide count of LLM calls per purpose, to track call budgets
+_llm_call_counts = Counter()
+_llm_call_lock = threading.Lock()
+
+
+def count_llm_call(purpose: str) -> int:
+    """
+    Record one LLM call for `purpose` and return the running total for it.
+    """
+    with _llm_call_lock:
+        _llm_call_counts[purpose] += 1
+        return _llm_call_counts[purpose]
+
+
+def get_llm_call_counts() -> Dict[str, int]:
+    with _llm_call_lock:
+        return dict(_llm_call_counts)
+
+
+# Clients without bound callbacks are stateless and shared process-wide
+_llm_clients: Dict[tuple, AzureChatOpenAI] = {}
+_llm_clients_lock = threading.Lock()
+
+
+def _get_client(deployment: str, streaming: bool, callbacks: Optional[List[BaseCallbackHandler]]):
+    if callbacks:
+        return AzureChatOpenAI(
+            temperature=0,
+            top_p=0,
+            azure_deployment=deployment,
+            streaming=streaming,
+            callbacks=callbacks,
+        )
+    key = (deployment, streaming)
+    with _llm_clients_lock:
+        client = _llm_clients.get(key)
+        if client is None:
+            client = AzureChatOpenAI(
+                temperature=0,
+                top_p=0,
+                azure_deployment=deployment,
+                streaming=streaming,
+            )
+            _llm_clients[key] = client
+        return client
+
 
 def get_llm(streaming: bool = False, callbacks: Optional[List[BaseCallbackHandler]] = None):
-    return AzureChatOpenAI(
-        temperature=0,
-        top_p=0,
-        azure_deployment="gpt-4o",
-        streaming=streaming,
-        callbacks=callbacks,
-    )
+    """
+    GPT-4o client. Prefer passing callbacks per call (`config={"callbacks": ...}`)
+    over binding them here, so the shared client can be reused.
+    """
+    return _get_client("gpt-4o", streaming, callbacks)
 
 
 def get_llm_fast(streaming: bool = False, callbacks: Optional[List[BaseCallbackHandler]] = None):
-    return AzureChatOpenAI(
-        temperature=0,
-        top_p=0,
-        azure_deployment="gpt-4o-mini",
-        streaming=streaming,
-        callbacks=callbacks,
-    )
+    """
+    GPT-4o-mini client; see `get_llm`.
+    """
+    return _get_client("gpt-4o-mini", streaming, callbacks)
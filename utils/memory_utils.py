@@ -1,5 +1,389 @@
+import os
 import time
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import PrivateAttr
 from langchain.memory import ConversationBufferMemory
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from utils.llm_utils import get_llm_fast
+from utils.executor_utils import LaneFullError, background_executor
+from utils.token_utils import TokenLedger, get_encoding, message_text
+
+MEMORY_WINDOW_TURNS = int(os.getenv("MEMORY_WINDOW_TURNS", 6))
+MEMORY_SUMMARY_MAX_TOKENS = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", 500))
+SESSION_CACHE_MAX_BYTES = int(float(os.getenv("SESSION_CACHE_MAX_MB", 256)) * 1024 * 1024)
+
+# Compact message type tags used when serializing session state
+_MESSAGE_TAGS = {"human": "h", "ai": "a", "system": "s"}
+_MESSAGE_TYPES = {"h": HumanMessage, "a": AIMessage, "s": SystemMessage}
+
+
+class RollingSummaryMemory(ConversationBufferMemory):
+    """
+    Keeps the last `k` turns verbatim plus a rolling summary of everything older.
+
+    Only the summary and the verbatim window are loaded into the prompt, so prompt
+    size stays roughly constant over long sessions. Older turns are folded into the
+    summary by the fast model in the background via `schedule_summary`, after the
+    response has been delivered.
+    """
+
+    k: int = MEMORY_WINDOW_TURNS
+    summary: str = ""
+    summary_max_tokens: int = MEMORY_SUMMARY_MAX_TOKENS
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _summarizing: bool = PrivateAttr(default=False)
+
+    @property
+    def buffer_as_messages(self) -> List:
+        window = self.chat_memory.messages[-2 * self.k:] if self.k > 0 else []
+        if self.summary:
+            return [SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}")] + window
+        return window
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        if self.return_messages:
+            return {self.memory_key: self.buffer_as_messages}
+        return {self.memory_key: "\n".join(message_text(msg) for msg in self.buffer_as_messages)}
+
+    def clear(self) -> None:
+        super().clear()
+        self.summary = ""
+
+    def schedule_summary(self, on_done: Optional[Callable[[], None]] = None):
+        """
+        Fold turns that fell out of the verbatim window into the summary on a
+        background thread. At most one summarization runs per memory at a time.
+        `on_done` runs after the summary has been updated (e.g. to persist it).
+        """
+        with self._lock:
+            if self._summarizing or len(self.chat_memory.messages) <= 2 * self.k:
+                return
+            self._summarizing = True
+        try:
+            background_executor.submit("maintenance", self._summarize_overflow, on_done)
+        except LaneFullError:
+            # Retried after the next turn
+            with self._lock:
+                self._summarizing = False
+
+    def _summarize_overflow(self, on_done: Optional[Callable[[], None]] = None):
+        try:
+            with self._lock:
+                overflow = list(self.chat_memory.messages[: -2 * self.k] if self.k > 0 else self.chat_memory.messages)
+                previous_summary = self.summary
+            if not overflow:
+                return
+
+            conversation = "\n".join(message_text(msg) for msg in overflow)
+            prompt = f"""
+            Progressively summarize the conversation between a student and their learning companion.
+            Keep course names, chapter ids, quiz results, stated goals and open questions.
+            Reply with the new summary only, in at most {self.summary_max_tokens} tokens.
+
+            Current summary:
+            {previous_summary or "None"}
+
+            New lines of conversation:
+            {conversation}
+            """
+            llm = get_llm_fast().bind(max_tokens=self.summary_max_tokens)
+            new_summary = llm.invoke([HumanMessage(content=prompt)]).content.strip()
+
+            # Enforce the ceiling even if the model overshoots
+            encoding = get_encoding()
+            tokens = encoding.encode(new_summary)
+            if len(tokens) > self.summary_max_tokens:
+                new_summary = encoding.decode(tokens[: self.summary_max_tokens])
+
+            with self._lock:
+                messages = self.chat_memory.messages
+                # Drop the folded turns only if nothing else trimmed the history meanwhile
+                folded = all(a is b for a, b in zip(messages, overflow)) and len(messages) >= len(overflow)
+                if folded:
+                    del messages[: len(overflow)]
+                    self.summary = new_summary
+            if folded:
+                print(f"[INFO] Folded {len(overflow)} messages into rolling summary")
+                if on_done is not None:
+                    on_done()
+            else:
+                print("[INFO] History changed while summarizing; skipped folding")
+        except Exception as e:
+            print(f"[ERROR] Failed to update rolling summary: {e}")
+        finally:
+            with self._lock:
+                self._summarizing = False
+
+
+def _new_memory() -> RollingSummaryMemory:
+    return RollingSummaryMemory(memory_key="chat_history", return_messages=True)
+
+
+def dump_session(session_data: dict) -> dict:
+    """
+    Serialize a user's session entry into a compact JSON-friendly dict:
+    rolling summary, [tag, content] message pairs and summarized feedback.
+    """
+    state = {"v": 1}
+    memory = session_data.get("memory")
+    if memory is not None:
+        state["s"] = memory.summary
+        state["m"] = [
+            [_MESSAGE_TAGS.get(msg.type, "s"), msg.content]
+            for msg in memory.chat_memory.messages
+        ]
+    if "summarized_feedback" in session_data:
+        state["f"] = session_data["summarized_feedback"]
+    return state
+
+
+def restore_session(state: dict) -> dict:
+    """
+    Rebuild a session entry from the output of `dump_session`.
+    """
+    memory = _new_memory()
+    memory.summary = state.get("s", "")
+    memory.chat_memory.messages = [
+        _MESSAGE_TYPES.get(tag, SystemMessage)(content=content)
+        for tag, content in state.get("m", [])
+    ]
+    session_data = {
+        "memory": memory,
+        "token_ledger": TokenLedger(),
+        "last_active": time.time(),
+    }
+    if "f" in state:
+        session_data["summarized_feedback"] = state["f"]
+    return session_data
+
+
+# Rough per-object overheads used by `estimate_session_bytes`
+MESSAGE_OVERHEAD_BYTES = 1024
+SESSION_OVERHEAD_BYTES = 4096
+BYTES_PER_TOKEN = 4
+
+
+def estimate_session_bytes(session_data: dict) -> int:
+    """
+    Estimate the resident size of a session entry from character and token
+    counts: message and summary text, summarized feedback and per-message object
+    overhead.
+    """
+    size = SESSION_OVERHEAD_BYTES
+    memory = session_data.get("memory")
+    if memory is not None:
+        messages = memory.chat_memory.messages
+        chars = len(memory.summary) + sum(len(str(msg.content)) for msg in messages)
+        ledger = session_data.get("token_ledger")
+        tokens = ledger.total_tokens if ledger is not None else 0
+        size += max(chars, tokens * BYTES_PER_TOKEN) + MESSAGE_OVERHEAD_BYTES * len(messages)
+    size += len(session_data.get("summarized_feedback") or "")
+    return size
+
+
+class SessionCache(MutableMapping):
+    """
+    Drop-in replacement for the plain `user_memories` dict, backed by a durable
+    `SessionStore` and bounded by an estimated byte budget.
+
+    Entries are loaded lazily from the store on first access and kept in an
+    in-process LRU. `persist` writes an entry through to the store and re-measures
+    it; when the cache exceeds `max_bytes`, the least recently used sessions are
+    handed to the eviction callbacks (which persist them by default) and dropped.
+    """
+
+    def __init__(self, store=None, max_bytes: int = SESSION_CACHE_MAX_BYTES):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self.eviction_callbacks: List[Callable[[str, dict], None]] = [self._persist_state]
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def _load(self, email: str) -> Optional[dict]:
+        if self.store is None:
+            return None
+        try:
+            state = self.store.load(email)
+        except Exception as e:
+            print(f"[ERROR] Failed to load session for {email}: {e}")
+            return None
+        return restore_session(state) if state else None
+
+    def __getitem__(self, email: str) -> dict:
+        with self._lock:
+            if email in self._entries:
+                self._entries.move_to_end(email)
+                return self._entries[email]
+
+        session_data = self._load(email)
+        if session_data is None:
+            raise KeyError(email)
+
+        with self._lock:
+            # Another thread may have created the entry while we were loading
+            if email not in self._entries:
+                self._insert(email, session_data)
+                print(f"[INFO] Loaded session for {email} from session store")
+            self._entries.move_to_end(email)
+            session_data = self._entries[email]
+            evicted = self._collect_evictions()
+        self._run_eviction_callbacks(evicted)
+        return session_data
+
+    def __setitem__(self, email: str, session_data: dict):
+        with self._lock:
+            self._insert(email, session_data)
+            evicted = self._collect_evictions()
+        self._run_eviction_callbacks(evicted)
+
+    def __delitem__(self, email: str):
+        with self._lock:
+            del self._entries[email]
+            self.current_bytes -= self._sizes.pop(email, 0)
+
+    def __contains__(self, email) -> bool:
+        try:
+            self[email]
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def is_cached(self, email: str) -> bool:
+        """
+        Whether the session is resident in memory; never loads from the store.
+        """
+        with self._lock:
+            return email in self._entries
+
+    def items(self):
+        """
+        Snapshot of the cached entries only; never loads from the store.
+        """
+        with self._lock:
+            return list(self._entries.items())
+
+    def _insert(self, email: str, session_data: dict):
+        self._entries[email] = session_data
+        self._entries.move_to_end(email)
+        self._resize(email)
+
+    def _resize(self, email: str):
+        size = estimate_session_bytes(self._entries[email])
+        self.current_bytes += size - self._sizes.get(email, 0)
+        self._sizes[email] = size
+
+    def _collect_evictions(self) -> List[tuple]:
+        # Never evict the most recently used session, even if it alone exceeds the budget
+        evicted = []
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            email, session_data = self._entries.popitem(last=False)
+            self.current_bytes -= self._sizes.pop(email, 0)
+            self.evictions += 1
+            evicted.append((email, session_data))
+        return evicted
+
+    def _run_eviction_callbacks(self, evicted: List[tuple]):
+        for email, session_data in evicted:
+            for callback in self.eviction_callbacks:
+                try:
+                    callback(email, session_data)
+                except Exception as e:
+                    print(f"[ERROR] Eviction callback failed for {email}: {e}")
+            print(f"[INFO] Evicted session for {email} from memory")
+
+    def _persist_state(self, email: str, session_data: dict):
+        if self.store is None:
+            return
+        memory = session_data.get("memory")
+        if memory is not None:
+            with memory._lock:
+                state = dump_session(session_data)
+        else:
+            state = dump_session(session_data)
+        try:
+            self.store.save(email, state)
+        except Exception as e:
+            print(f"[ERROR] Failed to persist session for {email}: {e}")
+
+    def persist(self, email: str):
+        """
+        Re-measure the user's session, write it through to the store and evict
+        other sessions if the cache is now over budget.
+        """
+        with self._lock:
+            session_data = self._entries.get(email)
+            if session_data is None:
+                return
+            self._resize(email)
+            evicted = self._collect_evictions()
+        self._persist_state(email, session_data)
+        self._run_eviction_callbacks(evicted)
+
+    def persist_session(self, email: str, session_data: dict):
+        """
+        Write a specific session entry through to the store, e.g. one a background
+        job captured before the cached copy was discarded or replaced.
+        """
+        with self._lock:
+            cached = self._entries.get(email) is session_data
+        if cached:
+            self.persist(email)
+        else:
+            self._persist_state(email, session_data)
+
+    def evict(self, email: str):
+        """
+        Persist and drop a single session, e.g. on logout.
+        """
+        with self._lock:
+            session_data = self._entries.pop(email, None)
+            if session_data is None:
+                return
+            self.current_bytes -= self._sizes.pop(email, 0)
+            self.evictions += 1
+        self._run_eviction_callbacks([(email, session_data)])
+
+    def discard(self, email: str):
+        """
+        Drop the cached copy of a session without persisting it, so the next access
+        reloads it from the store. Used by stateless API workers, where another
+        process may have advanced the session since it was cached here.
+        """
+        if self.store is None:
+            return  # The cache is the only copy
+        with self._lock:
+            if self._entries.pop(email, None) is not None:
+                self.current_bytes -= self._sizes.pop(email, 0)
+
+    def stats(self) -> dict:
+        """
+        Gauges for monitoring: cached sessions, estimated bytes, budget and evictions.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
 
 def get_user_memory(user_memories: dict, email: str):
     """
@@ -7,13 +391,23 @@ def get_user_memory(user_memories: dict, email: str):
     """
     if email not in user_memories:
         user_memories[email] = {
-            "memory": ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True
-            ),
+            "memory": _new_memory(),
+            "token_ledger": TokenLedger(),
             "last_active": time.time(),
         }
     else:
         user_memories[email]["last_active"] = time.time()
+        if "memory" not in user_memories[email]:
+            user_memories[email]["memory"] = _new_memory()
 
     return user_memories[email]["memory"]
+
+
+def get_user_token_ledger(user_memories: dict, email: str) -> TokenLedger:
+    """
+    Retrieve or create the token ledger tracking the given user's chat history.
+    """
+    session_data = user_memories.setdefault(email, {"last_active": time.time()})
+    if "token_ledger" not in session_data:
+        session_data["token_ledger"] = TokenLedger()
+    return session_data["token_ledger"]
@@ -0,0 +1,67 @@
+import threading
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, Optional
+
+# Kinds of structured payloads tools hand straight to the caller
+QUIZ_PAYLOAD = "quiz"
+LESSON_PAYLOAD = "lesson"
+
+
+class ToolPayloadChannel:
+    """
+    Side channel for one chat turn. Designated tools publish structured payloads
+    (quiz data, lesson text) here so they reach the caller directly, while the
+    model only sees a short note and answers with a brief framing message instead
+    of re-typing the payload token by token.
+    """
+
+    def __init__(self, listeners: Optional[List[Callable[[dict], None]]] = None):
+        self.payloads: List[dict] = []
+        self.listeners = listeners or []
+        self._lock = threading.Lock()
+
+    def publish(self, kind: str, data: Any):
+        payload = {"kind": kind, "data": data}
+        with self._lock:
+            self.payloads.append(payload)
+        for listener in self.listeners:
+            try:
+                listener(payload)
+            except Exception as e:
+                print(f"[ERROR] Tool payload listener failed: {e}")
+
+
+# Set for the duration of a turn; tool runs (including those LangChain moves to
+# worker threads) inherit it through the copied context
+_current_channel: ContextVar[Optional[ToolPayloadChannel]] = ContextVar("tool_payload_channel", default=None)
+
+
+@contextmanager
+def tool_payload_channel(channel: ToolPayloadChannel) -> Iterator[ToolPayloadChannel]:
+    token = _current_channel.set(channel)
+    try:
+        yield channel
+    finally:
+        _current_channel.reset(token)
+
+
+def payload_channel_open() -> bool:
+    """
+    Whether the current turn takes tool payloads, for tools that stream several of them.
+    """
+    return _current_channel.get() is not None
+
+
+def publish_payload(kind: str, data: Any) -> bool:
+    """
+    Hand `data` to the caller of the current turn. Returns False when no channel
+    is open (e.g. a tool invoked outside a chat turn), in which case the tool
+    should fall back to returning the payload to the model.
+    """
+    channel = _current_channel.get()
+    if channel is None:
+        return False
+    channel.publish(kind, data)
+    return True
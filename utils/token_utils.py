@@ -0,0 +1,107 @@
+from collections import deque
+from functools import lru_cache
+from typing import Deque, List, Optional
+
+import tiktoken
+from langchain.schema import BaseMessage
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = "o200k_base"):
+    """
+    Return a process-wide cached tiktoken encoding.
+    """
+    return tiktoken.get_encoding(encoding_name)
+
+
+@lru_cache(maxsize=None)
+def get_encoding_for_model(model_name: str = "gpt-4o"):
+    """
+    Return a process-wide cached tiktoken encoding for the given model name.
+    """
+    return tiktoken.encoding_for_model(model_name)
+
+
+def message_text(msg) -> str:
+    """
+    Render a chat message as "role: content" without LangChain's repr noise.
+    """
+    if isinstance(msg, dict):
+        return f"{msg.get('role', '')}: {msg.get('content', '')}"
+    if isinstance(msg, BaseMessage):
+        return f"{msg.type}: {msg.content}"
+    return str(msg)
+
+
+def count_tokens(text: str, encoding_name: str = "o200k_base") -> int:
+    return len(get_encoding(encoding_name).encode(text))
+
+
+class TokenLedger:
+    """
+    Per-user running token count for a chat history list.
+
+    Each message is encoded once, when the ledger first sees it appended, and the
+    running total is kept in step with the list. Trimming pops the oldest entries,
+    so the work per turn is proportional to the messages added or removed, not
+    to the length of the conversation.
+    """
+
+    def __init__(self, encoding_name: str = "o200k_base"):
+        self.encoding_name = encoding_name
+        self.counts: Deque[int] = deque()
+        self.total_tokens = 0
+        self._first: Optional[object] = None
+
+    def _reset(self):
+        self.counts.clear()
+        self.total_tokens = 0
+        self._first = None
+
+    def sync(self, messages: List) -> int:
+        """
+        Count any messages appended since the last sync and return the running total.
+        Rebuilds from scratch only if the list was replaced or trimmed elsewhere.
+        """
+        if len(messages) < len(self.counts) or (
+            self.counts and (not messages or messages[0] is not self._first)
+        ):
+            self._reset()
+
+        for msg in messages[len(self.counts):]:
+            tokens = count_tokens(message_text(msg), self.encoding_name)
+            self.counts.append(tokens)
+            self.total_tokens += tokens
+
+        self._first = messages[0] if messages else None
+        return self.total_tokens
+
+    def trim(self, messages: List, max_tokens: int) -> int:
+        """
+        Drop the oldest messages in place until the history fits within `max_tokens`.
+        Returns the number of messages removed.
+        """
+        self.sync(messages)
+
+        removed = 0
+        while self.counts and self.total_tokens > max_tokens:
+            self.total_tokens -= self.counts.popleft()
+            removed += 1
+
+        if removed:
+            del messages[:removed]
+            self._first = messages[0] if messages else None
+        return removed
+
+
+def take_within_budget(lines: List[str], max_tokens: int, encoding_name: str = "o200k_base") -> List[str]:
+    """
+    Return the leading `lines` whose combined token count fits in `max_tokens`.
+    """
+    kept, total = [], 0
+    for line in lines:
+        total += count_tokens(line, encoding_name) + 1  # + newline
+        if total > max_tokens:
+            break
+        kept.append(line)
+    return kept